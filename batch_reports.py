@@ -0,0 +1,357 @@
+"""Headless batch generation of the main and accountant reports.
+
+Reads one row of inputs per store from a CSV file and, for every row, runs the
+department, fuel and MOP pipeline and renders its PDFs as one job on a worker
+pool (see run_batch for which pool, and which parts scale with the cores).
+
+    python batch_reports.py --init store_inputs.csv
+    python batch_reports.py store_inputs.csv --output-dir reports --workers 8
+    python batch_reports.py store_inputs.csv --consolidated
+
+--consolidated replaces the per-store accountant's reports with a single
+Accountant_All_Stations_<date>.pdf holding one row per store, computed in one
+pass over all rows and rendered with one backend call.
+
+Input columns (missing numeric columns default to 0):
+    store_name, open_period_date, close_period_date, department_csv,
+    cig_items, cig_gross, ecig_items, ecig_gross, desired_merch_sale,
+    reg_volume, reg_amount, plus_volume, plus_amount, super_volume,
+    super_amount, diesel_volume, diesel_amount,
+    manual_credit, manual_debit, manual_mobile,
+    inventory_regular, inventory_super, inventory_diesel
+An optional integer `seed` column makes a row's random figures reproducible.
+A department_csv of "saved" reads the store's department data for the opening
+date from the saved dataset (see department_store).
+
+--pump-exports / --tank-exports fill the fuel volume / amount and inventory
+columns of every row from the sites' export files (see fuel_ledger), replacing
+whatever the inputs file holds for them.
+
+--cube adds every per-store report whose PDFs were all written to the sales
+cube (see sales_cube) and saves it when the batch is done; stores that failed
+are left out, so the cube matches the reports on disk.
+"""
+import argparse
+import os
+import sys
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+import report_engine as engine
+from department_store import open_store
+from fuel_ledger import FILL_COLUMNS, FuelLedger
+from sales_cube import SalesCube, report_facts
+from store_registry import get_registry
+from pdf_backends import BACKENDS, PooledPdfBackend, create_backend, resolve_backend_name
+
+INPUT_COLUMNS = [
+    "store_name", "open_period_date", "close_period_date", "department_csv",
+    "cig_items", "cig_gross", "ecig_items", "ecig_gross", "desired_merch_sale",
+    *[f"{product.lower()}_{field}" for product in engine.fuel_products for field in ("volume", "amount")],
+    "manual_credit", "manual_debit", "manual_mobile",
+    "inventory_regular", "inventory_super", "inventory_diesel",
+]
+INTEGER_COLUMNS = {
+    "cig_items", "ecig_items", "reg_volume", "plus_volume", "super_volume", "diesel_volume",
+    "inventory_regular", "inventory_super", "inventory_diesel",
+}
+REPORT_KINDS = engine.REPORT_KINDS
+
+
+def write_input_template(path):
+    """Write an inputs file with one zeroed row per store in the registry"""
+    today = datetime.today().strftime("%Y-%m-%d")
+    rows = []
+    for store_name in get_registry().names:
+        row = {column: 0 for column in INPUT_COLUMNS}
+        row.update(store_name=store_name, open_period_date=today, close_period_date=today, department_csv="")
+        rows.append(row)
+    pd.DataFrame(rows, columns=INPUT_COLUMNS).to_csv(path, index=False)
+    return path
+
+
+class StoreInputsError(ValueError):
+    """Problem with a store inputs file: `message` says what, `row` is the 1-based data row (None for the whole file)"""
+
+    def __init__(self, source, message, row=None):
+        self.source = source
+        self.message = message
+        self.row = row
+        super().__init__(f"{source}{f', row {row}' if row else ''}: {message}")
+
+
+def read_store_inputs(path):
+    """Read the per-store inputs file into a list of dicts with typed values; StoreInputsError if it is invalid"""
+    try:
+        inputs = pd.read_csv(path, dtype={"store_name": str, "department_csv": str})
+    except (ValueError, UnicodeDecodeError) as exc:
+        # ParserError and EmptyDataError are ValueErrors
+        raise StoreInputsError(path, str(exc)) from exc
+    if "store_name" not in inputs.columns:
+        raise StoreInputsError(path, "missing required column 'store_name'")
+
+    rows = []
+    for number, record in enumerate(inputs.to_dict("records"), start=1):
+        try:
+            rows.append(_store_row(record))
+        except (TypeError, ValueError) as exc:
+            raise StoreInputsError(path, str(exc), number) from exc
+    return rows
+
+
+def _store_row(record):
+    row = {}
+    for column in INPUT_COLUMNS:
+        value = record.get(column)
+        if column in ("open_period_date", "close_period_date"):
+            row[column] = pd.to_datetime(value).date() if pd.notna(value) else datetime.today().date()
+        elif column in ("store_name", "department_csv"):
+            row[column] = value if isinstance(value, str) else ""
+        else:
+            value = 0 if value is None or pd.isna(value) else value
+            row[column] = int(value) if column in INTEGER_COLUMNS else float(value)
+
+    seed = record.get("seed")
+    row["seed"] = int(seed) if seed is not None and pd.notna(seed) else None
+
+    store = get_registry().find(row["store_name"])
+    if store is None:
+        raise ValueError(f"unknown store '{row['store_name']}'")
+    # Registry spelling, whatever the case / spacing in the file
+    row["store_name"] = store.name
+    return row
+
+
+SAVED_DEPARTMENTS = "saved"
+
+
+def department_source(row):
+    """Key of the department data a store row uses; rows with equal keys load the same frame"""
+    if row["department_csv"] == SAVED_DEPARTMENTS:
+        return (SAVED_DEPARTMENTS, get_registry().store_id(row["store_name"]), row["open_period_date"])
+    return row["department_csv"]
+
+
+def load_row_departments(row, stream_csv=False):
+    """Load the department data named by a store row (the default data when it names none)"""
+    if row["department_csv"] == SAVED_DEPARTMENTS:
+        return open_store().load(get_registry().store_id(row["store_name"]), row["open_period_date"])
+    if row["department_csv"] and stream_csv:
+        return engine.load_department_csv(row["department_csv"])
+    if row["department_csv"]:
+        return engine.department_frame(pd.read_csv(row["department_csv"]))
+    return engine.get_default_department_data()
+
+
+def apply_fuel_ledger(rows, ledger):
+    """Overwrite the fuel and inventory columns of every row with the ledger's figures for its period"""
+    filled = ledger.fill_frame(
+        [get_registry().store_id(row["store_name"]) for row in rows],
+        [row["open_period_date"] for row in rows],
+        [row["close_period_date"] for row in rows],
+    )
+    for row, values in zip(rows, filled[FILL_COLUMNS].to_dict("records")):
+        row.update({column: int(value) if column in INTEGER_COLUMNS else float(value) for column, value in values.items()})
+    return rows
+
+
+def row_inputs(row):
+    """ReportInputs for one store row of the inputs file"""
+    fuel_data = {
+        product: {"volume": row[f"{product.lower()}_volume"], "amount": row[f"{product.lower()}_amount"]}
+        for product in engine.fuel_products
+    }
+    return engine.ReportInputs(
+        store_name=row["store_name"],
+        open_period_date=row["open_period_date"],
+        close_period_date=row["close_period_date"],
+        fuel_data=fuel_data,
+        cig_items=row["cig_items"], cig_gross=row["cig_gross"],
+        ecig_items=row["ecig_items"], ecig_gross=row["ecig_gross"],
+        desired_merch_sale=row["desired_merch_sale"],
+        manual_credit=row["manual_credit"], manual_debit=row["manual_debit"], manual_mobile=row["manual_mobile"],
+        inventory_regular=row["inventory_regular"], inventory_super=row["inventory_super"], inventory_diesel=row["inventory_diesel"],
+        seed=row.get("seed"),
+    )
+
+
+def prepare_store_reports(row, output_dir, kinds=REPORT_KINDS, stream_csv=False, df=None):
+    """Run the pipeline for one store row and return (ReportData, [(template_name, context, output_path), ...])
+
+    Pass `df` to reuse department data that is already loaded.
+    """
+    if df is None:
+        df = load_row_departments(row, stream_csv)
+    data = engine.compute_report(row_inputs(row), df)
+    return data, [
+        (*engine.report_context(data, kind), os.path.join(output_dir, engine.report_data_filename(data, kind)))
+        for kind in kinds
+    ]
+
+
+def prepare_consolidated_accountant(rows, output_dir, stream_csv=False):
+    """(template_name, context, output_path) of the accountant's report covering every row
+
+    Rows with the same department data share one vectorized station_frame() pass.
+    """
+    inputs_list = [row_inputs(row) for row in rows]
+    groups = {}
+    for position, row in enumerate(rows):
+        groups.setdefault(department_source(row), []).append(position)
+
+    frames = []
+    for positions in groups.values():
+        df = load_row_departments(rows[positions[0]], stream_csv)
+        frames.append(engine.station_frame([inputs_list[i] for i in positions], df).set_axis(positions))
+    stations = pd.concat(frames).sort_index()
+
+    context = engine.consolidated_accountant_context(inputs_list, stations=stations)
+    output_path = os.path.join(output_dir, engine.consolidated_accountant_filename(inputs_list))
+    return engine.ACCOUNTANT_TEMPLATE, context, output_path
+
+
+# ===== WORKERS =====
+_worker_backend = None  # backend of a ProcessPoolExecutor worker, created by _init_worker
+
+
+def _init_worker(backend_name, backend_options):
+    global _worker_backend
+    _worker_backend = create_backend(backend_name, **backend_options)
+    multiprocessing.util.Finalize(None, _worker_backend.close, exitpriority=10)
+
+
+def render_to_file(backend, template_name, context, output_path):
+    pdf_bytes = engine.render_pdf(template_name, context, backend or _worker_backend)
+    with open(output_path, "wb") as f:
+        f.write(pdf_bytes)
+    return output_path
+
+
+def render_jobs(jobs, backend=None):
+    """Write the PDF of each (template_name, context, output_path); returns [(output_path, error or None), ...]
+
+    Runs in a pool worker: `backend` is None in a ProcessPoolExecutor worker,
+    which renders with the backend its initializer created.
+    """
+    results = []
+    for template_name, context, output_path in jobs:
+        try:
+            results.append((render_to_file(backend, template_name, context, output_path), None))
+        except Exception as exc:
+            results.append((output_path, exc))
+    return results
+
+
+def render_store_reports(row, output_dir, kinds=REPORT_KINDS, stream_csv=False, facts=False, backend=None):
+    """Compute one store row and write its PDFs; returns (cube facts or None, render_jobs() results)"""
+    data, jobs = prepare_store_reports(row, output_dir, kinds, stream_csv)
+    return (report_facts(data) if facts else None), render_jobs(jobs, backend)
+
+
+def render_consolidated_accountant(rows, output_dir, stream_csv=False, backend=None):
+    """Compute and write the accountant's report covering every row; returns render_jobs() results"""
+    return render_jobs([prepare_consolidated_accountant(rows, output_dir, stream_csv)], backend)
+
+
+def run_batch(rows, output_dir, workers=None, kinds=REPORT_KINDS, backend_name=None, timeout=None, stream_csv=False, consolidated=False, cube=None):
+    """Generate the reports for every row; returns (written paths, {path, store name or "consolidated accountant": error})
+
+    Each store's compute and renders run as one job. With the "pool" backend
+    the jobs run on threads sharing one pool of warm wkhtmltopdf workers: the
+    renders scale with the cores (they happen in the wkhtmltopdf processes),
+    the pandas compute and Jinja rendering stay on one core. With "native" and
+    "pdfkit" the jobs run in a process pool, one backend per process, so
+    compute, template rendering and PDF writing all scale with the cores.
+
+    With `consolidated`, the accountant's report is one PDF for all rows
+    instead of one per row. Pass a SalesCube to add the per-store reports
+    whose renders all succeeded to it and save it after the last render.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    backend_name = resolve_backend_name(backend_name)
+    backend_options = {}
+    if backend_name == PooledPdfBackend.name:
+        backend_options["max_workers"] = workers
+        if timeout:
+            backend_options["timeout"] = timeout
+        backend = create_backend(backend_name, **backend_options)
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        backend = None
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend_name, backend_options))
+
+    written, failed = [], {}
+    try:
+        with pool:
+            futures = {}
+            if consolidated and "accountant" in kinds:
+                kinds = [kind for kind in kinds if kind != "accountant"]
+                future = pool.submit(render_consolidated_accountant, rows, output_dir, stream_csv, backend)
+                futures[future] = ("consolidated accountant", False)
+            if kinds:
+                for row in rows:
+                    future = pool.submit(render_store_reports, row, output_dir, kinds, stream_csv, cube is not None, backend)
+                    futures[future] = (row["store_name"], True)
+
+            for future in as_completed(futures):
+                label, per_store = futures[future]
+                try:
+                    facts, results = future.result() if per_store else (None, future.result())
+                except Exception as exc:
+                    # Inputs or department data that could not be computed
+                    failed[label] = exc
+                    print(f"❌ {label}: {exc}", file=sys.stderr)
+                    continue
+                if facts is not None and all(exc is None for _, exc in results):
+                    cube.add_facts([facts])
+                for output_path, exc in results:
+                    if exc is None:
+                        written.append(output_path)
+                        print(f"✅ {output_path}")
+                    else:
+                        failed[output_path] = exc
+                        print(f"❌ {output_path}: {exc}", file=sys.stderr)
+            if cube is not None:
+                print(f"📈 Sales cube saved to {cube.save()}")
+    finally:
+        if backend is not None:
+            backend.close()
+    return written, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate store reports without the Streamlit UI")
+    parser.add_argument("inputs", help="CSV file with one row of inputs per store")
+    parser.add_argument("--init", action="store_true", help="write a template inputs file for every store and exit")
+    parser.add_argument("--output-dir", default="reports", help="directory for the generated PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent PDF renders (default: number of CPUs)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None, help="PDF backend (default: $SH_REPORTS_PDF_BACKEND or pool)")
+    parser.add_argument("--stream-csv", action="store_true", help="stream department_csv files in chunks and roll them up to department level")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per PDF render")
+    parser.add_argument("--reports", nargs="+", choices=REPORT_KINDS, default=list(REPORT_KINDS))
+    parser.add_argument("--consolidated", action="store_true", help="one accountant's report for all stores instead of one per store")
+    parser.add_argument("--pump-exports", nargs="+", default=None, help="pump export CSVs to take the fuel sales from")
+    parser.add_argument("--cube", nargs="?", const="", default=None, help="add the reports to the sales cube (default directory: $SH_REPORTS_SALES_CUBE or data/cube)")
+    parser.add_argument("--tank-exports", nargs="+", default=[], help="tank reading export CSVs to take the ending inventory from")
+    args = parser.parse_args(argv)
+
+    if args.init:
+        print(f"Wrote {write_input_template(args.inputs)}")
+        return 0
+
+    rows = read_store_inputs(args.inputs)
+    cube = SalesCube.load(args.cube or None) if args.cube is not None else None
+    if args.pump_exports or args.tank_exports:
+        apply_fuel_ledger(rows, FuelLedger.from_exports(args.pump_exports or [], args.tank_exports))
+    written, failed = run_batch(rows, args.output_dir, args.workers, args.reports, args.backend, args.timeout, args.stream_csv, args.consolidated, cube)
+    print(f"{len(written)} reports written to {args.output_dir}, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
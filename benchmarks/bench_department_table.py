@@ -0,0 +1,75 @@
+"""Benchmark the department table build: iterrows string concatenation vs column formatting.
+
+    python benchmarks/bench_department_table.py --sizes 37 1000 10000 50000
+"""
+import argparse
+import timeit
+
+import pandas as pd
+
+from synthetic import engine, make_final_frame
+
+
+def legacy_table_html(df_final_param):
+    """The previous iterrows / f-string implementation, kept for comparison"""
+    table_html = ""
+    for _, row in df_final_param.iterrows():
+        table_html += f"""
+        <tr class="dept-table">
+            <td>{row['Dept#'] if pd.notna(row['Dept#']) else ''}</td>
+            <td>{row['Description']}</td>
+            <td class="right">{int(row['Cust#']) if pd.notna(row['Cust#']) and str(row['Cust#']).isdigit() else ''}</td>
+            <td class="right">{int(row['Items']) if pd.notna(row['Items']) and str(row['Items']).isdigit() else ''}</td>
+            <td class="right">{row['% of Sales'] if pd.notna(row['% of Sales']) else ''}</td>
+            <td class="right">{row['Gross'] if pd.notna(row['Gross']) else ''}</td>
+            <td class="right">{row['Refunds'] if pd.notna(row['Refunds']) else ''}</td>
+            <td class="right">{row['Discounts'] if pd.notna(row['Discounts']) else ''}</td>
+            <td class="right">{row['Net Sales'] if pd.notna(row['Net Sales']) else ''}</td>
+        </tr>
+        """
+    return table_html
+
+
+ROW_TEMPLATE = """{% for row in department_rows %}
+        <tr class="dept-table">
+            <td>{{ row.dept }}</td>
+            <td>{{ row.description }}</td>
+            <td class="right">{{ row.cust }}</td>
+            <td class="right">{{ row.items }}</td>
+            <td class="right">{{ row.percent }}</td>
+            <td class="right">{{ row.gross }}</td>
+            <td class="right">{{ row.refunds }}</td>
+            <td class="right">{{ row.discounts }}</td>
+            <td class="right">{{ row.net_sales }}</td>
+        </tr>
+        {% endfor %}"""
+
+
+row_template = engine.get_template_env().from_string(ROW_TEMPLATE)
+
+
+def vectorized_table_html(df_final_param):
+    """Column formatting plus the template's {% for %} loop (same markup as realistic_report_template.html)"""
+    return row_template.render(department_rows=engine.format_department_rows(df_final_param))
+
+
+def best_of(func, arg, repeat):
+    return min(timeit.repeat(lambda: func(arg), number=1, repeat=repeat))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[37, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>8} {'iterrows (s)':>14} {'vectorized (s)':>15} {'speedup':>8}")
+    for rows in args.sizes:
+        df_final = make_final_frame(rows)
+        legacy = best_of(legacy_table_html, df_final, args.repeat)
+        vectorized = best_of(vectorized_table_html, df_final, args.repeat)
+        print(f"{rows:>8} {legacy:>14.4f} {vectorized:>15.4f} {legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
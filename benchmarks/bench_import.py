@@ -0,0 +1,97 @@
+"""Benchmark cold start: fresh interpreters importing the app and the headless workers.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --repeat 10 --importtime worker_import
+
+Every target runs in a new Python process, so nothing is shared between runs
+except the OS file cache and compiled .pyc files (as on a real host):
+    interpreter          bare `python -c pass`, the floor for everything else
+    worker_import        a batch / period worker importing its modules
+    worker_first_report  ... plus computing and rendering the first report to HTML
+    streamlit_import     importing streamlit and its script test harness
+    ui_first_screen      ... plus running report_pdf_app.py to its first screen
+
+ui_first_screen minus streamlit_import is the cost of the app itself. The
+"loaded" column lists the lazily imported modules each target ended up
+loading; --importtime prints the slowest imports of one target.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ["jinja2", "pdfkit", "pypdf", "pyarrow.dataset", "pyarrow.parquet"]
+
+TARGETS = {
+    "interpreter": "pass",
+    "worker_import": "import batch_reports, period_reports",
+    "worker_first_report": (
+        "import batch_reports\n"
+        "engine = batch_reports.engine\n"
+        "data = engine.compute_report(engine.ReportInputs(engine.get_registry().names[0], engine.date.today(), engine.date.today(), seed=0))\n"
+        "engine.render_report_html(data, 'main')"
+    ),
+    "streamlit_import": "import streamlit\nfrom streamlit.testing.v1 import AppTest",
+    "ui_first_screen": (
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file('report_pdf_app.py', default_timeout=120).run()\n"
+        "assert not at.exception, at.exception"
+    ),
+}
+
+REPORT_LOADED = f"\nimport json, sys\nprint(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+
+
+def run_target(code, importtime=False):
+    """(wall seconds, lazily imported modules that got loaded, stderr) of one fresh interpreter"""
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", code + REPORT_LOADED]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit code {result.returncode}")
+    return seconds, json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """[(cumulative microseconds, module), ...] from python -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), module.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", choices=list(TARGETS), default=None, help="print the slowest imports of this target")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    print(f"{'target':>20} {'best (s)':>10} {'median (s)':>10}  loaded")
+    for name in args.targets:
+        try:
+            runs = [run_target(TARGETS[name]) for _ in range(args.repeat)]
+        except RuntimeError as exc:
+            print(f"{name:>20} failed: {exc}")
+            continue
+        times = [seconds for seconds, _, _ in runs]
+        print(f"{name:>20} {min(times):>10.3f} {statistics.median(times):>10.3f}  {', '.join(runs[-1][1]) or '-'}")
+
+    if args.importtime:
+        _, _, stderr = run_target(TARGETS[args.importtime], importtime=True)
+        print(f"\nslowest imports of {args.importtime} (cumulative)")
+        for microseconds, module in slowest_imports(stderr, args.top):
+            print(f"{microseconds / 1e6:>10.3f}s {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Benchmark the main report render: Jinja + wkhtmltopdf vs the native PDF layout.
+
+    python benchmarks/bench_native_pdf.py --sizes 37 1000 5000 --backends native pool pdfkit
+
+HTML backends whose wkhtmltopdf binary cannot be found are reported and skipped.
+"""
+import argparse
+import timeit
+
+from synthetic import engine, make_report_data
+from pdf_backends import PdfRenderError, create_backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[37, 1000, 5000])
+    parser.add_argument("--backends", nargs="+", default=["native", "pool", "pdfkit"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    backends = {}
+    for name in args.backends:
+        try:
+            backends[name] = create_backend(name)
+        except (OSError, PdfRenderError) as exc:
+            print(f"skipping {name}: {exc}")
+
+    print(f"{'rows':>8} {'backend':>8} {'best (s)':>10} {'PDF bytes':>10}")
+    try:
+        for rows in args.sizes:
+            template_name, context = engine.report_context(make_report_data(rows), "main")
+            for name, backend in backends.items():
+                render = lambda: engine.render_pdf(template_name, context, backend)  # noqa: E731
+                size = len(render())  # also warms pooled workers up
+                best = min(timeit.repeat(render, number=1, repeat=args.repeat))
+                print(f"{rows:>8} {name:>8} {best:>10.4f} {size:>10}")
+    finally:
+        for backend in backends.values():
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""Load test: concurrent virtual users generating reports, per PDF backend and concurrency level.
+
+    python benchmarks/load_test.py --backends pool native --users 1 4 16 --duration 30
+    python benchmarks/load_test.py --url http://127.0.0.1:8765 --users 8 32 --server-pid 1234
+
+Every virtual user is a thread that loops over the stores in the registry
+(each user starting at its own offset), alternating the main and accountant's
+reports. With --url the users POST to report_service.py over one keep-alive
+connection each; otherwise they call compute_report() and render_report_pdf()
+in this process on a shared backend, as the Streamlit sessions of one server do.
+
+For every backend and concurrency level it reports completed requests,
+throughput, p50 / p95 / p99 latency, peak RSS of the process tree doing the
+work (this process and its wkhtmltopdf workers, or --server-pid and its
+children) and errors by type.
+
+Mix-ups: before the timed runs every (store, kind, seed) request is made once
+on its own, and the PDF's fingerprint (its bytes without the creation date /
+document ID) becomes the reference. Any concurrent response with a different
+fingerprint, or (with --url) with the wrong X-Report-Store / X-Request-Id, is
+counted as mixed up. A backend whose output changes between two identical
+sequential requests cannot be checked and is reported as "n/a".
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import threading
+import time
+from dataclasses import asdict
+from datetime import date
+from urllib.parse import urlsplit
+
+from synthetic import engine, make_inputs
+from run_benchmarks import BENCHMARK_DIR, environment
+import pdf_backends
+from pdf_backends import PdfRenderError, create_backend
+from store_registry import get_registry
+
+VOLATILE_PDF_FIELDS = re.compile(rb"/(CreationDate|ModDate)\s*\([^)]*\)|/ID\s*\[[^\]]*\]")
+
+
+def pdf_fingerprint(pdf_bytes):
+    """Hash of a PDF without the fields that change on every render"""
+    return hashlib.sha256(VOLATILE_PDF_FIELDS.sub(b"", pdf_bytes)).hexdigest()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+# ===== RSS SAMPLING =====
+def _process_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid):
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def process_tree_rss(pid):
+    """Resident memory of a process and all its descendants in bytes (Linux /proc)"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += _process_rss(current)
+        pending.extend(_children(current))
+    return total
+
+
+class RssSampler:
+    """Background thread recording the peak RSS of a process tree while a level runs"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak and self.pid == os.getpid():
+            # No /proc: fall back to the process's lifetime peak (kB on Linux)
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ===== CLIENTS =====
+class InProcessClient:
+    """Computes and renders reports in this process on one shared backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.departments = engine.get_default_department_data()
+
+    def connect(self):
+        return self
+
+    def request(self, store_name, kind, seed, request_id):
+        data = engine.compute_report(make_inputs(store_name, seed), self.departments)
+        return engine.render_report_pdf(data, kind, self.backend), None
+
+    def close(self):
+        pass
+
+
+class HttpClient:
+    """One keep-alive connection to report_service.py per virtual user"""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port or 80, timeout
+        self._connection = None
+
+    def connect(self):
+        client = HttpClient.__new__(HttpClient)
+        client.host, client.port, client.timeout = self.host, self.port, self.timeout
+        client._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return client
+
+    def request(self, store_name, kind, seed, request_id):
+        payload = {key: value.isoformat() if isinstance(value, date) else value for key, value in asdict(make_inputs(store_name, seed)).items()}
+        try:
+            self._connection.request("POST", f"/reports/{kind}", json.dumps(payload), {"Content-Type": "application/json", "X-Request-Id": request_id})
+            response = self._connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            self._connection.close()
+            raise
+        if response.status != 200:
+            raise HttpError(response.status, body)
+        return body, response
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+class HttpError(RuntimeError):
+    def __init__(self, status, body):
+        super().__init__(f"HTTP {status}: {body[:200]!r}")
+        self.status = status
+
+
+def error_name(exc):
+    return f"http_{exc.status}" if isinstance(exc, HttpError) else type(exc).__name__
+
+
+def mixed_up(response, store_name, request_id):
+    """Whether the response headers name another store or request (HTTP mode)"""
+    if response is None:
+        return False
+    return (
+        response.getheader("X-Report-Store") != get_registry().store_id(store_name)
+        or response.getheader("X-Request-Id") != request_id
+    )
+
+
+# ===== RUNS =====
+def request_keys(stores, seeds):
+    return [(store_name, kind, seed) for seed in range(seeds) for store_name in stores for kind in engine.REPORT_KINDS]
+
+
+def reference_fingerprints(client, keys):
+    """{key: fingerprint} of sequential requests, or None when the output is not deterministic"""
+    connection = client.connect()
+    try:
+        first = pdf_fingerprint(connection.request(*keys[0], "reference-0")[0])
+        if pdf_fingerprint(connection.request(*keys[0], "reference-1")[0]) != first:
+            return None
+        return {key: pdf_fingerprint(connection.request(*key, f"reference-{key}")[0]) for key in keys}
+    finally:
+        connection.close()
+
+
+def run_level(client, users, keys, duration, requests_per_user, references, pid):
+    """Run `users` virtual users against the client; returns the level's summary dict"""
+    latencies, errors, mixups = [], {}, [0]
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(users + 1)
+    deadline = [0.0]
+
+    def virtual_user(user):
+        connection = client.connect()
+        done = 0
+        try:
+            start_barrier.wait()
+            while True:
+                if requests_per_user and done >= requests_per_user:
+                    break
+                if not requests_per_user and time.perf_counter() >= deadline[0]:
+                    break
+                key = keys[(user * 7 + done) % len(keys)]
+                request_id = f"{user}-{done}"
+                started = time.perf_counter()
+                try:
+                    pdf_bytes, response = connection.request(*key, request_id)
+                except Exception as exc:
+                    with lock:
+                        errors[error_name(exc)] = errors.get(error_name(exc), 0) + 1
+                else:
+                    seconds = time.perf_counter() - started
+                    wrong = mixed_up(response, key[0], request_id) or (
+                        references is not None and pdf_fingerprint(pdf_bytes) != references[key]
+                    )
+                    with lock:
+                        latencies.append(seconds)
+                        mixups[0] += wrong
+                done += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=virtual_user, args=(user,), daemon=True) for user in range(users)]
+    for thread in threads:
+        thread.start()
+    with RssSampler(pid) as sampler:
+        deadline[0] = time.perf_counter() + duration
+        started = time.perf_counter()
+        start_barrier.wait()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "users": users,
+        "requests": len(latencies),
+        "errors": errors,
+        "error_count": sum(errors.values()),
+        "mixups": mixups[0] if references is not None else None,
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "mean": statistics.fmean(latencies) if latencies else None,
+        "peak_rss_mb": sampler.peak / 1024 / 1024,
+    }
+
+
+def print_level(target, row):
+    def ms(value):
+        return f"{value * 1000:>8.0f}" if value is not None else f"{'-':>8}"
+
+    mixups = "n/a" if row["mixups"] is None else str(row["mixups"])
+    errors = ", ".join(f"{name}={count}" for name, count in sorted(row["errors"].items())) or "-"
+    print(
+        f"{target:>10} {row['users']:>5} {row['requests']:>8} {row['throughput']:>8.2f} "
+        f"{ms(row['p50'])} {ms(row['p95'])} {ms(row['p99'])} {row['peak_rss_mb']:>9.1f} {mixups:>6}  {errors}",
+        flush=True,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=sorted(pdf_backends.BACKENDS), help="PDF backends to test in-process")
+    parser.add_argument("--url", default=None, help="test a running report_service.py instead of the in-process pipeline")
+    parser.add_argument("--server-pid", type=int, default=None, help="process whose memory is sampled with --url (default: this one)")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="concurrency levels (virtual users)")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--requests", type=int, default=None, help="requests per user per level instead of --duration")
+    parser.add_argument("--stores", type=int, default=None, help="use only the first N stores of the registry")
+    parser.add_argument("--seeds", type=int, default=1, help="distinct seeds per store (more seeds, more reference renders)")
+    parser.add_argument("--pdf-workers", type=int, default=None, help="wkhtmltopdf pool size (default: $SH_REPORTS_PDF_WORKERS)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per render / HTTP request")
+    parser.add_argument("--no-verify", action="store_true", help="skip the reference renders and the mix-up check")
+    parser.add_argument("--output", default=None, help="results JSON (default: benchmarks/results/load_<commit>.json)")
+    args = parser.parse_args(argv)
+
+    stores = list(get_registry().names[:args.stores] if args.stores else get_registry().names)
+    keys = request_keys(stores, args.seeds)
+    env = environment()
+    results, skipped = [], {}
+
+    print(f"{'target':>10} {'users':>5} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>9} {'mixups':>6}  errors")
+    if args.url:
+        targets = [("http", lambda: HttpClient(args.url, args.timeout or 300), args.server_pid or os.getpid())]
+    else:
+        def backend_client(name):
+            options = {}
+            if name == pdf_backends.PooledPdfBackend.name:
+                if args.pdf_workers:
+                    options["max_workers"] = args.pdf_workers
+                if args.timeout:
+                    options["timeout"] = args.timeout
+            return lambda: InProcessClient(create_backend(name, **options))
+        targets = [(name, backend_client(name), os.getpid()) for name in args.backends]
+
+    for target, make_client, pid in targets:
+        try:
+            client = make_client()
+            references = None if args.no_verify else reference_fingerprints(client, keys)
+        except (OSError, PdfRenderError, HttpError) as exc:
+            skipped[target] = str(exc).splitlines()[0]
+            print(f"skipping {target}: {skipped[target]}")
+            continue
+        try:
+            for users in args.users:
+                row = run_level(client, users, keys, args.duration, args.requests, references, pid)
+                results.append({"target": target, **row})
+                print_level(target, row)
+        finally:
+            if isinstance(client, InProcessClient):
+                client.backend.close()
+
+    report = {
+        "environment": env,
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "skipped": skipped,
+        "results": results,
+    }
+    output = args.output or os.path.join(BENCHMARK_DIR, "results", f"load_{(env['commit'] or 'unknown')[:12]}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 1 if any(row["mixups"] for row in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Benchmark suite for the compute, template and PDF stages.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 37 1000 --repeat 3 --output before.json
+    python benchmarks/run_benchmarks.py --compare before.json
+
+Stages, each timed at every department table size:
+    csv_load           load_department_csv() of a synthetic CSV file
+    store_load         DepartmentStore.load() of the same table saved as Parquet
+    pipeline           compute_report(): masks, scaling, summary row, tax, MOP
+    table              format_department_rows() (the department table build)
+    render_main        Jinja render of realistic_report_template.html
+    render_accountant  Jinja render of Accountant_report.html
+    pdf_<backend>      main report PDF on each available backend (up to --pdf-max-rows)
+plus batch_<backend>: compute and render both reports for all 27 stores, and
+accountant_all_<backend>: the consolidated 27-station accountant's report.
+
+Results are written as JSON (default benchmarks/results/<commit>.json, which
+git ignores) with the commit, machine and library versions, so runs on different commits can be
+compared with --compare. Backends whose wkhtmltopdf binary is missing are
+skipped and listed in the results.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import date, datetime, timezone
+
+from synthetic import engine, make_department_frame, make_inputs, make_report_data
+from department_store import DepartmentStore
+from store_registry import get_registry
+import pdf_backends
+from pdf_backends import PdfRenderError, create_backend
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_SIZES = [37, 1000, 10000, 100000]
+
+
+def git_commit():
+    """(commit hash, working tree dirty?) of the repository, or (None, None) outside git"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def environment():
+    import jinja2
+    import numpy
+    import pandas
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {"pandas": pandas.__version__, "numpy": numpy.__version__, "jinja2": jinja2.__version__},
+    }
+
+
+def measure(func, repeat):
+    """Best / median / mean seconds per func() call over `repeat` runs
+
+    Each run loops func() enough times to take at least 0.2s (timeit's
+    autorange, which also serves as the warm-up), so sub-millisecond stages
+    are not lost in timer noise.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {"best": min(times), "median": statistics.median(times), "mean": statistics.fmean(times), "repeat": repeat, "number": number}
+
+
+def write_department_csv(rows, directory):
+    path = os.path.join(directory, f"departments_{rows}.csv")
+    frame = engine.dollars_frame(make_department_frame(rows)).drop(columns=["Category", "Net Sales"])
+    frame.to_csv(path, index=False)
+    return path
+
+
+def open_backends(names):
+    backends, skipped = {}, {}
+    for name in names:
+        try:
+            backends[name] = create_backend(name)
+        except (OSError, PdfRenderError) as exc:
+            skipped[name] = str(exc).splitlines()[0]
+    return backends, skipped
+
+
+def run_suite(sizes, repeat, backend_names, pdf_max_rows, batch_backend_names):
+    results = []
+
+    def record(stage, size, timing):
+        results.append({"stage": stage, "size": size, **timing})
+        print(f"{stage:>18} {size:>8} {timing['best']:>10.5f} {timing['median']:>10.5f}", flush=True)
+
+    backends, skipped = open_backends(sorted(set(backend_names) | set(batch_backend_names)))
+    for name, reason in skipped.items():
+        print(f"skipping {name}: {reason}")
+
+    print(f"{'stage':>18} {'rows':>8} {'best (s)':>10} {'median (s)':>10}")
+    try:
+        with tempfile.TemporaryDirectory(prefix="sh_reports_bench_") as workdir:
+            for size in sizes:
+                csv_path = write_department_csv(size, workdir)
+                record("csv_load", size, measure(lambda: engine.load_department_csv(csv_path), repeat))
+
+                store = DepartmentStore(os.path.join(workdir, "departments"))
+                store.append(str(size), date(2025, 1, 1), engine.load_department_csv(csv_path))
+                record("store_load", size, measure(lambda: store.load(str(size), date(2025, 1, 31)), repeat))
+
+                departments = make_department_frame(size)
+                inputs = make_inputs()
+                record("pipeline", size, measure(lambda: engine.compute_report(inputs, departments), repeat))
+
+                data = make_report_data(size)
+                record("table", size, measure(lambda: engine.format_department_rows(data.df_final), repeat))
+
+                for kind, template_name in (("main", engine.MAIN_TEMPLATE), ("accountant", engine.ACCOUNTANT_TEMPLATE)):
+                    _, context = engine.report_context(data, kind)
+                    record(f"render_{kind}", size, measure(lambda: engine.render_template(template_name, context), repeat))
+
+                if size <= pdf_max_rows:
+                    _, context = engine.report_context(data, "main")
+                    for name in backend_names:
+                        if name in backends:
+                            backend = backends[name]
+                            record(f"pdf_{name}", size, measure(lambda: engine.render_pdf(engine.MAIN_TEMPLATE, context, backend), repeat))
+
+            default_departments = engine.get_default_department_data()
+            for name in batch_backend_names:
+                if name not in backends:
+                    continue
+                backend = backends[name]
+
+                def batch():
+                    for store_name in get_registry().names:
+                        data = engine.compute_report(make_inputs(store_name), default_departments)
+                        for kind in engine.REPORT_KINDS:
+                            engine.render_report_pdf(data, kind, backend)
+
+                def accountant_all():
+                    inputs_list = [make_inputs(store_name) for store_name in get_registry().names]
+                    engine.render_consolidated_accountant_pdf(inputs_list, backend, default_departments)
+
+                try:
+                    record(f"accountant_all_{name}", len(get_registry().names), measure(accountant_all, max(1, repeat // 2)))
+                    record(f"batch_{name}", len(get_registry().names), measure(batch, max(1, repeat // 2)))
+                except (OSError, PdfRenderError) as exc:
+                    # e.g. the native backend's wkhtmltopdf fallback for the accountant's report
+                    skipped[f"batch_{name}"] = str(exc).splitlines()[0]
+                    print(f"skipping batch_{name}: {skipped[f'batch_{name}']}")
+    finally:
+        for backend in backends.values():
+            backend.close()
+    return results, skipped
+
+
+def compare(results, baseline, threshold):
+    """Print per-stage best-time ratios against a baseline run; return the regressions"""
+    previous = {(row["stage"], row["size"]): row for row in baseline["results"]}
+    regressions = []
+    print(f"\nvs {baseline['environment'].get('commit') or 'baseline'}")
+    print(f"{'stage':>18} {'rows':>8} {'before (s)':>11} {'after (s)':>10} {'change':>8}")
+    for row in results:
+        before = previous.get((row["stage"], row["size"]))
+        if before is None:
+            continue
+        change = row["best"] / before["best"] - 1 if before["best"] else 0.0
+        flag = "  <-- slower" if change > threshold else ""
+        print(f"{row['stage']:>18} {row['size']:>8} {before['best']:>11.5f} {row['best']:>10.5f} {change:>+7.1%}{flag}")
+        if flag:
+            regressions.append((row["stage"], row["size"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="department table sizes in rows")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=sorted(pdf_backends.BACKENDS), help="PDF backends to time")
+    parser.add_argument("--pdf-max-rows", type=int, default=10000, help="largest table size sent to the PDF backends")
+    parser.add_argument("--batch-backends", nargs="+", default=sorted(pdf_backends.BACKENDS), help="backends for the 27-store batch")
+    parser.add_argument("--output", default=None, help="results JSON (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    env = environment()
+    started = time.perf_counter()
+    results, skipped = run_suite(args.sizes, args.repeat, args.backends, args.pdf_max_rows, args.batch_backends)
+    report = {
+        "environment": env,
+        "settings": {"sizes": args.sizes, "repeat": args.repeat, "pdf_max_rows": args.pdf_max_rows},
+        "skipped_backends": skipped,
+        "duration": time.perf_counter() - started,
+        "results": results,
+    }
+
+    output = args.output or os.path.join(BENCHMARK_DIR, "results", f"{(env['commit'] or 'unknown')[:12]}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Synthetic department data for the benchmarks."""
+import os
+import random
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report_engine as engine  # noqa: E402
+
+
+def make_department_frame(rows, seed=0):
+    """Return a department frame shaped like get_default_department_data() with `rows` rows
+
+    The default 37 departments are kept (so the cigarette, e-cig and fuel rows are
+    present) and padded with random PLU-level merch rows.
+    """
+    base = engine.get_default_department_data()
+    if rows <= len(base):
+        return base.head(rows).reset_index(drop=True)
+
+    rng = np.random.default_rng(seed)
+    extra = rows - len(base)
+    names = np.array(["SNACKS", "SODA", "CANDY", "GROCERY", "BEER", "DAIRY", "COFFEE", "DELI", "CHIPS", "WATER"])
+    gross = rng.uniform(0, 500, extra).round(2)
+    padding = pd.DataFrame({
+        "Dept#": np.arange(10000, 10000 + extra),
+        "Description": [f"{name} PLU {i}" for i, name in enumerate(rng.choice(names, extra))],
+        "Cust#": rng.integers(0, 200, extra),
+        "Items": rng.integers(0, 300, extra),
+        "Gross": gross,
+        "Refunds": np.zeros(extra),
+        "Discounts": np.zeros(extra),
+    })
+    return engine.mark_cents(pd.concat([base, engine.department_frame(padding)], ignore_index=True))
+
+
+def make_final_frame(rows, seed=0):
+    """Run the department pipeline over a synthetic frame and return df_final"""
+    processed = engine.process_department_data(
+        make_department_frame(rows, seed), "Shell - Syed Empires",
+        500, 420, 6000.0, 40, 35, 900.0, 60000.0, 15000.0,
+        rng=random.Random(seed)
+    )
+    return processed["df_final"]
+
+
+def make_inputs(store_name="Shell - Syed Empires", seed=0):
+    """ReportInputs with realistic non-zero figures for one store and month"""
+    return engine.ReportInputs(
+        store_name=store_name,
+        open_period_date=date(2025, 1, 1),
+        close_period_date=date(2025, 1, 31),
+        fuel_data={
+            "REG": {"volume": 42000, "amount": 130000.0},
+            "PLUS": {"volume": 3000, "amount": 10500.0},
+            "SUPER": {"volume": 5000, "amount": 19000.0},
+            "DIESEL": {"volume": 8000, "amount": 30000.0},
+        },
+        cig_items=500, cig_gross=6000.0,
+        ecig_items=40, ecig_gross=900.0,
+        desired_merch_sale=60000.0,
+        manual_credit=90000.0, manual_debit=40000.0, manual_mobile=2000.0,
+        inventory_regular=9000, inventory_super=2000, inventory_diesel=3000,
+        seed=seed,
+    )
+
+
+def make_report_data(rows, seed=0):
+    """compute_report() over a synthetic department frame with `rows` rows"""
+    return engine.compute_report(make_inputs(seed=seed), make_department_frame(rows, seed))
@@ -0,0 +1,209 @@
+"""Persistent Parquet dataset of department data, partitioned by store and period.
+
+Department tables are saved once (from an upload, a CSV export or a batch run)
+and read back by store and date instead of being uploaded and re-parsed every
+session. The layout is hive-partitioned:
+
+    <root>/store_id=807606/period=2025-01-01/part-0.parquet
+
+A period is named by its first day; load() picks the latest period that starts
+on or before the requested date. Reads memory-map the Parquet file and only
+decode the requested columns. append() adds a new period without touching the
+others; replacing an existing period needs overwrite=True.
+
+    python department_store.py import departments.csv --store-id 807606 --period 2025-01-01
+    python department_store.py list
+
+SH_REPORTS_DEPARTMENT_STORE sets the default root used by open_store().
+pyarrow is imported on the first read or write, not with this module.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pandas as pd
+
+import report_engine as engine
+from instrumentation import span
+
+DEFAULT_STORE_DIR = os.path.join(engine.TEMPLATE_DIR, "data", "departments")
+PART_FILE = "part-0.parquet"
+
+# Columns kept on disk; Net Sales and Category are derived again on load
+STORED_COLUMNS = [*engine.DEPARTMENT_KEY_COLUMNS, *engine.DEPARTMENT_VALUE_COLUMNS]
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("Dept#", pa.int32()),
+        ("Description", pa.dictionary(pa.int32(), pa.string())),
+        ("Cust#", pa.int64()),
+        ("Items", pa.int64()),
+        # Money in integer cents, as in the pipeline
+        ("Gross", pa.int64()),
+        ("Refunds", pa.int64()),
+        ("Discounts", pa.int64()),
+    ])
+
+
+def _period_name(period):
+    return period.isoformat() if isinstance(period, date) else date.fromisoformat(str(period)).isoformat()
+
+
+class DepartmentStore:
+    """Department tables on disk, one Parquet file per (store_id, period)"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def _partition(self, store_id, period):
+        return os.path.join(self.root, f"store_id={store_id}", f"period={_period_name(period)}")
+
+    def path(self, store_id, period):
+        return os.path.join(self._partition(store_id, period), PART_FILE)
+
+    def stores(self):
+        """Store IDs that have at least one period saved"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name.split("=", 1)[1] for name in os.listdir(self.root)
+            if name.startswith("store_id=") and self.periods(name.split("=", 1)[1])
+        )
+
+    def periods(self, store_id):
+        """Saved period start dates of a store, oldest first"""
+        store_dir = os.path.join(self.root, f"store_id={store_id}")
+        if not os.path.isdir(store_dir):
+            return []
+        return sorted(
+            date.fromisoformat(name.split("=", 1)[1]) for name in os.listdir(store_dir)
+            if name.startswith("period=") and os.path.exists(os.path.join(store_dir, name, PART_FILE))
+        )
+
+    def period_for(self, store_id, day):
+        """Start of the latest saved period of the store beginning on or before day, or None"""
+        candidates = [period for period in self.periods(store_id) if period <= day]
+        return candidates[-1] if candidates else None
+
+    def version(self, store_id, period):
+        """Changes whenever the period is rewritten (for cache keys)"""
+        return os.stat(self.path(store_id, period)).st_mtime_ns
+
+    def append(self, store_id, period, departments, overwrite=False):
+        """Save a department frame as the store's data for the period starting on `period`"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = self.path(store_id, period)
+        if os.path.exists(path) and not overwrite:
+            raise FileExistsError(f"Department data for store {store_id}, period {_period_name(period)} already exists")
+        missing = [column for column in engine.REQUIRED_CSV_COLUMNS if column not in departments.columns]
+        if missing:
+            raise ValueError(f"Department data is missing required columns: {', '.join(missing)}")
+
+        frame = engine.department_frame(departments).reindex(columns=STORED_COLUMNS)
+        for column in engine.DEPARTMENT_COUNT_COLUMNS:
+            frame[column] = frame[column].fillna(0)
+        frame["Description"] = frame["Description"].astype(str)
+        table = pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False)
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so readers never open a half-written file; dot files are skipped by dataset scans
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        os.close(fd)
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        return path
+
+    def import_csv(self, store_id, period, source, overwrite=False):
+        """Stream a department or item-level CSV (see load_department_csv) into the store"""
+        return self.append(store_id, period, engine.load_department_csv(source), overwrite)
+
+    def load(self, store_id, day, columns=None):
+        """Department frame of the store's period covering `day`, ready for compute_report()
+
+        `columns` limits the columns decoded from disk (all stored columns by
+        default); Net Sales and Category are only added when their inputs were read.
+        """
+        period = self.period_for(store_id, day)
+        if period is None:
+            raise LookupError(f"No department data saved for store {store_id} on or before {day}")
+        import pyarrow.parquet as pq
+
+        with span("department_store_load", store_id=store_id):
+            columns = list(columns or STORED_COLUMNS)
+            table = pq.read_table(self.path(store_id, period), columns=columns, memory_map=True)
+            df = table.to_pandas()
+            for column in engine.DEPARTMENT_MONEY_COLUMNS:
+                if column in columns and df[column].dtype.kind == "f":
+                    # Periods saved before money was stored as cents
+                    df[column] = engine.to_cents(df[column])
+            if set(engine.DEPARTMENT_MONEY_COLUMNS) <= set(columns):
+                df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
+            if "Description" in columns:
+                df["Category"] = engine.classify_departments(df["Description"])
+            return engine.mark_cents(df)
+
+    def scan(self, columns=None, store_ids=None, start=None, end=None):
+        """All saved rows (optionally of some stores / periods starting in start..end) as one frame
+
+        Partition filters prune whole files before any data is read; the result
+        has store_id and period columns next to the requested department columns.
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=[*(columns or STORED_COLUMNS), "store_id", "period"])
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        partitioning = ds.partitioning(pa.schema([("store_id", pa.string()), ("period", pa.string())]), flavor="hive")
+        dataset = ds.dataset(self.root, format="parquet", partitioning=partitioning)
+        condition = None
+        filters = []
+        if store_ids is not None:
+            filters.append(ds.field("store_id").isin([str(store_id) for store_id in store_ids]))
+        if start is not None:
+            filters.append(ds.field("period") >= _period_name(start))
+        if end is not None:
+            filters.append(ds.field("period") <= _period_name(end))
+        for expression in filters:
+            condition = expression if condition is None else condition & expression
+        table = dataset.to_table(columns=[*(columns or STORED_COLUMNS), "store_id", "period"], filter=condition)
+        df = table.to_pandas()
+        df["period"] = pd.to_datetime(df["period"]).dt.date
+        return df
+
+
+def open_store(root=None):
+    """DepartmentStore at root, defaulting to $SH_REPORTS_DEPARTMENT_STORE"""
+    return DepartmentStore(root or os.environ.get("SH_REPORTS_DEPARTMENT_STORE", DEFAULT_STORE_DIR))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the saved department data")
+    parser.add_argument("--root", default=None, help="dataset directory (default: $SH_REPORTS_DEPARTMENT_STORE or data/departments)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="save a department CSV as one store's period")
+    import_parser.add_argument("csv")
+    import_parser.add_argument("--store-id", required=True)
+    import_parser.add_argument("--period", required=True, type=date.fromisoformat, help="first day of the period (YYYY-MM-DD)")
+    import_parser.add_argument("--overwrite", action="store_true", help="replace the period if it is already saved")
+    commands.add_parser("list", help="list saved stores and periods")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.root)
+    if args.command == "import":
+        print(f"Wrote {store.import_csv(args.store_id, args.period, args.csv, args.overwrite)}")
+    else:
+        for store_id in store.stores():
+            print(store_id, " ".join(period.isoformat() for period in store.periods(store_id)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Fuel ledger: fuel sales and ending inventory from the sites' pump and tank exports.
+
+Instead of typing the four grades' volume / amount and the three ending
+inventories, the daily export files of every site are streamed in once and
+rolled up, and any number of stores and periods are filled from the rollup.
+
+Pump exports hold one row per dispenser transaction or daily pump total:
+    store_id, timestamp, grade, volume, amount      (pump and other columns are ignored)
+Tank exports hold one row per tank reading:
+    store_id, timestamp, tank, grade, volume
+
+Files are read in chunks with only these columns parsed. Each chunk is reduced
+to per (store, day, grade) sums and per (store, day, tank) last readings before
+the next chunk is read, so memory depends on stores x days, not on file size.
+Amounts are summed in integer cents. Grades are matched case-insensitively to
+fuel_products through GRADE_ALIASES; unknown grades are an error rather than
+dropped. Ending inventory is each tank's last reading on or before the period's
+close date, summed by grade.
+
+    ledger = FuelLedger.from_exports(["pumps_jan.csv"], ["tanks_jan.csv"])
+    inputs_list = ledger.apply(inputs_list)      # ReportInputs with fuel filled in
+
+    python fuel_ledger.py --pumps pumps_*.csv --tanks tanks_*.csv --start 2025-01-01 --end 2025-01-31
+"""
+import argparse
+import sys
+from dataclasses import replace
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import report_engine as engine
+from instrumentation import span
+from store_registry import get_registry
+
+PUMP_DTYPES = {"store_id": "category", "timestamp": "string", "grade": "category", "volume": "float64", "amount": "float64"}
+TANK_DTYPES = {"store_id": "category", "timestamp": "string", "tank": "category", "grade": "category", "volume": "float64"}
+
+GRADE_ALIASES = {
+    "REG": "REG", "REGULAR": "REG", "UNLEADED": "REG", "UNL": "REG", "87": "REG",
+    "PLUS": "PLUS", "MID": "PLUS", "MIDGRADE": "PLUS", "89": "PLUS",
+    "SUPER": "SUPER", "PREMIUM": "SUPER", "PREM": "SUPER", "93": "SUPER",
+    "DIESEL": "DIESEL", "DSL": "DIESEL", "ULSD": "DIESEL",
+}
+# Inventory field -> tank grade (PLUS is blended at the pump and has no tank)
+INVENTORY_GRADES = {"inventory_regular": "REG", "inventory_super": "SUPER", "inventory_diesel": "DIESEL"}
+
+# Columns of the per-store fill frame, named as in the batch inputs file
+FUEL_COLUMNS = [f"{product.lower()}_{field}" for product in engine.fuel_products for field in ("volume", "amount")]
+FILL_COLUMNS = [*FUEL_COLUMNS, *INVENTORY_GRADES]
+
+
+def normalize_grades(grades):
+    """fuel_products grade of every value of a categorical grade column"""
+    if grades.isna().any():
+        raise ValueError("Fuel export has rows without a grade")
+    categories = grades.cat.categories
+    mapped = [GRADE_ALIASES.get(str(category).strip().upper()) for category in categories]
+    unknown = [str(category) for category, grade in zip(categories, mapped) if grade is None]
+    if unknown:
+        raise ValueError(f"Unknown fuel grade(s): {', '.join(sorted(unknown))}")
+    return pd.Categorical(np.asarray(mapped, dtype=object)[grades.cat.codes], categories=engine.fuel_products)
+
+
+def _read_chunks(source, dtypes, chunksize, kind):
+    reader = pd.read_csv(source, usecols=lambda column: column in dtypes, dtype=dtypes, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            missing = [column for column in dtypes if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"{kind} export is missing required columns: {', '.join(missing)}")
+            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], format="ISO8601")
+            chunk["day"] = chunk["timestamp"].dt.normalize()
+            chunk["grade"] = normalize_grades(chunk["grade"])
+            chunk["store_id"] = chunk["store_id"].astype(str)
+            yield chunk
+
+
+def read_pump_exports(sources, chunksize=200_000):
+    """Daily sales frame: store_id, day, grade, volume, amount (cents) summed over every pump export"""
+    parts = []
+    with span("fuel_pump_load", files=len(sources)):
+        for source in sources:
+            for chunk in _read_chunks(source, PUMP_DTYPES, chunksize, "Pump"):
+                chunk["volume"] = chunk["volume"].fillna(0)
+                # Cents before summing, as for the department data
+                chunk["amount"] = engine.to_cents(chunk["amount"].fillna(0))
+                parts.append(chunk.groupby(["store_id", "day", "grade"], observed=True, sort=False)[["volume", "amount"]].sum())
+                if len(parts) > 1:
+                    parts = [pd.concat(parts).groupby(level=[0, 1, 2], observed=True, sort=False).sum()]
+        if not parts:
+            return pd.DataFrame({"store_id": [], "day": pd.Series(dtype="datetime64[ns]"), "grade": [], "volume": [], "amount": pd.Series(dtype="int64")})
+        return parts[0].reset_index()
+
+
+def read_tank_exports(sources, chunksize=200_000):
+    """Last reading of every tank per day: store_id, tank, day, timestamp, grade, volume"""
+    parts = []
+    with span("fuel_tank_load", files=len(sources)):
+        for source in sources:
+            for chunk in _read_chunks(source, TANK_DTYPES, chunksize, "Tank"):
+                chunk["tank"] = chunk["tank"].astype(str)
+                parts.append(_last_readings(chunk.dropna(subset=["volume"])))
+                if len(parts) > 1:
+                    parts = [_last_readings(pd.concat(parts, ignore_index=True))]
+        if not parts:
+            return pd.DataFrame(columns=["store_id", "tank", "day", "timestamp", "grade", "volume"])
+        return parts[0]
+
+
+def _last_readings(readings):
+    readings = readings.sort_values("timestamp", kind="stable")
+    return readings.drop_duplicates(["store_id", "tank", "day"], keep="last")[
+        ["store_id", "tank", "day", "timestamp", "grade", "volume"]
+    ].reset_index(drop=True)
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize()
+
+
+class FuelLedger:
+    """Daily fuel sales and tank readings of many stores, queried by store and period"""
+
+    def __init__(self, sales, readings):
+        self.sales = sales
+        self.readings = readings
+
+    @classmethod
+    def from_exports(cls, pump_sources, tank_sources=(), chunksize=200_000):
+        return cls(read_pump_exports(list(pump_sources), chunksize), read_tank_exports(list(tank_sources), chunksize))
+
+    def stores(self):
+        return sorted(set(self.sales["store_id"]) | set(self.readings["store_id"]))
+
+    def totals(self, start, end):
+        """Store-by-column frame of each grade's volume and amount (cents) sold from start to end, inclusive"""
+        sales = self.sales
+        in_period = (sales["day"] >= _day(start)) & (sales["day"] <= _day(end))
+        grouped = sales.loc[in_period].groupby(["store_id", "grade"], observed=False)[["volume", "amount"]].sum().unstack("grade")
+        frame = pd.DataFrame(index=grouped.index)
+        for product in engine.fuel_products:
+            frame[f"{product.lower()}_volume"] = grouped["volume"][product].round().astype("int64") if len(grouped) else 0
+            frame[f"{product.lower()}_amount"] = grouped["amount"][product].astype("int64") if len(grouped) else 0
+        frame["fuel_total_volume"] = frame[[f"{product.lower()}_volume" for product in engine.fuel_products]].sum(axis=1)
+        frame["fuel_total_amount"] = frame[[f"{product.lower()}_amount" for product in engine.fuel_products]].sum(axis=1)
+        return frame
+
+    def inventory(self, end):
+        """Store-by-field frame of ending inventory: last reading of every tank on or before `end`, summed by grade"""
+        readings = self.readings
+        readings = readings.loc[readings["day"] <= _day(end)]
+        last = readings.sort_values("timestamp", kind="stable").drop_duplicates(["store_id", "tank"], keep="last")
+        by_grade = last.groupby(["store_id", "grade"], observed=False)["volume"].sum().unstack("grade")
+        frame = pd.DataFrame(index=by_grade.index)
+        for field_name, grade in INVENTORY_GRADES.items():
+            frame[field_name] = by_grade[grade].round().astype("int64") if len(by_grade) else 0
+        return frame
+
+    def fill_frame(self, store_ids, starts, ends):
+        """FILL_COLUMNS for each (store_id, start, end), amounts in dollars; stores missing from the exports get zeros
+
+        One totals() / inventory() pass per distinct period, however many stores share it.
+        """
+        requests = pd.DataFrame({"store_id": [str(store_id) for store_id in store_ids], "start": starts, "end": ends})
+        filled = pd.DataFrame(0, index=requests.index, columns=FILL_COLUMNS)
+        with span("fuel_ledger_fill", stores=len(requests)):
+            for (start, end), positions in requests.groupby(["start", "end"], sort=False).groups.items():
+                period = self.totals(start, end).join(self.inventory(end), how="outer")
+                period = period.reindex(requests.loc[positions, "store_id"]).fillna(0)
+                filled.loc[positions, FILL_COLUMNS] = period[FILL_COLUMNS].to_numpy()
+        for column in FILL_COLUMNS:
+            if column.endswith("_amount"):
+                filled[column] = filled[column] / 100
+            else:
+                filled[column] = filled[column].astype("int64")
+        return filled
+
+    def apply(self, inputs_list):
+        """Copies of ReportInputs with fuel_data and the inventory fields taken from the ledger"""
+        filled = self.fill_frame(
+            [get_registry().store_id(inputs.store_name) for inputs in inputs_list],
+            [inputs.open_period_date for inputs in inputs_list],
+            [inputs.close_period_date for inputs in inputs_list],
+        )
+        return [
+            replace(
+                inputs,
+                fuel_data={
+                    product: {"volume": int(row[f"{product.lower()}_volume"]), "amount": float(row[f"{product.lower()}_amount"])}
+                    for product in engine.fuel_products
+                },
+                **{field_name: int(row[field_name]) for field_name in INVENTORY_GRADES},
+            )
+            for inputs, row in zip(inputs_list, filled.to_dict("records"))
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll pump and tank exports up to per-store fuel figures")
+    parser.add_argument("--pumps", nargs="+", required=True, help="pump export CSV files")
+    parser.add_argument("--tanks", nargs="*", default=[], help="tank reading export CSV files")
+    parser.add_argument("--start", required=True, type=date.fromisoformat)
+    parser.add_argument("--end", required=True, type=date.fromisoformat)
+    parser.add_argument("--output", default=None, help="write the per-store figures to this CSV instead of printing them")
+    args = parser.parse_args(argv)
+
+    ledger = FuelLedger.from_exports(args.pumps, args.tanks)
+    store_ids = ledger.stores()
+    filled = ledger.fill_frame(store_ids, [args.start] * len(store_ids), [args.end] * len(store_ids))
+    filled.insert(0, "store_id", store_ids)
+    if args.output:
+        filled.to_csv(args.output, index=False)
+        print(f"Wrote {args.output}")
+    else:
+        print(filled.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
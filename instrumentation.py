@@ -0,0 +1,208 @@
+"""Per-stage timing and memory instrumentation for the report pipeline.
+
+Wrap a stage in span("stage", store=...) to record its wall time and, when
+memory tracing is on, its tracemalloc peak above the memory in use when the
+stage started. Spans nest and inherit their parent's labels, so every stage
+run inside compute_report() is tagged with the store.
+
+Every finished span is
+  * added to per-(stage, store) totals and to a short list of recent spans,
+    which the Streamlit sidebar panel reads,
+  * logged as one JSON object on the "sh_reports.metrics" logger (written to
+    SH_REPORTS_METRICS_LOG when that is set),
+  * exported in Prometheus text format to SH_REPORTS_PROMETHEUS_FILE, rewritten
+    whenever a top-level span finishes (for node_exporter's textfile collector).
+
+Memory tracing slows Python allocations down, so it is off unless
+SH_REPORTS_TRACE_MEMORY=1 or enable_memory_tracing() is called. tracemalloc is
+process-wide: peaks of spans running concurrently in other threads overlap.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger("sh_reports.metrics")
+
+RECENT_SPANS = 500
+
+_lock = threading.Lock()
+_local = threading.local()
+_totals = {}  # (stage, store) -> {"calls", "seconds", "max_seconds", "peak_bytes"}
+_recent = deque(maxlen=RECENT_SPANS)
+_log_handler = None
+
+
+def enable_memory_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_memory_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def memory_tracing():
+    return tracemalloc.is_tracing()
+
+
+class _Span:
+    __slots__ = ("stage", "labels", "start", "start_memory", "peak_memory")
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.start = time.perf_counter()
+        self.start_memory = 0
+        self.peak_memory = 0
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _fold_peak(stack):
+    """Fold the peak since the last reset into every open span, then start a new peak window"""
+    current, peak = tracemalloc.get_traced_memory()
+    for open_span in stack:
+        open_span.peak_memory = max(open_span.peak_memory, peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time the enclosed block as `stage`; labels (e.g. store=...) are inherited by nested spans"""
+    stack = _stack()
+    if stack:
+        labels = {**stack[-1].labels, **labels}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current = _fold_peak(stack)
+    current_span = _Span(stage, labels)
+    if tracing:
+        current_span.start_memory = current_span.peak_memory = current
+    stack.append(current_span)
+    try:
+        yield current_span
+    finally:
+        if tracing and tracemalloc.is_tracing():
+            _fold_peak(stack)
+        stack.pop()
+        seconds = time.perf_counter() - current_span.start
+        peak_bytes = current_span.peak_memory - current_span.start_memory if tracing else None
+        _record(stage, labels, seconds, peak_bytes, top_level=not stack)
+
+
+def instrumented(stage):
+    """Decorator form of span() for functions without per-call labels"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record(stage, labels, seconds, peak_bytes, top_level):
+    store = labels.get("store", "")
+    entry = {
+        "timestamp": time.time(),
+        "stage": stage,
+        "seconds": round(seconds, 6),
+        "peak_bytes": peak_bytes,
+        **labels,
+    }
+    with _lock:
+        totals = _totals.setdefault((stage, store), {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_bytes": 0})
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        totals["max_seconds"] = max(totals["max_seconds"], seconds)
+        if peak_bytes is not None:
+            totals["peak_bytes"] = max(totals["peak_bytes"], peak_bytes)
+        _recent.append(entry)
+
+    _ensure_log_file()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(entry, default=str))
+    if top_level and os.environ.get("SH_REPORTS_PROMETHEUS_FILE"):
+        write_prometheus(os.environ["SH_REPORTS_PROMETHEUS_FILE"])
+
+
+def _ensure_log_file():
+    global _log_handler
+    path = os.environ.get("SH_REPORTS_METRICS_LOG")
+    if not path or _log_handler is not None:
+        return
+    with _lock:
+        if _log_handler is None:
+            _log_handler = logging.FileHandler(path, encoding="utf-8")
+            _log_handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(_log_handler)
+            logger.setLevel(logging.INFO)
+
+
+def recent_spans(limit=None):
+    """Most recent finished spans, oldest first"""
+    with _lock:
+        spans = list(_recent)
+    return spans[-limit:] if limit else spans
+
+
+def stage_totals():
+    """[{stage, store, calls, seconds, max_seconds, peak_bytes}, ...] since start-up (or reset())"""
+    with _lock:
+        return [{"stage": stage, "store": store, **totals} for (stage, store), totals in sorted(_totals.items())]
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _recent.clear()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Stage totals in the Prometheus text exposition format"""
+    metrics = [
+        ("sh_reports_stage_calls_total", "counter", "Finished runs of a pipeline stage", "calls"),
+        ("sh_reports_stage_seconds_total", "counter", "Wall time spent in a pipeline stage", "seconds"),
+        ("sh_reports_stage_seconds_max", "gauge", "Slowest single run of a pipeline stage", "max_seconds"),
+        ("sh_reports_stage_peak_memory_bytes", "gauge", "Largest tracemalloc peak of a pipeline stage", "peak_bytes"),
+    ]
+    totals = stage_totals()
+    lines = []
+    for name, metric_type, help_text, field in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for row in totals:
+            labels = f'stage="{_escape_label(row["stage"])}",store="{_escape_label(row["store"])}"'
+            lines.append(f"{name}{{{labels}}} {row[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Write prometheus_text() to path atomically, as the textfile collector expects"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".sh_reports_metrics", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+if os.environ.get("SH_REPORTS_TRACE_MEMORY") == "1":
+    enable_memory_tracing()
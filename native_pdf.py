@@ -0,0 +1,343 @@
+"""Direct-to-PDF layout of the main report, without HTML or WebKit.
+
+realistic_report_template.html is a fixed Courier report made of simple
+tables, so it can be laid out here in pure Python with the PDF base-14
+Courier fonts (nothing to embed, no external binary). render_main_report()
+takes the same context as the template and mirrors its sections in order:
+header, department table and totals, MOP sales, fuel, MOP cancel/refund,
+payment out / in, memo items and the tax totals.
+tests/test_native_pdf.py checks that every text cell of the rendered template
+(figures, department rows, labels) appears in the native PDF's text, in order.
+
+Only the main report has a native layout; see LAYOUTS. The output depends on
+this module rather than on the template, so LAYOUT_VERSION (a hash of this
+file) is part of the PDF cache key of native renders.
+"""
+import hashlib
+import zlib
+
+PAGE_SIZES = {
+    "A4": (595.28, 841.89),
+    "Letter": (612.0, 792.0),
+    "Legal": (612.0, 1008.0),
+}
+UNITS = {"in": 72.0, "cm": 72.0 / 2.54, "mm": 72.0 / 25.4, "pt": 1.0, "px": 0.75}
+
+FONT_SIZE = 9.0
+CHAR_WIDTH = 0.6  # every Courier glyph is 600/1000 em wide
+LINE_HEIGHT = 1.4
+CELL_PADDING_X = 3.0
+CELL_PADDING_Y = 1.5
+
+
+def parse_length(value, default):
+    """'0.75in' / '20mm' / '36' (points) -> points"""
+    if value in (None, ""):
+        return default
+    text = str(value).strip()
+    for unit, factor in UNITS.items():
+        if text.endswith(unit):
+            return float(text[: -len(unit)]) * factor
+    return float(text)
+
+
+def _pdf_text(text):
+    """Escape a string for a PDF literal in the fonts' WinAnsi encoding"""
+    data = str(text).encode("cp1252", "replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def text_width(text, size=FONT_SIZE):
+    return len(str(text)) * CHAR_WIDTH * size
+
+
+class PdfDocument:
+    """Minimal PDF writer: pages of Courier text and lines"""
+
+    FONTS = {"F1": "Courier", "F2": "Courier-Bold"}
+
+    def __init__(self, page_width, page_height, title=""):
+        self.page_width = page_width
+        self.page_height = page_height
+        self.title = title
+        self.pages = []
+
+    def new_page(self):
+        self.pages.append([])
+
+    def text(self, x, y, text, bold=False, size=FONT_SIZE):
+        if text == "":
+            return
+        font = "F2" if bold else "F1"
+        self.pages[-1].append(b"BT /%s %.2f Tf %.2f %.2f Td (%s) Tj ET" % (font.encode(), size, x, y, _pdf_text(text)))
+
+    def line(self, x1, y1, x2, y2, width=1.0, gray=0.0, dash=None):
+        dash_op = b"[%s] 0 d" % b" ".join(b"%g" % d for d in dash) if dash else b"[] 0 d"
+        self.pages[-1].append(b"%.2f G %.2f w %s %.2f %.2f m %.2f %.2f l S" % (gray, width, dash_op, x1, y1, x2, y2))
+
+    def to_bytes(self):
+        objects = []  # object number n is objects[n - 1]
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(None)
+        pages = add(None)
+        fonts = {
+            name: add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base.encode())
+            for name, base in self.FONTS.items()
+        }
+        font_resources = b" ".join(b"/%s %d 0 R" % (name.encode(), number) for name, number in fonts.items())
+
+        page_numbers = []
+        for commands in self.pages:
+            stream = zlib.compress(b"\n".join(commands))
+            content = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+            page_numbers.append(add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /Font << %s >> >> /Contents %d 0 R >>"
+                % (pages, self.page_width, self.page_height, font_resources, content)
+            ))
+        objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages
+        objects[pages - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % number for number in page_numbers), len(page_numbers)
+        )
+        info = add(b"<< /Title (%s) /Producer (SH Reports native renderer) >>" % _pdf_text(self.title))
+
+        output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        output += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, catalog, info, xref
+        )
+        return bytes(output)
+
+
+class _Flow:
+    """Top-to-bottom layout cursor over the pages of a PdfDocument"""
+
+    def __init__(self, document, margins):
+        self.document = document
+        self.top, self.right, self.bottom, self.left = margins
+        self.width = document.page_width - self.left - self.right
+        self.y = 0.0
+        self.page()
+
+    def page(self):
+        self.document.new_page()
+        self.y = self.document.page_height - self.top
+
+    def ensure(self, height):
+        if self.y - height < self.bottom:
+            self.page()
+
+    def space(self, height):
+        self.y -= height
+
+    def text_line(self, text, bold=False, align="left", underline=False, size=FONT_SIZE):
+        height = size * LINE_HEIGHT
+        self.ensure(height)
+        baseline = self.y - height + (height - size) / 2 + size * 0.2
+        width = text_width(text, size)
+        if align == "center":
+            x = self.left + (self.width - width) / 2
+        else:
+            x = self.left
+        self.document.text(x, baseline, text, bold, size)
+        if underline:
+            self.document.line(x, baseline - 1.2, x + width, baseline - 1.2, width=0.5)
+        self.y -= height
+
+    def rule(self, margin=7.5):
+        self.ensure(2 * margin + 1)
+        self.y -= margin
+        self.document.line(self.left, self.y, self.left + self.width, self.y, width=0.75)
+        self.y -= margin
+
+    def table(self, rows, aligns, bold_rows=(), dotted=False):
+        """Lay out rows of cell strings across the full width, auto-sizing columns like an HTML table"""
+        widths = _column_widths(rows, self.width)
+        height = FONT_SIZE * LINE_HEIGHT + 2 * CELL_PADDING_Y
+        for index, row in enumerate(rows):
+            self.ensure(height)
+            baseline = self.y - CELL_PADDING_Y - FONT_SIZE * LINE_HEIGHT + (LINE_HEIGHT - 1) * FONT_SIZE / 2 + FONT_SIZE * 0.2
+            x = self.left
+            bold = index in bold_rows
+            for cell, width, align in zip(row, widths, aligns):
+                text = _fit(cell, width - 2 * CELL_PADDING_X)
+                if align == "right":
+                    self.document.text(x + width - CELL_PADDING_X - text_width(text), baseline, text, bold)
+                else:
+                    self.document.text(x + CELL_PADDING_X, baseline, text, bold)
+                x += width
+            self.y -= height
+            if dotted:
+                self.document.line(self.left, self.y, self.left + self.width, self.y, width=0.5, gray=0.8, dash=(1, 1))
+        self.space(7.5)
+
+
+def _fit(text, width):
+    text = "" if text is None else str(text)
+    max_chars = int(width // (CHAR_WIDTH * FONT_SIZE))
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 1] + "…" if max_chars > 0 else ""
+
+
+def _column_widths(rows, total_width):
+    """Natural width per column from its longest cell, then stretched or shrunk to the table width"""
+    columns = max(len(row) for row in rows)
+    natural = [
+        max(text_width("" if i >= len(row) or row[i] is None else row[i]) for row in rows) + 2 * CELL_PADDING_X
+        for i in range(columns)
+    ]
+    scale = total_width / sum(natural)
+    return [width * scale for width in natural]
+
+
+def render_main_report(context, page_size="A4", margins=(54.0, 54.0, 54.0, 54.0)):
+    """Lay out the main report context (see build_main_context) and return PDF bytes"""
+    page_width, page_height = PAGE_SIZES.get(page_size, PAGE_SIZES["A4"])
+    document = PdfDocument(page_width, page_height, title="Department Full Report")
+    flow = _Flow(document, margins)
+    c = context
+
+    # Header
+    flow.text_line(c["store_number"], bold=True, align="center")
+    flow.text_line(f"Store ID: {c['store_id']}", align="center")
+    flow.text_line(f"Period: {c['period']} to {c['close_period']}", align="center")
+    flow.text_line("Department Full Report", align="center")
+    flow.space(11)
+    flow.rule()
+
+    # Department report
+    flow.text_line("DEPARTMENT REPORT", bold=True, underline=True)
+    flow.space(4)
+    rows = [["Dept#", "Description", "Cust#", "Items", "% Sales", "Gross", "Refunds", "Discounts", "Net Sales"]]
+    rows.extend(list(row) for row in c["department_rows"])
+    flow.table(rows, ["left", "left"] + ["right"] * 7, bold_rows=(0,), dotted=True)
+    flow.rule()
+    flow.text_line(f"Total Discounts: {c['total_discounts']}")
+    flow.text_line(f"Total Refunds:   {c['total_refunds']}")
+    flow.text_line(f"Total Gross:     {c['total_gross']}")
+    flow.text_line(f"Total Net Sales: {c['total_net_sales']}")
+    flow.space(15)
+    flow.rule()
+
+    def section(title, rows, aligns=("left", "right"), bold_rows=()):
+        flow.text_line(title, bold=True, underline=True)
+        flow.space(4)
+        flow.table(rows, list(aligns), bold_rows=bold_rows)
+        flow.space(5)
+        flow.rule()
+
+    section("MOP SALES", [
+        ["MOP Sales Total", c["total_mop_sales"]],
+        ["Credit - Card Based", c["mop_credit"]],
+        ["Debit - Card Based", c["mop_debit"]],
+        ["Mobile - Card Based", c["mop_mobile"]],
+        ["Cash", c["mop_cash"]],
+    ])
+
+    fuel_rows = [["Product", "Volume", "Amount"]]
+    fuel_rows.extend(
+        [product, f"{data['volume']:,.0f}", f"{data['amount']:,.2f}"]
+        for product, data in c["fuel_data"].items()
+    )
+    fuel_rows.append(["Total", f"{c['fuel_total_volume']:,.0f}", f"{c['fuel_total_amount']:,.2f}"])
+    section("FUEL TIER / PRODUCT REPORT", fuel_rows, ("left", "right", "right"), bold_rows=(0, len(fuel_rows) - 1))
+
+    section("MOP CANCEL/REFUND", [
+        ["MOP Cancel Refund", c["mop_cancel_refund"]],
+        ["Other Refund", c["other_refund"]],
+        ["Payment Out", "0.00"],
+        ["Payment In", "0.00"],
+        ["Total to Account For", c["total_to_account_for"]],
+        ["CREDIT - Card Based", c["credit_card_based"]],
+        ["CASH", c["cash_based"]],
+        ["Tot MOP Cancel/Refunds", c["total_to_account_for"]],
+    ])
+
+    section("PAYMENT OUT", [
+        ["Cash Back", "0"],
+        ["Pay Out", c["pay_out"]],
+        ["Adjust for Vendor Payments", "0.00"],
+        ["Change/Check", "0.00"],
+        ["In House", "0.00"],
+        ["Safe Drops", c["safe_drops"]],
+        ["CASH", c["safe_drops"]],
+        ["Tot Payment Out", c["total_payment_out"]],
+    ])
+
+    section("PAYMENT IN", [
+        ["Cash Back Cancel", "0"],
+        ["Pay In", "0"],
+        ["In House", "0"],
+        ["Safe Loans", "0"],
+        ["Tot Payment In", "0"],
+    ])
+
+    section("MEMO ITEMS (LEFT)", [
+        ["Category", "Count", "Amount"],
+        ["Items", c["total_items"], ""],
+        ["Customer", c["total_customers"], ""],
+        ["Void Lines", c["void_lines_count"], c["void_lines_amount"]],
+        ["Void Tickets", c["void_tickets_count"], c["void_tickets_amount"]],
+        ["Positive", c["positive_count"], c["positive_amount"]],
+        ["Negative", c["negative_count"], c["negative_amount"]],
+        ["Prepaid Recharge", "0", "0"],
+    ], ("left", "right", "right"), bold_rows=(0,))
+
+    section("MEMO ITEMS (RIGHT)", [
+        ["Category", "Count", "Amount"],
+        ["Suspended", c["suspended_count"], c["suspended_amount"]],
+        ["Suspend/Void", c["suspend_void_count"], c["suspend_void_amount"]],
+        ["Coin Dispenser", "0", "0.00"],
+        ["Vendor Payments", "0", "0.00"],
+        ["Safe Drop Cancels", "0", "0.00"],
+        ["Prepaid Activation", "0", "0.00"],
+    ], ("left", "right", "right"), bold_rows=(0,))
+
+    section("TOTALS", [
+        ["Cash Back Fee", "0"],
+        ["Cancel/Refund Cash Back Fee", "0"],
+        ["Debit Fee", "0"],
+        ["Fuel Sales", c["fuel_sales"]],
+        ["Merch Sales", c["merch_sales"]],
+        ["FUEL DISCOUNT", "0"],
+        ["Refund Taxes", "0"],
+        ["Sales Taxes", c["sales_taxes"]],
+        ["Tot Taxes", c["tot_taxes"]],
+        ["Incl Taxes", c["incl_taxes"]],
+    ])
+
+    flow.text_line("*** END OF REPORT ***", align="center")
+    return document.to_bytes()
+
+
+# template file name -> layout function(context, page_size, margins)
+LAYOUTS = {
+    "realistic_report_template.html": render_main_report,
+}
+
+
+def _source_version():
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# Changes with every edit of the layout code, so cached native PDFs are not served after one
+LAYOUT_VERSION = _source_version()
+
+
+def render_context(template_name, context, options):
+    """Render a template context natively with pdfkit-style page options (page-size, margin-*)"""
+    margins = tuple(
+        parse_length(options.get(f"margin-{side}"), 36.0) for side in ("top", "right", "bottom", "left")
+    )
+    return LAYOUTS[template_name](context, options.get("page-size", "A4"), margins)
@@ -0,0 +1,337 @@
+"""PDF backends that turn rendered report HTML into PDF bytes.
+
+PdfkitBackend     one wkhtmltopdf process per document (the original behaviour)
+PooledPdfBackend  a bounded pool of long-running wkhtmltopdf workers that are
+                  reused across requests, so WebKit is only started once per
+                  worker instead of once per PDF
+NativePdfBackend  lays the main report out directly as PDF in Python (see
+                  native_pdf); other templates go to a wkhtmltopdf backend
+
+Pick one with create_backend(); the SH_REPORTS_PDF_BACKEND, SH_REPORTS_PDF_WORKERS
+and SH_REPORTS_PDF_TIMEOUT environment variables set the defaults.
+
+Importing this module does not touch wkhtmltopdf: the executable is looked up
+(see find_wkhtmltopdf) when a wkhtmltopdf backend is created, and pdfkit is
+only imported by PdfkitBackend.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import native_pdf
+from instrumentation import span
+
+# PDF config
+pdf_options = {
+    "enable-local-file-access": "",
+    "page-size": "A4",
+    "margin-top": "0.75in",
+    "margin-right": "0.75in",
+    "margin-bottom": "0.75in",
+    "margin-left": "0.75in"
+}
+
+WINDOWS_WKHTMLTOPDF = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+
+DEFAULT_BACKEND = "pool"
+DEFAULT_WORKERS = 2
+DEFAULT_TIMEOUT = 60
+
+
+class PdfRenderError(RuntimeError):
+    """Raised when wkhtmltopdf fails to produce a PDF"""
+
+
+class PdfRenderTimeout(PdfRenderError):
+    """Raised when a render job does not finish within the backend timeout"""
+
+
+def find_wkhtmltopdf():
+    """Path of the wkhtmltopdf executable: $WKHTMLTOPDF_PATH, else the PATH, else the default Windows install"""
+    configured = os.environ.get("WKHTMLTOPDF_PATH")
+    if configured:
+        found = configured if os.path.isfile(configured) else shutil.which(configured)
+        if not found:
+            raise PdfRenderError(f"WKHTMLTOPDF_PATH does not point to a wkhtmltopdf executable: {configured}")
+        return found
+    found = shutil.which("wkhtmltopdf")
+    if found:
+        return found
+    if os.path.isfile(WINDOWS_WKHTMLTOPDF):
+        return WINDOWS_WKHTMLTOPDF
+    raise PdfRenderError("No wkhtmltopdf executable found: install it on the PATH or set WKHTMLTOPDF_PATH")
+
+
+def option_args(options):
+    """Convert a pdfkit-style options dict into wkhtmltopdf command line arguments"""
+    args = []
+    for key, value in options.items():
+        args.append(f"--{key}")
+        if value not in ("", None):
+            args.append(str(value))
+    return args
+
+
+class PdfBackend:
+    """Base class: render(html) -> PDF bytes"""
+
+    name = "base"
+
+    def render(self, html):
+        raise NotImplementedError
+
+    def render_report(self, template_name, context, render_html):
+        """Render a template context; HTML backends render it with render_html(template_name, context) first"""
+        return self.render(render_html(template_name, context))
+
+    def cache_options(self, template_name):
+        """What the PDF of template_name depends on besides the template file and context (part of the cache key)"""
+        return {"backend": self.name, **getattr(self, "options", {})}
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PdfkitBackend(PdfBackend):
+    """Spawn a fresh wkhtmltopdf process through pdfkit for every document"""
+
+    name = "pdfkit"
+
+    def __init__(self, binary=None, options=None):
+        import pdfkit
+
+        self._pdfkit = pdfkit
+        self.options = dict(pdf_options if options is None else options)
+        self.configuration = pdfkit.configuration(wkhtmltopdf=binary or find_wkhtmltopdf())
+
+    def render(self, html):
+        with span("wkhtmltopdf"):
+            return self._pdfkit.from_string(html, False, options=self.options, configuration=self.configuration)
+
+
+def _quote_arg(value):
+    # wkhtmltopdf splits --read-args-from-stdin lines on spaces and honours "..." and backslash escapes
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class _WkhtmltopdfWorker:
+    """One long-running wkhtmltopdf process that converts a document per stdin line"""
+
+    def __init__(self, binary, options):
+        self.jobs = 0
+        self.process = subprocess.Popen(
+            [binary, *option_args(options), "--read-args-from-stdin"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self._events = queue.Queue()
+        self._stderr = []
+        self._reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._reader.start()
+
+    def _read_stderr(self):
+        # Every conversion ends with "Done" (or "Exit with code N ...") on stderr
+        for line in iter(self.process.stderr.readline, b""):
+            for part in line.split(b"\r"):
+                text = part.decode("utf-8", "replace").strip()
+                if text.startswith("Done") or text.startswith("Exit with code"):
+                    self._events.put(text)
+                elif text and not text.startswith("["):
+                    self._stderr.append(text)
+        self._events.put(None)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def convert(self, html, timeout):
+        workdir = tempfile.mkdtemp(prefix="sh_reports_")
+        try:
+            input_path = os.path.join(workdir, "report.html")
+            output_path = os.path.join(workdir, "report.pdf")
+            with span("html_write"):
+                with open(input_path, "w", encoding="utf-8") as f:
+                    f.write(html)
+
+            self._stderr.clear()
+            with span("wkhtmltopdf"):
+                self.process.stdin.write(f"{_quote_arg(input_path)} {_quote_arg(output_path)}\n".encode("utf-8"))
+                self.process.stdin.flush()
+                self.jobs += 1
+
+                try:
+                    status = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    raise PdfRenderTimeout(f"wkhtmltopdf did not finish within {timeout}s")
+            if status is None:
+                raise PdfRenderError("wkhtmltopdf worker exited: " + "; ".join(self._stderr))
+            if not os.path.exists(output_path):
+                raise PdfRenderError(f"wkhtmltopdf produced no output ({status}): " + "; ".join(self._stderr))
+
+            with open(output_path, "rb") as f:
+                return f.read()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def close(self, kill=False):
+        if self.alive:
+            try:
+                if kill:
+                    self.process.kill()
+                else:
+                    self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class PooledPdfBackend(PdfBackend):
+    """Keep up to max_workers warm wkhtmltopdf processes and reuse them across jobs
+
+    render() blocks while all workers are busy; a job that waits for a worker or
+    runs for longer than `timeout` seconds raises PdfRenderTimeout and its worker
+    is killed and replaced. Workers are recycled after max_jobs_per_worker jobs to
+    keep WebKit memory growth in check.
+    """
+
+    name = "pool"
+
+    def __init__(self, binary=None, options=None, max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, max_jobs_per_worker=200):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        binary = binary or find_wkhtmltopdf()
+        if not (os.path.isfile(binary) or shutil.which(binary)):
+            raise PdfRenderError(f"No wkhtmltopdf executable found: {binary}")
+        self.binary = binary
+        self.options = dict(pdf_options if options is None else options)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle = queue.LifoQueue()  # LIFO keeps the most recently used worker busy
+        self._closed = False
+
+    def warm_up(self, count=None):
+        """Start `count` workers (default max_workers) ahead of the first job"""
+        workers = [self._checkout() for _ in range(min(count or self.max_workers, self.max_workers))]
+        for worker in workers:
+            self._checkin(worker)
+
+    def _checkout(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return _WkhtmltopdfWorker(self.binary, self.options)
+            if worker.alive:
+                return worker
+            worker.close()
+
+    def _checkin(self, worker):
+        if self._closed or not worker.alive or worker.jobs >= self.max_jobs_per_worker:
+            worker.close()
+        else:
+            self._idle.put(worker)
+
+    def render(self, html):
+        if self._closed:
+            raise PdfRenderError("PDF backend is closed")
+        with span("pdf_queue"):
+            acquired = self._slots.acquire(timeout=self.timeout)
+        if not acquired:
+            raise PdfRenderTimeout(f"no PDF worker became free within {self.timeout}s")
+        try:
+            worker = self._checkout()
+            try:
+                return worker.convert(html, self.timeout)
+            except PdfRenderError:
+                worker.close(kill=True)
+                raise
+            finally:
+                self._checkin(worker)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class NativePdfBackend(PdfBackend):
+    """Write templates that have a native layout straight to PDF; hand the rest to an HTML backend
+
+    The fallback backend ("pool" unless SH_REPORTS_NATIVE_FALLBACK says
+    otherwise) is only started the first time a non-native template is rendered.
+    """
+
+    name = "native"
+
+    def __init__(self, options=None, fallback=None, **fallback_kwargs):
+        self.options = dict(pdf_options if options is None else options)
+        self.fallback_name = fallback or os.environ.get("SH_REPORTS_NATIVE_FALLBACK", PooledPdfBackend.name)
+        self._fallback_kwargs = fallback_kwargs
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+
+    @property
+    def fallback(self):
+        with self._fallback_lock:
+            if self._fallback is None:
+                self._fallback = create_backend(self.fallback_name, options=self.options, **self._fallback_kwargs)
+            return self._fallback
+
+    def render(self, html):
+        return self.fallback.render(html)
+
+    def render_report(self, template_name, context, render_html):
+        if template_name in native_pdf.LAYOUTS:
+            with span("native_layout"):
+                return native_pdf.render_context(template_name, context, self.options)
+        return self.fallback.render(render_html(template_name, context))
+
+    def cache_options(self, template_name):
+        options = super().cache_options(template_name)
+        if template_name in native_pdf.LAYOUTS:
+            options["layout_version"] = native_pdf.LAYOUT_VERSION
+        return options
+
+    def close(self):
+        if self._fallback is not None:
+            self._fallback.close()
+
+
+BACKENDS = {
+    PdfkitBackend.name: PdfkitBackend,
+    PooledPdfBackend.name: PooledPdfBackend,
+    NativePdfBackend.name: NativePdfBackend,
+}
+
+
+def resolve_backend_name(name=None):
+    """Return `name`, or the backend configured in the environment when it is None"""
+    return name or os.environ.get("SH_REPORTS_PDF_BACKEND", DEFAULT_BACKEND)
+
+
+def create_backend(name=None, **kwargs):
+    """Create a PDF backend by name ("pdfkit", "pool" or "native"), defaulting to the environment settings"""
+    name = resolve_backend_name(name)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}', expected one of {sorted(BACKENDS)}")
+    if name == PooledPdfBackend.name:
+        kwargs.setdefault("max_workers", int(os.environ.get("SH_REPORTS_PDF_WORKERS", DEFAULT_WORKERS)))
+        kwargs.setdefault("timeout", float(os.environ.get("SH_REPORTS_PDF_TIMEOUT", DEFAULT_TIMEOUT)))
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,168 @@
+"""Content-addressed on-disk cache of rendered report PDFs.
+
+Entries are keyed on a SHA-256 of the template's content, the PDF options and
+the fully built template context, so the same report is only ever rendered
+once; editing a template or changing a single figure gives a new key. The cache
+is bounded by total size and evicts the least recently used PDFs first.
+
+SH_REPORTS_PDF_CACHE_DIR and SH_REPORTS_PDF_CACHE_MB set the defaults used by
+create_cache().
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "sh_reports_pdf_cache")
+DEFAULT_CACHE_MB = 256
+
+_template_versions = {}  # template path -> ((mtime_ns, size), sha256)
+
+
+def template_version(template_path):
+    """SHA-256 of a template file, re-hashed only when its mtime or size changes"""
+    stat = os.stat(template_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _template_versions.get(template_path)
+    if cached is None or cached[0] != signature:
+        with open(template_path, "rb") as f:
+            cached = (signature, hashlib.sha256(f.read()).hexdigest())
+        _template_versions[template_path] = cached
+    return cached[1]
+
+
+def context_key(template_path, context, options=None):
+    """Cache key for rendering `context` into the template at template_path with the given PDF options"""
+    payload = json.dumps(
+        {
+            "template": template_version(template_path),
+            "options": options or {},
+            "context": context,
+        },
+        sort_keys=True,
+        default=str,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """Size-bounded LRU cache of PDF bytes stored as <directory>/<key[:2]>/<key>.pdf
+
+    Recency is tracked in memory and mirrored in file mtimes, so a new process
+    picks up the existing entries in least-recently-used order.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def _load_index(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith(".pdf"):
+                    stat = os.stat(os.path.join(root, filename))
+                    found.append((stat.st_mtime_ns, filename[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+        # The limit may have been lowered since the entries were written
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes (call with the lock held)"""
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            self.evictions += 1
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        """Return the cached PDF bytes for key, or None"""
+        with self._lock:
+            if key in self._entries:
+                try:
+                    with open(self._path(key), "rb") as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    # Removed behind our back (another process evicted it)
+                    self._size -= self._entries.pop(key)
+                else:
+                    self._entries.move_to_end(key)
+                    os.utime(self._path(key))
+                    self.hits += 1
+                    return data
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """Store PDF bytes under key and evict old entries beyond max_bytes"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial PDF
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def get_or_render(self, key, render):
+        """Return the cached PDF for key, calling render() and storing its result on a miss"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def create_cache(directory=None, max_mb=None):
+    """Create a PdfCache, defaulting to the environment settings"""
+    directory = directory or os.environ.get("SH_REPORTS_PDF_CACHE_DIR", DEFAULT_CACHE_DIR)
+    max_mb = max_mb or float(os.environ.get("SH_REPORTS_PDF_CACHE_MB", DEFAULT_CACHE_MB))
+    return PdfCache(directory, int(max_mb * 1024 * 1024))
@@ -0,0 +1,226 @@
+"""Range mode: one store's reports for every day, week or month of a period.
+
+The store's period is split into windows, the pipeline runs once per window and
+the PDFs are rendered in parallel on a PDF backend. The result is a single ZIP
+of per-window PDFs or one merged PDF in chronological order.
+
+Amounts entered for the store (fuel, cigarettes, merch target, MOP) are taken
+as totals for the whole period and split across the windows by their number of
+days; ending fuel inventory is a point-in-time value and is kept as entered.
+
+    python period_reports.py store_inputs.csv --frequency daily --bundle zip
+    python period_reports.py store_inputs.csv --frequency monthly --bundle pdf --workers 8
+"""
+import argparse
+import io
+import os
+import sys
+import random
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import report_engine as engine
+from batch_reports import REPORT_KINDS, load_row_departments, read_store_inputs, row_inputs
+from pdf_backends import BACKENDS, PooledPdfBackend, create_backend, resolve_backend_name
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+BUNDLES = ("zip", "pdf")
+
+# ReportInputs fields that are period totals and get split across windows (fuel_data is split too)
+APPORTIONED_FIELDS = ["cig_gross", "ecig_gross", "desired_merch_sale", "manual_credit", "manual_debit", "manual_mobile"]
+APPORTIONED_COUNT_FIELDS = ["cig_items", "ecig_items"]
+
+
+def period_windows(start, end, frequency):
+    """Split start..end (inclusive dates) into [(window_start, window_end), ...]
+
+    Weekly windows run Monday to Sunday and monthly windows follow calendar
+    months; the first and last window are clipped to the period.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency '{frequency}', expected one of {FREQUENCIES}")
+    if end < start:
+        raise ValueError(f"Period ends ({end}) before it starts ({start})")
+
+    if frequency == "daily":
+        days = pd.date_range(start, end, freq="D").date
+        return list(zip(days, days))
+
+    if frequency == "weekly":
+        boundaries = pd.date_range(start, end, freq="W-SUN").date
+    else:
+        boundaries = pd.date_range(start, end, freq="ME").date
+
+    windows = []
+    window_start = start
+    for boundary in boundaries:
+        windows.append((window_start, boundary))
+        window_start = boundary + timedelta(days=1)
+    if window_start <= end:
+        windows.append((window_start, end))
+    return windows
+
+
+def split_total(total, weights, integer=False):
+    """Split `total` in proportion to `weights` so the parts add back up exactly
+
+    Integer totals are split in whole units and money in whole cents; the
+    leftover units go to the windows with the largest remainders.
+    """
+    scale = 1 if integer else 100
+    units = int(round(total * scale))
+    shares = units * np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    parts = np.floor(shares).astype(np.int64)
+    leftover = units - int(parts.sum())
+    if leftover:
+        parts[np.argsort(parts - shares, kind="stable")[:leftover]] += 1
+    if integer:
+        return [int(part) for part in parts]
+    return [part / scale for part in parts.tolist()]
+
+
+def window_inputs(inputs, windows):
+    """One ReportInputs per window, with the period totals apportioned by window length
+
+    A seeded input gets a distinct, reproducible seed per window.
+    """
+    weights = [(window_end - window_start).days + 1 for window_start, window_end in windows]
+    splits = {name: split_total(getattr(inputs, name), weights) for name in APPORTIONED_FIELDS}
+    splits.update({name: split_total(getattr(inputs, name), weights, integer=True) for name in APPORTIONED_COUNT_FIELDS})
+    fuel_splits = {
+        product: (split_total(values["volume"], weights, integer=True), split_total(values["amount"], weights))
+        for product, values in inputs.fuel_data.items()
+    }
+
+    result = []
+    for index, (window_start, window_end) in enumerate(windows):
+        seed = None
+        if inputs.seed is not None:
+            seed = random.Random(f"{inputs.seed}:{window_start}").getrandbits(32)
+        result.append(replace(
+            inputs,
+            open_period_date=window_start,
+            close_period_date=window_end,
+            fuel_data={product: {"volume": volumes[index], "amount": amounts[index]} for product, (volumes, amounts) in fuel_splits.items()},
+            seed=seed,
+            **{name: parts[index] for name, parts in splits.items()},
+        ))
+    return result
+
+
+def bundle_filename(store_name, start, end, frequency, bundle):
+    """Name of the ZIP or merged PDF for one store's range run"""
+    store = store_name.replace(" ", "_").replace("-", "_")
+    return f"Reports_{store}_{start.strftime('%Y_%m_%d')}_to_{end.strftime('%Y_%m_%d')}_{frequency}.{bundle}"
+
+
+def merge_pdfs(documents):
+    """Concatenate PDF documents (bytes) into one PDF"""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for document in documents:
+        writer.append(PdfReader(io.BytesIO(document)))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def render_period_reports(inputs, frequency, backend, kinds=REPORT_KINDS, bundle="zip", workers=None, departments=None, progress=None):
+    """Render every window of a ReportInputs period and return (filename, bundle bytes)
+
+    `progress(done, total, name)` is called on the calling thread after each PDF.
+    `departments` is the department frame for every window (default data when None).
+    """
+    if bundle not in BUNDLES:
+        raise ValueError(f"Unknown bundle '{bundle}', expected one of {BUNDLES}")
+    start, end = inputs.open_period_date, inputs.close_period_date
+    windows = period_windows(start, end, frequency)
+    if departments is None:
+        departments = engine.get_default_department_data()
+    workers = workers or getattr(backend, "max_workers", None) or os.cpu_count() or 1
+
+    documents = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Submit each window as soon as its HTML is ready so the pipeline overlaps the renders
+        futures = {}
+        for window in window_inputs(inputs, windows):
+            data = engine.compute_report(window, departments)
+            for kind in kinds:
+                template_name, context = engine.report_context(data, kind)
+                futures[pool.submit(engine.render_pdf, template_name, context, backend)] = engine.report_data_filename(data, kind)
+        order = list(futures.values())
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            documents[name] = future.result()
+            if progress:
+                progress(done, len(futures), name)
+
+    filename = bundle_filename(inputs.store_name, start, end, frequency, bundle)
+    if bundle == "pdf":
+        return filename, merge_pdfs(documents[name] for name in order)
+
+    output = io.BytesIO()
+    # PDFs are already compressed; storing them avoids a second deflate pass
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name in order:
+            archive.writestr(name, documents[name])
+    return filename, output.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one report per day, week or month of each store's period")
+    parser.add_argument("inputs", help="CSV file with one row of inputs per store (see batch_reports.py)")
+    parser.add_argument("--frequency", choices=FREQUENCIES, default="daily")
+    parser.add_argument("--bundle", choices=BUNDLES, default="zip", help="one ZIP of PDFs or one merged PDF per store")
+    parser.add_argument("--output-dir", default="reports", help="directory for the bundles")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent PDF renders (default: number of CPUs)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None, help="PDF backend (default: $SH_REPORTS_PDF_BACKEND or pool)")
+    parser.add_argument("--stream-csv", action="store_true", help="stream department_csv files in chunks and roll them up to department level")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per PDF render")
+    parser.add_argument("--reports", nargs="+", choices=REPORT_KINDS, default=list(REPORT_KINDS))
+    args = parser.parse_args(argv)
+
+    rows = read_store_inputs(args.inputs)
+    os.makedirs(args.output_dir, exist_ok=True)
+    workers = args.workers or os.cpu_count() or 1
+
+    backend_name = resolve_backend_name(args.backend)
+    backend_options = {}
+    if backend_name == PooledPdfBackend.name:
+        backend_options["max_workers"] = workers
+        if args.timeout:
+            backend_options["timeout"] = args.timeout
+
+    def report_progress(done, total, name):
+        print(f"[{done}/{total}] {name}")
+
+    failed = 0
+    with create_backend(backend_name, **backend_options) as backend:
+        for row in rows:
+            try:
+                filename, data = render_period_reports(
+                    row_inputs(row), args.frequency, backend, args.reports, args.bundle, workers,
+                    departments=load_row_departments(row, args.stream_csv), progress=report_progress
+                )
+            except Exception as exc:
+                failed += 1
+                print(f"❌ {row['store_name']}: {exc}", file=sys.stderr)
+                continue
+            output_path = os.path.join(args.output_dir, filename)
+            with open(output_path, "wb") as f:
+                f.write(data)
+            print(f"✅ {output_path}")
+
+    print(f"{len(rows) - failed} bundles written to {args.output_dir}, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
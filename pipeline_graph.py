@@ -0,0 +1,214 @@
+"""Incremental recomputation of the report pipeline as a graph of stages.
+
+Each stage names the inputs and upstream stages it reads. A stage keeps its
+last output and only runs again when one of those changed, so editing the fuel
+inventory re-renders the accountant's context without touching the department
+scaling, and editing a MOP amount recomputes the MOP split but not the
+department table.
+
+    graph = report_graph()
+    set_report_inputs(graph, inputs, departments, departments_token="default")
+    data = graph.get("report")              # ReportData, as compute_report() returns
+    context = graph.get("main_context")
+    graph.last_recomputed                   # stages that ran during the last get()s
+
+Input changes are detected by value: hashable values compare directly, other
+values (dicts) by repr(). Department frames are not compared at all; pass a
+token that changes with the data (the app uses the upload's content hash).
+Stage outputs are shared, not copied: callers must not modify them.
+"""
+import threading
+from dataclasses import fields
+
+import report_engine as engine
+from instrumentation import span
+from store_registry import get_registry
+
+_UNSET = object()
+
+
+class Stage:
+    """One pipeline step: func(*values of `inputs`), where inputs name graph inputs or other stages"""
+
+    def __init__(self, name, func, inputs):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+
+
+def _token(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+class PipelineGraph:
+    """Stages plus the current input values; get() recomputes only stale stages"""
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        self._values = {}    # input name -> value
+        self._tokens = {}    # input name -> change token
+        self._versions = {}  # input or stage name -> version, bumped on every change
+        self._outputs = {}   # stage name -> (versions of its dependencies, output)
+        self._lock = threading.RLock()
+        self.last_recomputed = []
+
+    def set_input(self, name, value, token=_UNSET):
+        """Set one input; dependants go stale only if its token differs from the current one"""
+        token = _token(value) if token is _UNSET else token
+        with self._lock:
+            self._values[name] = value
+            if name in self._tokens and self._tokens[name] == token:
+                return False
+            self._tokens[name] = token
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return True
+
+    def update(self, **values):
+        """set_input() for several inputs; returns the names that changed"""
+        return [name for name, value in values.items() if self.set_input(name, value)]
+
+    def get(self, name):
+        """Output of a stage, recomputing it (and stale upstream stages) if needed"""
+        with self._lock:
+            return self._get(name)
+
+    def _get(self, name):
+        if name not in self.stages:
+            if name not in self._values:
+                raise KeyError(f"Pipeline input {name!r} has not been set")
+            return self._values[name]
+        stage = self.stages[name]
+        values = [self._get(dependency) for dependency in stage.inputs]
+        key = tuple(self._versions[dependency] for dependency in stage.inputs)
+        cached = self._outputs.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with span(f"stage_{name}"):
+            output = stage.func(*values)
+        self._outputs[name] = (key, output)
+        self._versions[name] = self._versions.get(name, 0) + 1
+        self.last_recomputed.append(name)
+        return output
+
+    def reset_recomputed(self):
+        """Start a new last_recomputed list (call once per rerun)"""
+        with self._lock:
+            self.last_recomputed = []
+
+    def invalidate(self):
+        """Forget every cached stage output"""
+        with self._lock:
+            self._outputs.clear()
+
+
+# ===== REPORT GRAPH =====
+INPUT_FIELDS = [item.name for item in fields(engine.ReportInputs)]
+
+
+def _departments_stage(departments, store_name, cig_items, cig_cust, cig_gross, ecig_items, ecig_cust, ecig_gross, desired_merch_sale, seed):
+    return engine.process_departments(
+        departments, store_name,
+        cig_items, cig_cust, cig_gross,
+        ecig_items, ecig_cust, ecig_gross,
+        desired_merch_sale, rng=engine.report_rng(seed, "departments")
+    )
+
+
+def _mop_stage(processed, fuel, manual_credit, manual_debit, manual_mobile, seed):
+    return engine.calculate_mop(
+        processed["total_merch_sale"], engine.to_cents(fuel[1]), processed["tot_taxes"],
+        engine.to_cents(manual_credit), engine.to_cents(manual_debit), engine.to_cents(manual_mobile),
+        rng=engine.report_rng(seed, "mop")
+    )
+
+
+def _report_stage(inputs, seed, fuel, cig_cust, ecig_cust, processed, df_final, merch_totals, mop):
+    total_mop_sales, pay_out, manual_mop_values = mop
+    merch_gross, merch_net_sales, merch_discounts, merch_refunds = merch_totals
+    return engine.ReportData(
+        inputs=inputs,
+        seed=seed,
+        store_id=get_registry().store_id(inputs.store_name),
+        fuel_total_volume=fuel[0],
+        fuel_total_amount=fuel[1],
+        cig_cust=cig_cust,
+        ecig_cust=ecig_cust,
+        df_final=df_final,
+        summary_rows=processed["summary_rows"],
+        total_merch_sale=processed["total_merch_sale"],
+        total_merch_gross=processed["total_merch_gross"],
+        sales_tax=processed["sales_tax"],
+        tot_taxes=processed["tot_taxes"],
+        incl_taxes=processed["incl_taxes"],
+        total_mop_sales=total_mop_sales,
+        pay_out=pay_out,
+        manual_mop_values=manual_mop_values,
+        merch_gross=merch_gross,
+        merch_net_sales=merch_net_sales,
+        merch_discounts=merch_discounts,
+        merch_refunds=merch_refunds,
+    )
+
+
+def _main_context_stage(store_name, open_period_date, close_period_date, fuel_data, seed, processed, df_final, merch_totals, mop):
+    total_mop_sales, pay_out, manual_mop_values = mop
+    merch_gross, _, merch_discounts, merch_refunds = merch_totals
+    with span("context_main", store=store_name):
+        return engine.build_main_context(
+            store_name, get_registry().store_id(store_name), open_period_date, close_period_date, fuel_data,
+            {method: cents / 100 for method, cents in manual_mop_values.items()}, total_mop_sales / 100,
+            df_final, processed["total_merch_sale"] / 100,
+            processed["sales_tax"] / 100, processed["tot_taxes"] / 100, processed["incl_taxes"] / 100,
+            merch_gross / 100, merch_discounts / 100, merch_refunds / 100, 0, pay_out / 100,
+            rng=engine.report_rng(seed, "main"), summary_rows=processed["summary_rows"]
+        )
+
+
+def _accountant_context_stage(store_name, open_period_date, close_period_date, fuel_data, cig_items, cig_gross, ecig_gross, processed, inventory_regular, inventory_super, inventory_diesel):
+    with span("context_accountant", store=store_name):
+        return engine.build_accountant_context(
+            store_name, get_registry().store_id(store_name), open_period_date, close_period_date, fuel_data,
+            cig_items, cig_gross, ecig_gross, processed["total_merch_sale"] / 100,
+            inventory_regular, inventory_super, inventory_diesel
+        )
+
+
+def report_graph():
+    """Graph of compute_report() and both report contexts; outputs match compute_report() for the same inputs"""
+    return PipelineGraph([
+        Stage("fuel", engine.fuel_totals, ["fuel_data"]),
+        Stage("cig_cust", lambda items, seed: engine.estimate_customers(items, engine.report_rng(seed, "cig")), ["cig_items", "seed"]),
+        Stage("ecig_cust", lambda items, seed: engine.estimate_customers(items, engine.report_rng(seed, "ecig")), ["ecig_items", "seed"]),
+        Stage("processed", _departments_stage, [
+            "departments", "store_name", "cig_items", "cig_cust", "cig_gross",
+            "ecig_items", "ecig_cust", "ecig_gross", "desired_merch_sale", "seed",
+        ]),
+        Stage("df_final", lambda processed, fuel: engine.apply_fuel_rows(processed["df_final"], fuel[1]), ["processed", "fuel"]),
+        # Fuel rows are not merch, so the totals do not wait on the fuel figures
+        Stage("merch_totals", lambda processed: engine.merch_only_totals(processed["df_final"]), ["processed"]),
+        Stage("mop", _mop_stage, ["processed", "fuel", "manual_credit", "manual_debit", "manual_mobile", "seed"]),
+        Stage("report", _report_stage, ["inputs", "seed", "fuel", "cig_cust", "ecig_cust", "processed", "df_final", "merch_totals", "mop"]),
+        Stage("main_context", _main_context_stage, [
+            "store_name", "open_period_date", "close_period_date", "fuel_data", "seed",
+            "processed", "df_final", "merch_totals", "mop",
+        ]),
+        Stage("accountant_context", _accountant_context_stage, [
+            "store_name", "open_period_date", "close_period_date", "fuel_data",
+            "cig_items", "cig_gross", "ecig_gross", "processed",
+            "inventory_regular", "inventory_super", "inventory_diesel",
+        ]),
+    ])
+
+
+def set_report_inputs(graph, inputs, departments, departments_token):
+    """Load ReportInputs (with a seed) and a department frame into a report_graph()"""
+    if inputs.seed is None:
+        raise ValueError("The report graph needs seeded inputs")
+    for name in INPUT_FIELDS:
+        graph.set_input(name, getattr(inputs, name))
+    graph.set_input("inputs", inputs, repr(inputs))
+    graph.set_input("departments", engine.department_frame(departments), departments_token)
@@ -0,0 +1,908 @@
+import os
+import random
+import re
+import tempfile
+import threading
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import date
+import pandas as pd
+import numpy as np
+from instrumentation import instrumented, span
+from pdf_cache import context_key
+from store_registry import get_registry
+
+# Report pipeline shared by the Streamlit page and the batch runner
+
+MAIN_TEMPLATE = "realistic_report_template.html"
+ACCOUNTANT_TEMPLATE = "Accountant_report.html"
+REPORT_TEMPLATES = (MAIN_TEMPLATE, ACCOUNTANT_TEMPLATE)
+REPORT_KINDS = ("main", "accountant")
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_CACHE_DIR = os.environ.get("SH_REPORTS_TEMPLATE_CACHE", os.path.join(tempfile.gettempdir(), "sh_reports_jinja_cache"))
+
+
+# ===== MONEY =====
+# Department frames carry money as int64 cents from ingestion to the totals;
+# dollars only appear in the user inputs and in the formatted report text.
+DEPARTMENT_MONEY_COLUMNS = ["Gross", "Refunds", "Discounts"]
+MONEY_COLUMNS = [*DEPARTMENT_MONEY_COLUMNS, "Net Sales"]
+MONEY_UNIT = "cents"
+
+
+def to_cents(amount):
+    """Dollar amount(s) as integer cents: an int for a scalar, int64 for an array or Series"""
+    if isinstance(amount, pd.Series):
+        return (amount.astype("float64") * 100).round().astype("int64")
+    if np.ndim(amount):
+        return np.rint(np.asarray(amount, dtype="float64") * 100).astype("int64")
+    return int(round(amount * 100))
+
+
+def format_cents(cents, thousands=True):
+    """Integer cents as a "1,234.56" string (no separators with thousands=False)"""
+    return f"{cents / 100:,.2f}" if thousands else f"{cents / 100:.2f}"
+
+
+def mark_cents(df):
+    """Flag a department frame whose money columns already hold cents (see department_frame)"""
+    df.attrs["money_unit"] = MONEY_UNIT
+    return df
+
+
+def department_frame(df):
+    """Department frame in pipeline form: int64 cents money columns, Net Sales and Category
+
+    Frames from the loaders in this module (and department_store) are already in
+    that form and are returned as they are; any other frame, e.g. a plain
+    pd.read_csv() of an export, is taken to hold dollars and converted.
+    """
+    if df.attrs.get("money_unit") == MONEY_UNIT:
+        return df
+    df = df.copy()
+    for column in DEPARTMENT_MONEY_COLUMNS:
+        df[column] = to_cents(df[column].fillna(0)) if column in df.columns else 0
+    df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
+    if "Category" not in df.columns:
+        df["Category"] = classify_departments(df["Description"])
+    return mark_cents(df)
+
+
+def dollars_frame(df):
+    """Copy of a cents department frame with the money columns in dollars, for display"""
+    df = df.copy()
+    for column in MONEY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column] / 100
+    df.attrs.pop("money_unit", None)
+    return df
+
+
+# ===== EMBEDDED CSV DATA =====
+def get_default_department_data():
+    """Return default department data as a pandas DataFrame"""
+
+    # Default department data - you can modify this with your actual data
+    default_data = {
+        'Dept#': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 100, 9998, 9999],
+        'Description': ['CIGARETTES', 'Grocery TAX', 'BEER', 'DAIRY', 'SNACKS', 'AUTO', 'CONDOM', 'WATER', 'TOBACCO', 'COFFEE', 'PILLS', 'MEDICINE', 'ENERGY DRINKS', 'GROCERY', 'Bakery', 'CHEW TOBACCO', 'SODA', 'CANDY', 'CHIPS', 'PHONE ACC', 'NEWS PAPER', 'ICE CREAM', 'PHONE CARDS', 'CIGAR', 'ICE', 'DELI', 'MILK SHAKE', 'GLOVES', 'SANTIZER', 'E-Cigarette', 'JUICE', 'HOT FOOD', 'Honey', 'ICED COFFEE', 'MISC', 'MANUAL FUEL DE', 'FUEL DEPOSIT'],
+        'Cust#': [0, 89, 1395, 95, 248, 166, 53, 613, 154, 322, 47, 50, 1026, 48, 127, 720, 628, 842, 341, 67, 150, 96, 26, 134, 120, 90, 90, 42, 25, 0, 213, 44, 62, 127, 218, 5924, 0],
+        'Items': [0, 111, 243, 102, 266, 207, 68, 736, 251, 552, 57, 64, 1328, 88, 177, 927, 746, 1124, 410, 73, 162, 145, 37, 165, 202, 123, 113, 54, 43, 0, 678, 56, 74, 152, 277, 6940, 0],
+        'Gross': [0.0, 524.06, 26646.77, 584.29, 2907.31, 1806.08, 364.58, 2505.56, 657.28, 1131.98, 323.28, 252.4, 2865.07, 330.65, 1780.11, 1842.39, 2788.85, 772.43, 2001.39, 824.25, 513.52, 1365.78, 93.48, 313.32, 311.2, 421.64, 767.49, 328.7, 81.26, 0.0, 1380.08, 84.34, 886.44, 767.49, 1776.51, 0.0, 0.0],
+        'Refunds': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        'Discounts': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    }
+
+    # Create DataFrame (money columns in cents, Net Sales and Category added)
+    return department_frame(pd.DataFrame(default_data))
+
+# ===== CSV INGESTION =====
+DEPARTMENT_KEY_COLUMNS = ["Dept#", "Description"]
+DEPARTMENT_VALUE_COLUMNS = ["Cust#", "Items", "Gross", "Refunds", "Discounts"]
+DEPARTMENT_COUNT_COLUMNS = ["Cust#", "Items"]
+DEPARTMENT_CSV_DTYPES = {
+    "Dept#": "int32",
+    "Description": "category",
+    # Counts are parsed as float32 so blank cells don't fail (nullable Int32 parsing
+    # is ~2x slower) and stored as int32 once the chunk is read
+    "Cust#": "float32",
+    "Items": "float32",
+    "Gross": "float64",
+    "Refunds": "float64",
+    "Discounts": "float64",
+}
+REQUIRED_CSV_COLUMNS = ["Dept#", "Description", "Gross"]
+
+
+@instrumented("csv_load")
+def load_department_csv(source, chunksize=100_000):
+    """Stream a department or item-level CSV in chunks and roll it up to Dept#/Description
+
+    Only the department columns are parsed, with compact dtypes, and each chunk is
+    aggregated before the next is read, so peak memory depends on the chunk size and
+    the number of departments rather than on the file size. Missing Cust#/Items/
+    Refunds/Discounts columns are treated as zero.
+    """
+    totals = None
+    reader = pd.read_csv(
+        source,
+        usecols=lambda column: column in DEPARTMENT_CSV_DTYPES,
+        dtype=DEPARTMENT_CSV_DTYPES,
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            missing = [column for column in REQUIRED_CSV_COLUMNS if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"Department CSV is missing required columns: {', '.join(missing)}")
+            for column in DEPARTMENT_VALUE_COLUMNS:
+                if column not in chunk.columns:
+                    chunk[column] = 0
+            for column in DEPARTMENT_COUNT_COLUMNS:
+                chunk[column] = chunk[column].fillna(0).astype("int32")
+            # Cents before summing, so chunk totals add up exactly
+            for column in DEPARTMENT_MONEY_COLUMNS:
+                chunk[column] = to_cents(chunk[column].fillna(0))
+
+            part = chunk.groupby(DEPARTMENT_KEY_COLUMNS, observed=True, sort=False)[DEPARTMENT_VALUE_COLUMNS].sum()
+            if totals is not None:
+                part = pd.concat([totals, part]).groupby(level=[0, 1], sort=False).sum()
+            totals = part
+
+    if totals is None:
+        raise ValueError("Department CSV is empty")
+
+    df = totals.reset_index().sort_values("Dept#", kind="stable", ignore_index=True)
+    df["Dept#"] = df["Dept#"].astype("int32")
+    df["Description"] = df["Description"].astype("category")
+    for column in DEPARTMENT_COUNT_COLUMNS:
+        df[column] = df[column].astype("int64")
+
+    # Calculate Net Sales
+    df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
+    # Classify once at load time; later stages reuse the Category column
+    df["Category"] = classify_departments(df["Description"])
+    return mark_cents(df)
+
+
+# Store IDs and tax rates come from store_registry (data/stores.csv, data/tax_jurisdictions.csv)
+fuel_products = ["REG", "PLUS", "SUPER", "DIESEL"]
+
+excluded_keywords = ["FUEL", "FUEL DEPOSIT", "MANUAL FUEL"]
+manual_fuel_keyword = "MANUAL FUEL DE"
+cig_keyword = "CIGARETTES"
+ecig_keyword = "E-CIGARETTE"
+
+
+# ===== DEPARTMENT CLASSIFICATION =====
+CATEGORY_MANUAL_FUEL = "manual_fuel"
+CATEGORY_FUEL = "fuel"
+CATEGORY_ECIG = "ecig"
+CATEGORY_CIGARETTES = "cigarettes"
+CATEGORY_SCALABLE = "scalable"
+DEPARTMENT_CATEGORIES = [CATEGORY_MANUAL_FUEL, CATEGORY_FUEL, CATEGORY_ECIG, CATEGORY_CIGARETTES, CATEGORY_SCALABLE]
+FUEL_CATEGORIES = [CATEGORY_MANUAL_FUEL, CATEGORY_FUEL]
+MERCH_CATEGORIES = [CATEGORY_ECIG, CATEGORY_CIGARETTES, CATEGORY_SCALABLE]
+
+
+# Keyword checks in priority order: fuel wins over e-cig, e-cig over cigarettes
+CATEGORY_RULES = [
+    (CATEGORY_MANUAL_FUEL, re.compile(re.escape(manual_fuel_keyword))),
+    (CATEGORY_FUEL, re.compile("|".join(re.escape(keyword) for keyword in excluded_keywords))),
+    (CATEGORY_ECIG, re.compile(re.escape(ecig_keyword))),
+    (CATEGORY_CIGARETTES, re.compile(re.escape(cig_keyword))),
+]
+
+
+def classify_departments(descriptions):
+    """Tag every Description with its department category as a Categorical
+
+    Only the distinct descriptions are upper-cased and matched (vectorized, one
+    compiled pattern per rule) and the result is mapped back through the factorized
+    codes, so nothing is scanned per row. Missing descriptions count as scalable.
+    """
+    codes, uniques = pd.factorize(descriptions)
+    text = pd.Series(np.asarray(uniques, dtype=object), dtype=object).astype(str).str.upper()
+    unique_codes = np.select(
+        [text.str.contains(pattern, regex=True).to_numpy(dtype=bool) for _, pattern in CATEGORY_RULES],
+        [DEPARTMENT_CATEGORIES.index(name) for name, _ in CATEGORY_RULES],
+        default=DEPARTMENT_CATEGORIES.index(CATEGORY_SCALABLE),
+    ).astype(np.int8)
+    # code -1 (missing description) picks the appended scalable entry
+    lookup = np.append(unique_codes, np.int8(DEPARTMENT_CATEGORIES.index(CATEGORY_SCALABLE)))
+    return pd.Categorical.from_codes(lookup[codes], categories=DEPARTMENT_CATEGORIES)
+
+
+def description_contains(descriptions, keyword):
+    """Rows whose upper-cased Description contains keyword, checked once per distinct value"""
+    matches = [value for value in pd.unique(descriptions.dropna()) if keyword in str(value).upper()]
+    return descriptions.isin(matches)
+
+
+# ===== DEPARTMENT / FUEL / MOP PIPELINE =====
+def estimate_customers(items, rng=random):
+    """Approximate the number of customers as 80-90% of packets sold"""
+    if items > 0:
+        return int(items * rng.uniform(0.80, 0.90))
+    return 0
+
+
+def fuel_totals(fuel_data):
+    """Return (total volume, total amount) over all fuel products"""
+    fuel_total_volume = sum(row["volume"] for row in fuel_data.values())
+    fuel_total_amount = sum(row["amount"] for row in fuel_data.values())
+    return fuel_total_volume, fuel_total_amount
+
+
+@instrumented("departments")
+def process_departments(df, store_name, cig_items, cig_cust, cig_gross, ecig_items, ecig_cust, ecig_gross, desired_merch_sale, rng=random):
+    """Apply the cigarette overrides, merch scaling and sales tax to a department frame
+
+    Everything here is independent of the fuel figures; apply_fuel_rows() fills
+    in the manual fuel rows afterwards. The input frame is not modified. Money
+    arguments are dollars; the returned frame and totals are integer cents.
+    Returns a dict with the frame, the summary rows printed under it
+    ([(description, net sales)], kept out of the frame so its columns stay
+    typed) and the merch / tax totals. `rng` is a random.Random (or the random
+    module) for the random customer/item top-ups.
+    """
+    df = department_frame(df).copy()
+
+    category = df["Category"]
+    fuel_mask = category.isin(FUEL_CATEGORIES)
+    cig_only_mask = category == CATEGORY_CIGARETTES
+    ecig_only_mask = category == CATEGORY_ECIG
+    scalable_mask = category == CATEGORY_SCALABLE
+
+    df.loc[cig_only_mask, "Cust#"] = cig_cust
+    df.loc[cig_only_mask, "Items"] = cig_items
+    df.loc[cig_only_mask, "Gross"] = to_cents(cig_gross)
+
+    df.loc[ecig_only_mask, "Cust#"] = ecig_cust
+    df.loc[ecig_only_mask, "Items"] = ecig_items
+    df.loc[ecig_only_mask, "Gross"] = to_cents(ecig_gross)
+
+    df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
+    cig_ecig_net_sales = df.loc[cig_only_mask | ecig_only_mask, "Net Sales"].sum()
+    original_net_sales_scalable = df.loc[scalable_mask, "Net Sales"]
+
+    if desired_merch_sale > 0:
+        target_net_sales_scalable = to_cents(desired_merch_sale) - cig_ecig_net_sales
+        original_net_sum = original_net_sales_scalable.sum()
+        if original_net_sum > 0 and target_net_sales_scalable > 0:
+            scale_factor = target_net_sales_scalable / original_net_sum
+            df.loc[scalable_mask, "Gross"] = (
+                (original_net_sales_scalable * scale_factor).round().astype("int64")
+                + df.loc[scalable_mask, "Refunds"]
+                + df.loc[scalable_mask, "Discounts"]
+            )
+
+    df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
+    merch_mask = ~fuel_mask
+    total_merch_gross = int(df.loc[merch_mask, "Gross"].sum())
+    df["% of Sales"] = 0.0
+    df.loc[merch_mask, "% of Sales"] = (df.loc[merch_mask, "Gross"] / total_merch_gross * 100).round(2)
+
+    # Random cust/items on scalable rows
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    df.loc[scalable_mask, "Cust#"] += np_rng.integers(11, 31, size=scalable_mask.sum())
+    df.loc[scalable_mask, "Items"] += np_rng.integers(11, 31, size=scalable_mask.sum())
+
+    total_merch_sale = int(df.loc[merch_mask, "Net Sales"].sum())
+    multiplier = get_registry().tax_multiplier(store_name)  # KeyError for stores missing from the registry
+    tax_rate = round((multiplier - 1) * 100, 3)  # Convert multiplier to percent rate
+    sales_tax = round(total_merch_sale * tax_rate / 100)
+
+    tot_taxes = sales_tax
+    incl_taxes = total_merch_sale + sales_tax
+
+    return {
+        "df_final": df,
+        "summary_rows": [("Total Merch Sale", total_merch_sale)],
+        "merch_mask": merch_mask,
+        "total_merch_sale": total_merch_sale,
+        "total_merch_gross": total_merch_gross,
+        "sales_tax": sales_tax,
+        "tot_taxes": tot_taxes,
+        "incl_taxes": incl_taxes,
+    }
+
+
+def apply_fuel_rows(df, fuel_total_amount):
+    """Copy of a processed department frame whose manual fuel rows carry the fuel total (dollars)"""
+    df = df.copy()
+    manual_fuel_mask = df["Category"] == CATEGORY_MANUAL_FUEL
+    df.loc[manual_fuel_mask, "Gross"] = to_cents(fuel_total_amount)
+    df.loc[manual_fuel_mask, "Refunds"] = 0
+    df.loc[manual_fuel_mask, "Discounts"] = 0
+    df.loc[manual_fuel_mask, "Net Sales"] = to_cents(fuel_total_amount)
+    return df
+
+
+def process_department_data(df, store_name, cig_items, cig_cust, cig_gross, ecig_items, ecig_cust, ecig_gross, desired_merch_sale, fuel_total_amount, rng=random):
+    """process_departments() followed by apply_fuel_rows(), returning the same dict"""
+    processed = process_departments(df, store_name, cig_items, cig_cust, cig_gross, ecig_items, ecig_cust, ecig_gross, desired_merch_sale, rng)
+    processed["df_final"] = apply_fuel_rows(processed["df_final"], fuel_total_amount)
+    return processed
+
+
+@instrumented("mop")
+def calculate_mop(total_merch_sale, fuel_total_amount, tot_taxes, manual_credit, manual_debit, manual_mobile, rng=random):
+    """Return (total MOP sales, pay out, MOP values) in cents, with cash balancing the manual entries
+
+    All amounts are integer cents.
+    """
+    manual_total = manual_credit + manual_debit + manual_mobile
+
+    # Calculate total MOP sales
+    total_mop_sales = total_merch_sale + fuel_total_amount + tot_taxes
+
+    # Generate Pay Out value (reduced range from 3000-9000)
+    pay_out = to_cents(rng.uniform(3000, 9000))
+
+    # Calculate Cash after deducting Pay Out
+    manual_mop_values = {
+        "credit": manual_credit,
+        "debit": manual_debit,
+        "mobile": manual_mobile,
+        "cash": max(0, total_mop_sales - manual_total - pay_out)  # Subtract pay_out from available cash
+    }
+    return total_mop_sales, pay_out, manual_mop_values
+
+
+def merch_only_totals(df_final):
+    """Return merchandise-only (gross, net sales, discounts, refunds) totals of the final frame in cents"""
+    clean_mask = df_final["Category"].isin(MERCH_CATEGORIES) & df_final["Description"].notna()
+    totals = df_final.loc[clean_mask, ["Gross", "Net Sales", "Discounts", "Refunds"]].sum()
+    return tuple(int(total) for total in totals)
+
+
+# ===== REPORT CONTEXTS =====
+def generate_random_time(rng=random):
+    hour = rng.randint(22, 23)
+    if hour == 22:
+        minute = rng.randint(1, 59)
+    else:
+        minute = rng.randint(0, 49)
+    return f"{hour:02d}:{minute:02d}"
+
+
+def safe_sum_numeric(series):
+    try:
+        numeric_series = pd.to_numeric(series, errors='coerce')
+        return int(numeric_series.sum()) if not numeric_series.isna().all() else 0
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+DepartmentRow = namedtuple("DepartmentRow", "dept description cust items percent gross refunds discounts net_sales")
+
+
+def _text_column(series):
+    """Column values as strings, blank where missing"""
+    values = series.to_numpy(dtype=object)
+    text = values.astype(str).astype(object)
+    text[pd.isna(values)] = ""
+    return text
+
+
+def _count_column(series):
+    """Whole non-negative numbers as integer strings, blank for anything else"""
+    numeric = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+    valid = ~np.isnan(numeric)
+    valid[valid] = (numeric[valid] >= 0) & (numeric[valid] % 1 == 0)
+    text = np.full(len(numeric), "", dtype=object)
+    text[valid] = numeric[valid].astype(np.int64).astype(str)
+    return text
+
+
+def _cents_column(series, thousands=False):
+    """Integer cents as "1234.56" strings ("1,234.56" with thousands=True)"""
+    # f-strings over a plain list beat Series.map and numpy string ops here
+    values = series.tolist()
+    if thousands:
+        return np.array([f"{cents / 100:,.2f}" for cents in values], dtype=object)
+    return np.array([f"{cents / 100:.2f}" for cents in values], dtype=object)
+
+
+def _percent_column(series):
+    return np.array([f"{percent:.2f}" for percent in series.tolist()], dtype=object)
+
+
+def format_department_rows(df_final, summary_rows=()):
+    """Format the department table column by column into plain records for the template loop
+
+    summary_rows ([(description, net sales cents), ...]) are appended as total
+    lines with only the description and net sales filled in.
+    """
+    columns = [
+        _text_column(df_final["Dept#"]),
+        _text_column(df_final["Description"]),
+        _count_column(df_final["Cust#"]),
+        _count_column(df_final["Items"]),
+        _percent_column(df_final["% of Sales"]),
+        _cents_column(df_final["Gross"]),
+        _cents_column(df_final["Refunds"]),
+        _cents_column(df_final["Discounts"]),
+        _cents_column(df_final["Net Sales"]),
+    ]
+    # namedtuples keep {{ row.gross }} on Jinja's fast attribute path
+    rows = list(map(DepartmentRow._make, zip(*(column.tolist() for column in columns))))
+    rows.extend(
+        DepartmentRow("", description, "", "", "", "", "", "", format_cents(net_sales, thousands=False))
+        for description, net_sales in summary_rows
+    )
+    return rows
+
+
+def build_main_context(store_name, store_id, open_period_date, close_period_date, fuel_data, manual_mop_vals, total_mop_sales_val, df_final_param, total_merch_sale_param, sales_tax_param, tot_taxes_param, incl_taxes_param, total_merch_gross_param, total_discounts_param, total_refunds_param, total_percent_param, pay_out_val, rng=random, summary_rows=()):
+    """Return the template context for realistic_report_template.html
+
+    Totals and MOP values are dollars; df_final_param is the cents department frame.
+    """
+    fuel_total_volume, fuel_total_amount = fuel_totals(fuel_data)
+
+    # Generate other Payment Out values (keep existing logic for other items)
+    safe_drops = round(rng.uniform(30000, 49000), 2)
+    total_payment_out = round(pay_out_val + safe_drops, 2)  # Use the passed pay_out_val
+
+    # Generate random MOP Cancel/Refund values
+    mop_cancel_refund = round(rng.uniform(89, 199), 2)
+    other_refund = round(rng.uniform(12, 99), 2)
+    total_to_account_for = round(mop_cancel_refund + other_refund, 2)
+
+    credit_percentage = rng.uniform(0.2, 0.8)
+    credit_card_based = round(total_to_account_for * credit_percentage, 2)
+    cash_based = round(total_to_account_for - credit_card_based, 2)
+
+    # Generate random values for Memo Items
+    memo_data = {
+        "items_count": safe_sum_numeric(df_final_param.loc[description_contains(df_final_param['Description'], 'ITEM'), 'Items']) if 'Items' in df_final_param.columns else 0,
+        "customer_count": safe_sum_numeric(df_final_param.loc[description_contains(df_final_param['Description'], 'CUST'), 'Cust#']) if 'Cust#' in df_final_param.columns else 0,
+        "total_items": safe_sum_numeric(df_final_param['Items']) if 'Items' in df_final_param.columns else 0,
+        "total_customers": safe_sum_numeric(df_final_param['Cust#']) if 'Cust#' in df_final_param.columns else 0,
+        "void_lines_count": rng.randint(50, 250),
+        "void_lines_amount": round(rng.uniform(2000, 5000), 2),
+        "void_tickets_count": rng.randint(15, 95),
+        "void_tickets_amount": round(rng.uniform(500, 2000), 2),
+        "positive_count": rng.randint(10, 60),
+        "positive_amount": round(rng.uniform(300, 900), 2),
+        "negative_count": rng.randint(10, 60),
+        "negative_amount": round(rng.uniform(300, 900), 2),
+        "suspended_count": rng.randint(3, 99),
+        "suspended_amount": round(rng.uniform(119, 799), 2),
+        "suspend_void_count": rng.randint(1, 29),
+        "suspend_void_amount": round(rng.uniform(11, 199), 2)
+    }
+
+    open_time = generate_random_time(rng)
+    close_time = generate_random_time(rng)
+
+    return {
+        "store_number": store_name,
+        "store_id": store_id,
+        "period": f"{open_period_date.strftime('%Y-%m-%d')} {open_time}",
+        "close_period": f"{close_period_date.strftime('%Y-%m-%d')} {close_time}",
+        "department_rows": format_department_rows(df_final_param, summary_rows),
+        "total_gross": f"{total_merch_gross_param:,.2f}",
+        "total_net_sales": f"{total_merch_sale_param:,.2f}",
+        "total_discounts": f"{total_discounts_param:,.2f}",
+        "total_refunds": f"{total_refunds_param:,.2f}",
+        "total_percent": f"{total_percent_param:.2f}",
+        "fuel_data": fuel_data,
+        "fuel_total_volume": fuel_total_volume,
+        "fuel_total_amount": fuel_total_amount,
+        "total_mop_sales": f"{total_mop_sales_val:,.2f}",
+        "fuel_sales": f"{fuel_total_amount:,.2f}",
+        "merch_sales": f"{total_merch_sale_param:,.2f}",
+        "sales_taxes": f"{sales_tax_param:,.2f}",
+        "tot_taxes": f"{tot_taxes_param:,.2f}",
+        "incl_taxes": f"{incl_taxes_param:,.2f}",
+        "pay_out": f"{pay_out_val:,.2f}",  # Use the passed value
+        "safe_drops": f"{safe_drops:,.2f}",
+        "total_payment_out": f"{total_payment_out:,.2f}",
+        "mop_cancel_refund": f"{mop_cancel_refund:.2f}",
+        "other_refund": f"{other_refund:.2f}",
+        "total_to_account_for": f"{total_to_account_for:.2f}",
+        "credit_card_based": f"{credit_card_based:.2f}",
+        "cash_based": f"{cash_based:.2f}",
+        "mop_credit": f"{manual_mop_vals['credit']:,.2f}",
+        "mop_debit": f"{manual_mop_vals['debit']:,.2f}",
+        "mop_mobile": f"{manual_mop_vals['mobile']:,.2f}",
+        "mop_cash": f"{manual_mop_vals['cash']:,.2f}",
+        **memo_data
+    }
+
+
+StationRow = namedtuple("StationRow", [
+    "station_id", "station_name",
+    "fuel_regular_gal", "fuel_regular_amount", "fuel_plus_gal", "fuel_plus_amount",
+    "fuel_super_gal", "fuel_super_amount", "fuel_diesel_gal", "fuel_diesel_amount",
+    "cig_packets", "cig_sales", "ecig_sales", "other_sales", "total_store_sales",
+    "inventory_date", "inventory_regular", "inventory_super", "inventory_diesel",
+])
+
+# Accountant's report columns: fuel_data product -> (gallons column, amount column)
+STATION_FUEL_COLUMNS = {
+    "REG": ("fuel_regular_gal", "fuel_regular_amount"),
+    "PLUS": ("fuel_plus_gal", "fuel_plus_amount"),
+    "SUPER": ("fuel_super_gal", "fuel_super_amount"),
+    "DIESEL": ("fuel_diesel_gal", "fuel_diesel_amount"),
+}
+
+
+def format_station_rows(stations):
+    """Format a station frame (see station_frame()) into one StationRow per station for the template loops"""
+    stations = stations.assign(other_sales=stations["total_merch_sale"] - stations["cig_gross"] - stations["ecig_gross"])
+    columns = [
+        stations["station_id"].to_numpy(dtype=object),
+        stations["station_name"].to_numpy(dtype=object),
+    ]
+    for gallons, amount in STATION_FUEL_COLUMNS.values():
+        columns += [stations[gallons].to_numpy(dtype=object), _cents_column(stations[amount], thousands=True)]
+    columns += [
+        stations["cig_items"].to_numpy(dtype=object),
+        _cents_column(stations["cig_gross"], thousands=True),
+        _cents_column(stations["ecig_gross"], thousands=True),
+        _cents_column(stations["other_sales"], thousands=True),
+        _cents_column(stations["total_merch_sale"], thousands=True),
+        stations["close_period_date"].map(lambda day: day.strftime('%m/%d/%Y')).to_numpy(dtype=object),
+        stations["inventory_regular"].map("{:,}".format).to_numpy(dtype=object),
+        stations["inventory_super"].map("{:,}".format).to_numpy(dtype=object),
+        stations["inventory_diesel"].map("{:,}".format).to_numpy(dtype=object),
+    ]
+    return list(map(StationRow._make, zip(*(column.tolist() for column in columns))))
+
+
+def station_record(store_name, store_id, close_period_date, fuel_data, cig_items, cig_gross, ecig_gross, total_merch_sale, inventory_regular, inventory_super, inventory_diesel):
+    """One row of the station frame the accountant's report is built from (dollar amounts stored as cents)"""
+    record = {"station_id": store_id, "station_name": store_name, "close_period_date": close_period_date}
+    for product, (gallons, amount) in STATION_FUEL_COLUMNS.items():
+        record[gallons] = fuel_data[product]["volume"]
+        record[amount] = to_cents(fuel_data[product]["amount"])
+    record.update(
+        cig_items=cig_items, cig_gross=to_cents(cig_gross), ecig_gross=to_cents(ecig_gross), total_merch_sale=to_cents(total_merch_sale),
+        inventory_regular=inventory_regular, inventory_super=inventory_super, inventory_diesel=inventory_diesel,
+    )
+    return record
+
+
+def build_accountant_context(store_name, store_id, open_period_date, close_period_date, fuel_data, cig_items, cig_gross, ecig_gross, total_merch_sale, inventory_regular, inventory_super, inventory_diesel):
+    """Return the template context for Accountant_report.html with a single station"""
+    stations = pd.DataFrame([station_record(
+        store_name, store_id, close_period_date, fuel_data, cig_items, cig_gross, ecig_gross, total_merch_sale,
+        inventory_regular, inventory_super, inventory_diesel
+    )])
+    return stations_accountant_context(stations, open_period_date, close_period_date)
+
+
+def stations_accountant_context(stations, open_period_date, close_period_date):
+    """Return the template context for Accountant_report.html with one row per station of the frame"""
+    return {
+        "period_month": f"{open_period_date.strftime('%B %Y')}",
+        "report_period": f"{open_period_date.strftime('%Y-%m-%d')} to {close_period_date.strftime('%Y-%m-%d')}",
+        "stations": format_station_rows(stations),
+    }
+
+
+# ===== RENDERING =====
+_template_env = None
+_template_env_lock = threading.Lock()
+
+
+def get_template_env():
+    """Return the process-wide Jinja environment for the report templates
+
+    Templates are compiled once per process and kept in the environment's cache;
+    with auto_reload Jinja re-checks the file mtime on every lookup and recompiles
+    only when it changed. Compiled bytecode is also written to TEMPLATE_CACHE_DIR so
+    new processes (batch workers, Streamlit restarts) skip the compile step too.
+    """
+    global _template_env
+    if _template_env is None:
+        with _template_env_lock:
+            if _template_env is None:
+                # Imported here so the first screen and CSV-only workers do not pay for Jinja
+                from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+                os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+                _template_env = Environment(
+                    loader=FileSystemLoader(TEMPLATE_DIR),
+                    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+                    auto_reload=True,
+                )
+    return _template_env
+
+
+def get_template(template_name):
+    return get_template_env().get_template(template_name)
+
+
+def preload_templates():
+    """Compile both report templates ahead of the first render"""
+    for template_name in REPORT_TEMPLATES:
+        get_template(template_name)
+
+
+def render_template(template_name, context):
+    with span("html", template=template_name):
+        return get_template(template_name).render(context)
+
+
+def render_pdf(template_name, context, backend, cache=None):
+    """Render a report template straight to PDF bytes with the given PDF backend
+
+    The backend decides how: HTML backends render the Jinja template first, the
+    native backend lays supported templates out directly. With a
+    pdf_cache.PdfCache, a context that was rendered before is served from the
+    cache without touching the template or the backend.
+    """
+    with span("pdf", template=template_name, backend=backend.name):
+        if cache is None:
+            return backend.render_report(template_name, context, render_template)
+        key = context_key(os.path.join(TEMPLATE_DIR, template_name), context, backend.cache_options(template_name))
+        return cache.get_or_render(key, lambda: backend.render_report(template_name, context, render_template))
+
+
+def report_filename(prefix, store_name, open_period_date):
+    return f"{prefix}_{store_name.replace(' ', '_').replace('-', '_')}_{open_period_date.strftime('%Y_%m_%d')}.pdf"
+
+
+# ===== COMPUTE / RENDER API =====
+# compute_report() is the whole pipeline as one UI-free call; the Streamlit page,
+# the batch runner and the benchmarks all go through it.
+def empty_fuel_data():
+    return {product: {"volume": 0, "amount": 0.0} for product in fuel_products}
+
+
+@dataclass(frozen=True)
+class ReportInputs:
+    """Everything a user enters for one store and period"""
+    store_name: str
+    open_period_date: date
+    close_period_date: date
+    fuel_data: dict = field(default_factory=empty_fuel_data)
+    cig_items: int = 0
+    cig_gross: float = 0.0
+    ecig_items: int = 0
+    ecig_gross: float = 0.0
+    desired_merch_sale: float = 0.0
+    manual_credit: float = 0.0
+    manual_debit: float = 0.0
+    manual_mobile: float = 0.0
+    inventory_regular: int = 0
+    inventory_super: int = 0
+    inventory_diesel: int = 0
+    # Seeds every random figure in the report; None draws a fresh seed per compute
+    seed: int = None
+
+
+@dataclass
+class ReportData:
+    """Result of compute_report(): the final department frame plus every total the reports print
+
+    Money is integer cents throughout (df_final's money columns, the totals and
+    manual_mop_values); fuel_total_amount is the dollar total of the inputs.
+    """
+    inputs: ReportInputs
+    seed: int
+    store_id: str
+    fuel_total_volume: float
+    fuel_total_amount: float
+    cig_cust: int
+    ecig_cust: int
+    df_final: pd.DataFrame
+    summary_rows: list
+    total_merch_sale: int
+    total_merch_gross: int
+    sales_tax: int
+    tot_taxes: int
+    incl_taxes: int
+    total_mop_sales: int
+    pay_out: int
+    manual_mop_values: dict
+    merch_gross: int
+    merch_net_sales: int
+    merch_discounts: int
+    merch_refunds: int
+
+
+def report_rng(seed, stream):
+    """Independent random stream per pipeline stage, so changing one input leaves the other stages' figures alone"""
+    return random.Random(f"{seed}:{stream}")
+
+
+def compute_report(inputs, departments=None):
+    """Run the department, fuel and MOP pipeline for one store and period
+
+    `departments` is the department frame to start from (default data when None);
+    it is not modified. The same inputs and seed always give the same ReportData.
+    """
+    with span("compute", store=inputs.store_name):
+        if departments is None:
+            departments = get_default_department_data()
+        seed = inputs.seed if inputs.seed is not None else random.SystemRandom().getrandbits(32)
+
+        fuel_total_volume, fuel_total_amount = fuel_totals(inputs.fuel_data)
+        cig_cust = estimate_customers(inputs.cig_items, report_rng(seed, "cig"))
+        ecig_cust = estimate_customers(inputs.ecig_items, report_rng(seed, "ecig"))
+
+        processed = process_department_data(
+            departments, inputs.store_name,
+            inputs.cig_items, cig_cust, inputs.cig_gross,
+            inputs.ecig_items, ecig_cust, inputs.ecig_gross,
+            inputs.desired_merch_sale, fuel_total_amount,
+            rng=report_rng(seed, "departments")
+        )
+        total_mop_sales, pay_out, manual_mop_values = calculate_mop(
+            processed["total_merch_sale"], to_cents(fuel_total_amount), processed["tot_taxes"],
+            to_cents(inputs.manual_credit), to_cents(inputs.manual_debit), to_cents(inputs.manual_mobile),
+            rng=report_rng(seed, "mop")
+        )
+        merch_gross, merch_net_sales, merch_discounts, merch_refunds = merch_only_totals(processed["df_final"])
+
+        return ReportData(
+            inputs=inputs,
+            seed=seed,
+            store_id=get_registry().store_id(inputs.store_name),
+            fuel_total_volume=fuel_total_volume,
+            fuel_total_amount=fuel_total_amount,
+            cig_cust=cig_cust,
+            ecig_cust=ecig_cust,
+            df_final=processed["df_final"],
+            summary_rows=processed["summary_rows"],
+            total_merch_sale=processed["total_merch_sale"],
+            total_merch_gross=processed["total_merch_gross"],
+            sales_tax=processed["sales_tax"],
+            tot_taxes=processed["tot_taxes"],
+            incl_taxes=processed["incl_taxes"],
+            total_mop_sales=total_mop_sales,
+            pay_out=pay_out,
+            manual_mop_values=manual_mop_values,
+            merch_gross=merch_gross,
+            merch_net_sales=merch_net_sales,
+            merch_discounts=merch_discounts,
+            merch_refunds=merch_refunds,
+        )
+
+
+def station_merch_totals(departments, cig_gross, ecig_gross, desired_merch_sale):
+    """Total merch sale process_department_data() arrives at, for many stations in one pass
+
+    cig_gross, ecig_gross and desired_merch_sale hold one cents value per
+    station; the department frame is shared. Every station's merch rows are laid
+    out as one row of a station-by-department matrix, so the cigarette overrides
+    and the scaling are applied to all stations at once. The random
+    customer/item top-ups do not touch sales, so no seed is needed.
+    """
+    departments = department_frame(departments)
+    category = departments["Category"]
+    merch_rows = ~category.isin(FUEL_CATEGORIES).to_numpy()
+    merch_category = np.asarray(category)[merch_rows]
+    original_net = departments["Net Sales"].to_numpy()[merch_rows]
+    deductions = (departments["Refunds"] + departments["Discounts"]).to_numpy()[merch_rows]
+    cig_mask = merch_category == CATEGORY_CIGARETTES
+    ecig_mask = merch_category == CATEGORY_ECIG
+    scalable_mask = merch_category == CATEGORY_SCALABLE
+
+    cig_gross = np.asarray(cig_gross, dtype="int64")[:, None]
+    ecig_gross = np.asarray(ecig_gross, dtype="int64")[:, None]
+    desired_merch_sale = np.asarray(desired_merch_sale, dtype="int64")
+
+    # station x merch department net sales
+    net = np.broadcast_to(original_net, (len(desired_merch_sale), len(original_net))).copy()
+    net[:, cig_mask] = cig_gross - deductions[cig_mask]
+    net[:, ecig_mask] = ecig_gross - deductions[ecig_mask]
+
+    target = desired_merch_sale - net[:, cig_mask | ecig_mask].sum(axis=1)
+    original_sum = original_net[scalable_mask].sum()
+    scaled = (desired_merch_sale > 0) & (target > 0) & (original_sum > 0)
+    if scaled.any() and scalable_mask.any():
+        scale_factor = target[scaled, None] / original_sum
+        rows = np.flatnonzero(scaled)
+        net[np.ix_(rows, np.flatnonzero(scalable_mask))] = np.rint(original_net[scalable_mask] * scale_factor).astype("int64")
+    return net.sum(axis=1)
+
+
+def station_frame(inputs_list, departments=None):
+    """Store-by-metric frame of everything the accountant's report prints, one row per ReportInputs
+
+    All stations share one department frame (default data when None).
+    """
+    with span("compute_stations", stations=len(inputs_list)):
+        if departments is None:
+            departments = get_default_department_data()
+        stations = pd.DataFrame([
+            station_record(
+                inputs.store_name, get_registry().store_id(inputs.store_name), inputs.close_period_date, inputs.fuel_data,
+                inputs.cig_items, inputs.cig_gross, inputs.ecig_gross, 0.0,
+                inputs.inventory_regular, inputs.inventory_super, inputs.inventory_diesel
+            )
+            for inputs in inputs_list
+        ])
+        stations["total_merch_sale"] = station_merch_totals(
+            departments,
+            stations["cig_gross"].to_numpy(),
+            stations["ecig_gross"].to_numpy(),
+            to_cents([inputs.desired_merch_sale for inputs in inputs_list]),
+        )
+        return stations
+
+
+def consolidated_accountant_context(inputs_list, departments=None, stations=None):
+    """Accountant's report context with one row per station, covering the earliest to the latest period
+
+    Pass a precomputed `stations` frame (e.g. concatenated from stations with
+    different department data) to skip station_frame().
+    """
+    if stations is None:
+        stations = station_frame(inputs_list, departments)
+    open_period_date = min(inputs.open_period_date for inputs in inputs_list)
+    close_period_date = max(inputs.close_period_date for inputs in inputs_list)
+    with span("context_accountant", stations=len(inputs_list)):
+        return stations_accountant_context(stations, open_period_date, close_period_date)
+
+
+def render_consolidated_accountant_pdf(inputs_list, backend, departments=None, cache=None, stations=None):
+    """Render every station's accountant figures into a single PDF with one backend call"""
+    context = consolidated_accountant_context(inputs_list, departments, stations)
+    return render_pdf(ACCOUNTANT_TEMPLATE, context, backend, cache)
+
+
+def consolidated_accountant_filename(inputs_list):
+    return report_filename("Accountant", "All Stations", min(inputs.open_period_date for inputs in inputs_list))
+
+
+def main_context(data):
+    """Template context of the main report for computed ReportData"""
+    inputs = data.inputs
+    return build_main_context(
+        inputs.store_name, data.store_id, inputs.open_period_date, inputs.close_period_date, inputs.fuel_data,
+        {method: cents / 100 for method, cents in data.manual_mop_values.items()}, data.total_mop_sales / 100,
+        data.df_final, data.total_merch_sale / 100,
+        data.sales_tax / 100, data.tot_taxes / 100, data.incl_taxes / 100,
+        data.merch_gross / 100, data.merch_discounts / 100, data.merch_refunds / 100, 0, data.pay_out / 100,
+        rng=report_rng(data.seed, "main"), summary_rows=data.summary_rows
+    )
+
+
+def accountant_context(data):
+    """Template context of the accountant's report for computed ReportData"""
+    inputs = data.inputs
+    return build_accountant_context(
+        inputs.store_name, data.store_id, inputs.open_period_date, inputs.close_period_date, inputs.fuel_data,
+        inputs.cig_items, inputs.cig_gross, inputs.ecig_gross, data.total_merch_sale / 100,
+        inputs.inventory_regular, inputs.inventory_super, inputs.inventory_diesel
+    )
+
+
+REPORTS = {
+    # kind: (template, context builder, filename prefix)
+    "main": (MAIN_TEMPLATE, main_context, "Main"),
+    "accountant": (ACCOUNTANT_TEMPLATE, accountant_context, "Accountant"),
+}
+
+
+def report_context(data, kind):
+    """(template name, template context) of one report kind ("main" or "accountant")"""
+    template_name, build_context, _ = REPORTS[kind]
+    with span(f"context_{kind}", store=data.inputs.store_name):
+        return template_name, build_context(data)
+
+
+def render_report_html(data, kind):
+    """Render one report kind to HTML"""
+    return render_template(*report_context(data, kind))
+
+
+def render_report_pdf(data, kind, backend, cache=None):
+    """Render one report kind straight to PDF bytes with the given PDF backend (and optional PdfCache)"""
+    with span(f"report_{kind}", store=data.inputs.store_name):
+        template_name, context = report_context(data, kind)
+        return render_pdf(template_name, context, backend, cache)
+
+
+def report_data_filename(data, kind):
+    """Download / output file name of one report kind"""
+    return report_filename(REPORTS[kind][2], data.inputs.store_name, data.inputs.open_period_date)
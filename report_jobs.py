@@ -0,0 +1,98 @@
+"""Background report jobs for the Streamlit page.
+
+Rendering runs on a small thread pool owned by the server process instead of
+the script thread, so the page stays responsive and a widget change (which
+reruns the script) does not cancel a render in flight. The page keeps the
+ReportJob handles in st.session_state and polls them for progress.
+
+Job functions run off the script thread and must not call st.*; they receive
+the ReportJob as their first argument and report progress through
+job.update(done, total, message).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_JOB_WORKERS = 4
+
+
+class ReportJob:
+    """Handle of one submitted job: progress, status and (filename, data, mime) result"""
+
+    def __init__(self, key, label):
+        self.key = key
+        self.label = label
+        self.progress = 0.0
+        self.message = "Queued"
+        self.started_at = time.time()
+        self.finished_at = None
+        self.future = None
+        self._lock = threading.Lock()
+
+    def update(self, done, total, message=""):
+        """Progress callback: `done` of `total` steps finished"""
+        with self._lock:
+            self.progress = min(done / total, 1.0) if total else 0.0
+            self.message = message
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    @property
+    def failed(self):
+        return self.future is not None and self.future.done() and self.future.exception() is not None
+
+    @property
+    def succeeded(self):
+        return self.future is not None and self.future.done() and self.future.exception() is None
+
+    @property
+    def error(self):
+        return self.future.exception() if self.failed else None
+
+    def result(self):
+        """(filename, data, mime) of a finished job"""
+        return self.future.result()
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobRunner:
+    """Thread pool that runs report jobs for every session of the server"""
+
+    def __init__(self, max_workers=None):
+        max_workers = max_workers or int(os.environ.get("SH_REPORTS_JOB_WORKERS", DEFAULT_JOB_WORKERS))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+
+    def submit(self, key, label, fn, *args, **kwargs):
+        """Start fn(job, *args, **kwargs) in the background and return its ReportJob"""
+        job = ReportJob(key, label)
+
+        def run():
+            job.update(0, 1, "Running")
+            try:
+                return fn(job, *args, **kwargs)
+            finally:
+                job.finished_at = time.time()
+
+        job.future = self._executor.submit(run)
+        return job
+
+    def submit_once(self, jobs, slot, key, label, fn, *args, **kwargs):
+        """Submit into jobs[slot] unless the job there already has this key and has not failed
+
+        `jobs` is the per-session dict of handles (st.session_state), so a rerun
+        with the same inputs returns the running or finished job instead of
+        starting a new one.
+        """
+        job = jobs.get(slot)
+        if job is None or job.key != key or job.failed:
+            job = jobs[slot] = self.submit(key, label, fn, *args, **kwargs)
+        return job
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
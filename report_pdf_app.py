@@ -1,129 +1,213 @@
 import streamlit as st
 import pandas as pd
+import hashlib
+import io
 import random
-import pdfkit
-from jinja2 import Environment, FileSystemLoader
+import time
 from datetime import datetime
-import numpy as np
-import os
-
-# PDF config
-pdf_options = {
-    "enable-local-file-access": "",
-    "page-size": "A4",
-    "margin-top": "0.75in",
-    "margin-right": "0.75in",
-    "margin-bottom": "0.75in",
-    "margin-left": "0.75in"
-}
-
-path_wkhtmltopdf = r"C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe"
-config = pdfkit.configuration(wkhtmltopdf=path_wkhtmltopdf)
+from report_engine import (
+    REPORT_KINDS,
+    REPORTS,
+    ReportInputs,
+    consolidated_accountant_filename,
+    department_frame,
+    dollars_frame,
+    estimate_customers,
+    fuel_products,
+    get_default_department_data,
+    load_department_csv,
+    render_consolidated_accountant_pdf,
+    render_pdf,
+    report_data_filename,
+    report_rng,
+)
+from pdf_backends import create_backend
+from pdf_cache import create_cache
+from report_jobs import JobRunner
+import instrumentation
+from period_reports import BUNDLES, FREQUENCIES, period_windows, render_period_reports
+from batch_reports import StoreInputsError, read_store_inputs, row_inputs
+from department_store import open_store
+from fuel_ledger import FuelLedger
+from store_registry import get_registry
+from sales_cube import GRAINS, LEVELS, SalesCube
+from pipeline_graph import report_graph, set_report_inputs
 
 st.set_page_config(layout="wide")
 st.title("📋 S.H Reports")
 
-# ===== EMBEDDED CSV DATA =====
-def get_default_department_data():
-    """Return default department data as a pandas DataFrame"""
-    
-    # Default department data - you can modify this with your actual data
-    default_data = {
-        'Dept#': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 100, 9998, 9999],
-        'Description': ['CIGARETTES', 'Grocery TAX', 'BEER', 'DAIRY', 'SNACKS', 'AUTO', 'CONDOM', 'WATER', 'TOBACCO', 'COFFEE', 'PILLS', 'MEDICINE', 'ENERGY DRINKS', 'GROCERY', 'Bakery', 'CHEW TOBACCO', 'SODA', 'CANDY', 'CHIPS', 'PHONE ACC', 'NEWS PAPER', 'ICE CREAM', 'PHONE CARDS', 'CIGAR', 'ICE', 'DELI', 'MILK SHAKE', 'GLOVES', 'SANTIZER', 'E-Cigarette', 'JUICE', 'HOT FOOD', 'Honey', 'ICED COFFEE', 'MISC', 'MANUAL FUEL DE', 'FUEL DEPOSIT'],
-        'Cust#': [0, 89, 1395, 95, 248, 166, 53, 613, 154, 322, 47, 50, 1026, 48, 127, 720, 628, 842, 341, 67, 150, 96, 26, 134, 120, 90, 90, 42, 25, 0, 213, 44, 62, 127, 218, 5924, 0],
-        'Items': [0, 111, 243, 102, 266, 207, 68, 736, 251, 552, 57, 64, 1328, 88, 177, 927, 746, 1124, 410, 73, 162, 145, 37, 165, 202, 123, 113, 54, 43, 0, 678, 56, 74, 152, 277, 6940, 0],
-        'Gross': [0.0, 524.06, 26646.77, 584.29, 2907.31, 1806.08, 364.58, 2505.56, 657.28, 1131.98, 323.28, 252.4, 2865.07, 330.65, 1780.11, 1842.39, 2788.85, 772.43, 2001.39, 824.25, 513.52, 1365.78, 93.48, 313.32, 311.2, 421.64, 767.49, 328.7, 81.26, 0.0, 1380.08, 84.34, 886.44, 767.49, 1776.51, 0.0, 0.0],
-        'Refunds': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        'Discounts': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-    }
-    
-    # Create DataFrame
-    df = pd.DataFrame(default_data)
-    
-    # Calculate Net Sales
-    df['Net Sales'] = df['Gross'] - df['Refunds'] - df['Discounts']
-    
-    return df
-
-store_dict = {
-    "Shell - Syed Empires": "807606",
-    "Shell - Kausar & Sons": "807619",
-    "Shell - H & K Mart": "801422",
-    "Shell - Hermin Empires": "801927",
-    "Gulf  - 33 Chestnut Gasoline": "802214",
-    "Shell - KSK Auto Group": "808734",
-    "Shell - NSK & Sons": "809715",
-    "BP    - S. Michael & Sons": "807594",
-    "Gulf  - 688 Freedom Plains": "802975",
-    "Gulf  - 100 Route 17": "805873",
-    "Gulf  - Kirmani Fresh Market": "809784",
-    "Gulf  - Norwich Fresh Market": "803616",
-    "Gulf  - 501 Nyack": "807894",
-    "76     - One Stop Auto Repair": "803469",
-    "Gulf  - Route 22 Dover Plains": "809974",
-    "Gulf  - Rockaway Petro Atlantic": "808957",
-    "Shell - 220 Northern Bulvd": "806644",
-    "Gulf  - Sunrise V.S": "807787",
-    "Gulf  - 28 Main Street CT": "808799",
-    "Gulf  - 189 Kings Park": "806999",
-    "Gulf  - 3389 Route 82": "805858",
-    "Gulf  - 600 Tulip Avenue": "804477",
-    "Shell - 590 Fordham Road": "802255",
-    "Gulf  - 200 23rd Street Enterprise": "806696",
-    "Gulf  - 135 Montauk Highway": "805857",
-    "Marathon - 32 Germantown Road": "804472",
-    "Citgo - 1429 Upper Front Street": "806979"
-}
-
-# Tax multipliers by station name
-tax_multiplier_by_station = {
-    # City Stations (8.875%)
-    "Shell - Syed Empires": 1.08875,
-    "Shell - Kausar & Sons": 1.08875,
-    "Shell - H & K Mart": 1.08875,
-    "Shell - Hermin Empires": 1.08875,
-    "BP    - S. Michael & Sons": 1.08875,
-    "Shell - 590 Fordham Road": 1.08875,
-
-    # Long Island Stations (8.625%)
-    "Shell - KSK Auto Group": 1.08625,
-    "Shell - NSK & Sons": 1.08625,
-    "76     - One Stop Auto Repair": 1.08625,
-    "Gulf  - Rockaway Petro Atlantic": 1.08625,
-    "Shell - 220 Northern Bulvd": 1.08625,
-    "Gulf  - Sunrise V.S": 1.08625,
-    "Gulf  - 189 Kings Park": 1.08625,
-    "Gulf  - 135 Montauk Highway": 1.08625,
-
-    # Upstate (8.125%)
-    "Gulf  - 688 Freedom Plains": 1.08125,
-    "Gulf  - 100 Route 17": 1.08125,
-    "Gulf  - Route 22 Dover Plains": 1.08125,
-    "Gulf  - 3389 Route 82": 1.08125,
-    "Gulf  - 600 Tulip Avenue": 1.08125,
-    "Gulf  - 200 23rd Street Enterprise": 1.08125,
-
-    # Nayak (8.375%)
-    "Gulf  - 33 Chestnut Gasoline": 1.08375,
-    "Gulf  - 501 Nyack": 1.08375,
-
-    # Pennsylvania (6.00%)
-    "Gulf  - Kirmani Fresh Market": 1.06,
-
-    # Connecticut (6.35%)
-    "Gulf  - 28 Main Street CT": 1.0635,
-    "Marathon - 32 Germantown Road": 1.0635,
-
-    # Big Hampton (8.00%)
-    "Gulf  - Norwich Fresh Market": 1.08,
-    "Citgo - 1429 Upper Front Street": 1.08
-}
-
-store_names = list(store_dict.keys())
+
+@st.cache_resource
+def get_pdf_backend():
+    """One PDF backend per server process, so its wkhtmltopdf workers stay warm across reruns"""
+    return create_backend()
+
+
+@st.cache_resource
+def get_pdf_cache():
+    """Rendered PDFs keyed on template + context, shared by every session of this server"""
+    return create_cache()
+
+
+@st.cache_resource
+def get_department_store():
+    """Saved department data (Parquet, partitioned by store and period)"""
+    return open_store()
+
+
+@st.cache_resource
+def get_sales_cube():
+    """Store x date x department rollups shared by every session of this server"""
+    return SalesCube.load()
+
+
+@st.cache_resource
+def get_job_runner():
+    """Background render threads shared by every session of this server"""
+    return JobRunner()
+
+
+# ===== BACKGROUND JOBS =====
+# Job functions run on the JobRunner threads: no st.* calls in here
+def report_pdf_job(job, filename, template_name, context, backend, cache):
+    job.update(1, 2, "Rendering PDF")
+    pdf_bytes = render_pdf(template_name, context, backend, cache)
+    return filename, pdf_bytes, "application/pdf"
+
+
+def period_reports_job(job, inputs, frequency, backend, kinds, bundle, departments):
+    bundle_name, bundle_bytes = render_period_reports(
+        inputs, frequency, backend, kinds, bundle, departments=departments, progress=job.update
+    )
+    return bundle_name, bundle_bytes, "application/zip" if bundle == "zip" else "application/pdf"
+
+
+def consolidated_accountant_job(job, inputs_list, backend, cache, departments):
+    job.update(1, 2, f"Rendering {len(inputs_list)} stations")
+    pdf_bytes = render_consolidated_accountant_pdf(inputs_list, backend, departments, cache)
+    return consolidated_accountant_filename(inputs_list), pdf_bytes, "application/pdf"
+
+
+report_jobs = st.session_state.setdefault("report_jobs", {})
+
+
+def job_panel(slot, polling):
+    job = report_jobs.get(slot)
+    if job is None:
+        return
+    if job.running:
+        st.progress(job.progress, text=f"⏳ {job.label}: {job.message}")
+    elif job.failed:
+        st.error(f"❌ {job.label} failed: {job.error}")
+    else:
+        filename, data, mime = job.result()
+        st.success(f"✅ {job.label} created successfully! ({job.elapsed:.1f}s)")
+        st.download_button(f"⬇️ Download {job.label}", data, file_name=filename, mime=mime, key=f"download_{slot}")
+    if polling and not job.running:
+        # Finished while polling: one full rerun shows the result and stops the timer
+        st.rerun()
+
+
+def show_job_panel(slot):
+    """Progress / download panel for one job slot, refreshed every second while the job runs"""
+    job = report_jobs.get(slot)
+    polling = job is not None and job.running
+    st.fragment(job_panel, run_every=1.0 if polling else None)(slot, polling)
+
+
+# ===== CACHED DATA STAGES =====
+# Streamlit reruns the whole script on every widget change; these keep the CSV
+# parse across reruns and the session's report graph recomputes only the stages
+# an edit affects. max_entries bounds each cache (least recently used entries
+# are evicted first).
+CACHE_ENTRIES = 32
+
+# One seed per browser session keeps the random figures stable while inputs are edited
+if "report_seed" not in st.session_state:
+    st.session_state.report_seed = random.SystemRandom().getrandbits(32)
+report_seed = st.session_state.report_seed
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def load_default_departments():
+    return get_default_department_data()
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Reading department CSV...")
+def load_uploaded_departments(file_hash, stream_csv, _file_bytes):
+    """Parse an uploaded CSV once per (content hash, mode); the raw bytes are not hashed again"""
+    source = io.BytesIO(_file_bytes)
+    if stream_csv:
+        return load_department_csv(source)
+    with instrumentation.span("csv_load"):
+        return department_frame(pd.read_csv(source))
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def load_saved_departments(store_id, period, version):
+    """Read one saved period; `version` (the file mtime) invalidates the entry when the period is overwritten"""
+    return get_department_store().load(store_id, period)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Reading fuel exports...")
+def load_fuel_ledger(pump_hashes, tank_hashes, _pump_bytes, _tank_bytes):
+    """Roll uploaded pump / tank exports up once per set of file contents"""
+    return FuelLedger.from_exports([io.BytesIO(data) for data in _pump_bytes], [io.BytesIO(data) for data in _tank_bytes])
+
+
+# Per-session stage outputs of the last computed report (see pipeline_graph.py)
+if "report_graph" not in st.session_state:
+    st.session_state.report_graph = report_graph()
+pipeline = st.session_state.report_graph
+pipeline.reset_recomputed()
+
+
+# ===== PERFORMANCE PANEL =====
+with st.sidebar:
+    if st.checkbox("⏱️ Show performance metrics", key="show_metrics"):
+        trace_memory = st.checkbox(
+            "Trace memory (tracemalloc)",
+            value=instrumentation.memory_tracing(),
+            help="Records each stage's peak memory; slows the pipeline down while on"
+        )
+        if trace_memory:
+            instrumentation.enable_memory_tracing()
+        else:
+            instrumentation.disable_memory_tracing()
+
+        recent = instrumentation.recent_spans(40)
+        if recent:
+            st.caption("Recent stages (newest last)")
+            recent_df = pd.DataFrame(recent)
+            recent_df["ms"] = (recent_df["seconds"] * 1000).round(1)
+            recent_df["peak MB"] = (recent_df["peak_bytes"].astype(float) / 1024 / 1024).round(2)
+            columns = [column for column in ["stage", "store", "ms", "peak MB"] if column in recent_df.columns]
+            st.dataframe(recent_df[columns], hide_index=True, width="stretch")
+
+            st.caption("Totals since start-up")
+            totals_df = pd.DataFrame(instrumentation.stage_totals())
+            totals_df = totals_df.groupby("stage", as_index=False)[["calls", "seconds", "max_seconds", "peak_bytes"]].agg(
+                {"calls": "sum", "seconds": "sum", "max_seconds": "max", "peak_bytes": "max"}
+            ).sort_values("seconds", ascending=False)
+            st.dataframe(totals_df, hide_index=True, width="stretch")
+        else:
+            st.caption("No stages recorded yet")
+
+# Loaded once per process and again only when data/stores.csv or the tax table changes
+registry = get_registry()
 col1, col2 = st.columns(2)
-store_name = col1.selectbox("Store Name", options=store_names)
-store_id = store_dict[store_name]
+store_search = col1.text_input("Find Store", key="store_search", placeholder="Name, location or ID prefix")
+matches = registry.search(store_search)
+if not matches:
+    col2.warning(f"⚠️ No store matches \"{store_search}\"")
+    matches = registry.stores
+store_id = col1.selectbox(
+    "Store Name",
+    options=[store.location_id for store in matches],
+    format_func=lambda location_id: registry.get(location_id).name,
+    key="store_id"
+)
+store_name = registry.get(store_id).name
 col2.text_input("Location ID", value=store_id, disabled=True)
 
 open_period_date = col1.date_input("Opening Period Date", value=datetime.today())
@@ -136,20 +220,34 @@ st.subheader("📁 Department Data")
 # Option to use default data or upload custom file
 data_source = st.radio(
     "Choose data source:",
-    ["Use Default Data", "Upload Custom CSV"],
-    help="You can use the built-in default data or upload your own CSV file"
+    ["Use Default Data", "Upload Custom CSV", "Saved Department Data"],
+    help="You can use the built-in default data, upload your own CSV file or load data saved for this store"
 )
 
 df = None
+source_key = None
 if data_source == "Use Default Data":
-    df = get_default_department_data()
+    df = load_default_departments()
+    source_key = "default"
     st.success("✅ Default department data loaded successfully!")
     
     # Show data preview
     with st.expander("👀 Preview Default Data"):
-        st.dataframe(df.head(10), use_container_width=True)
+        st.dataframe(dollars_frame(df.head(10)), width="stretch")
         st.info(f"📊 Loaded {len(df)} departments")
 
+elif data_source == "Saved Department Data":
+    department_store = get_department_store()
+    saved_period = department_store.period_for(store_id, open_period_date)
+    if saved_period is None:
+        st.warning(f"⚠️ No department data saved for {store_name} on or before {open_period_date}. "
+                   "Upload a CSV and save it to use this option.")
+    else:
+        version = department_store.version(store_id, saved_period)
+        df = load_saved_departments(store_id, saved_period, version)
+        source_key = f"saved:{store_id}:{saved_period}:{version}"
+        st.success(f"✅ Loaded department data saved for the period starting {saved_period}")
+
 else:  # Upload Custom CSV
     uploaded_file = st.file_uploader(
         "Upload Department CSV File",
@@ -157,56 +255,111 @@ else:  # Upload Custom CSV
         help="Upload your department sales data in CSV format"
     )
     
+    stream_csv = st.checkbox(
+        "Large item-level export (stream in chunks)",
+        help="Reads the file in chunks with compact dtypes and rolls it up to one row per department"
+    )
+
     if uploaded_file:
-        df = pd.read_csv(uploaded_file)
+        file_bytes = uploaded_file.getvalue()
+        file_hash = hashlib.sha256(file_bytes).hexdigest()
+        df = load_uploaded_departments(file_hash, stream_csv, file_bytes)
+        source_key = f"{file_hash}:{stream_csv}"
         st.success(f"✅ File uploaded successfully: {uploaded_file.name}")
 
-st.subheader("CIGARETTES")
-c1, c2 = st.columns(2)  # Changed from 3 to 2 columns
+        department_store = get_department_store()
+        saved = open_period_date in department_store.periods(store_id)
+        overwrite = st.checkbox("Replace the saved data for this period", key="overwrite_saved") if saved else False
+        if st.button(f"💾 Save for {store_name}, period starting {open_period_date}", disabled=saved and not overwrite):
+            department_store.append(store_id, open_period_date, df, overwrite=overwrite)
+            st.success("✅ Saved. Choose \"Saved Department Data\" to load it in later sessions.")
+
+# Input sections are forms: edits inside one are applied together on its submit
+# button instead of rerunning the page on every keystroke
+sales_form = st.form("sales_form", border=False)
+sales_form.subheader("CIGARETTES")
+c1, c2 = sales_form.columns(2)  # Changed from 3 to 2 columns
 cig_items = c1.number_input("Number of Packets Sold", value=0, key="cig_items")
 cig_gross = c2.number_input("Cigarette Gross", value=0.0)
 
 # Auto-calculate number of customers (80-90% of packets sold)
+cig_cust = estimate_customers(cig_items, report_rng(report_seed, "cig"))
 if cig_items > 0:
-    cig_cust = int(cig_items * random.uniform(0.80, 0.90))
-    st.info(f"📊 Calculated Number of Customers: {cig_cust}")
-else:
-    cig_cust = 0
+    sales_form.info(f"📊 Calculated Number of Customers: {cig_cust}")
 
-st.subheader("Electronic-CIGARETTES")
-e1, e2 = st.columns(2)  # Changed from 3 to 2 columns
+sales_form.subheader("Electronic-CIGARETTES")
+e1, e2 = sales_form.columns(2)  # Changed from 3 to 2 columns
 ecig_items = e1.number_input("Number of Packets Sold", value=0, key="ecig_items")
 ecig_gross = e2.number_input("E-Cigarette Gross", value=0.0)
 
 # Auto-calculate number of customers (80-90% of packets sold)
+ecig_cust = estimate_customers(ecig_items, report_rng(report_seed, "ecig"))
 if ecig_items > 0:
-    ecig_cust = int(ecig_items * random.uniform(0.80, 0.90))
-    st.info(f"📊 Calculated Number of Customers: {ecig_cust}")
-else:
-    ecig_cust = 0
+    sales_form.info(f"📊 Calculated Number of Customers: {ecig_cust}")
 
-desired_merch_sale = st.number_input("Desired Total Merch Sale (excluding Cigarettes, E-Cigarettes & Fuel)", min_value=0.0, value=0.0, step=100.0)
+desired_merch_sale = sales_form.number_input("Desired Total Merch Sale (excluding Cigarettes, E-Cigarettes & Fuel)", min_value=0.0, value=0.0, step=100.0)
+sales_form.form_submit_button("Apply Sales")
 
 st.markdown("---")
-st.subheader("Fuel Product Report")
-fuel_data = {}
-fuel_products = ["REG", "PLUS", "SUPER", "DIESEL"]
+fuel_source = st.radio(
+    "Fuel figures:",
+    ["Enter Manually", "Pump & Tank Exports"],
+    horizontal=True,
+    key="fuel_source",
+    help="Type the totals per grade, or upload the site's pump and tank export files"
+)
 
-for product in fuel_products:
-    col1, col2 = st.columns(2)
-    vol = col1.number_input(f"{product} Volume", min_value=0, value=0)
-    amt = col2.number_input(f"{product} Amount", min_value=0.0, value=0.0)
-    fuel_data[product] = {"volume": vol, "amount": amt}
+ledger_inputs = None
+tank_files = []
+if fuel_source == "Pump & Tank Exports":
+    st.subheader("Fuel Product Report")
+    pump_files = st.file_uploader("Pump Export CSVs", type=["csv"], accept_multiple_files=True, key="pump_files")
+    tank_files = st.file_uploader("Tank Reading Export CSVs", type=["csv"], accept_multiple_files=True, key="tank_files")
+    if pump_files or tank_files:
+        pump_bytes = [uploaded.getvalue() for uploaded in pump_files]
+        tank_bytes = [uploaded.getvalue() for uploaded in tank_files]
+        try:
+            ledger = load_fuel_ledger(
+                tuple(hashlib.sha256(data).hexdigest() for data in pump_bytes),
+                tuple(hashlib.sha256(data).hexdigest() for data in tank_bytes),
+                pump_bytes, tank_bytes
+            )
+        except ValueError as exc:
+            st.error(f"❌ {exc}")
+        else:
+            ledger_inputs = ledger.apply([ReportInputs(store_name, open_period_date, close_period_date)])[0]
+            if store_id not in ledger.stores():
+                st.warning(f"⚠️ The exports have no rows for {store_name} (Location ID {store_id})")
+            st.dataframe(
+                pd.DataFrame(
+                    [(product, row["volume"], row["amount"]) for product, row in ledger_inputs.fuel_data.items()],
+                    columns=["Product", "Volume", "Amount"]
+                ),
+                hide_index=True
+            )
+
+if ledger_inputs is not None:
+    fuel_data = ledger_inputs.fuel_data
+else:
+    fuel_form = st.form("fuel_form", border=False)
+    fuel_form.subheader("Fuel Product Report")
+    fuel_data = {}
+
+    for product in fuel_products:
+        col1, col2 = fuel_form.columns(2)
+        vol = col1.number_input(f"{product} Volume", min_value=0, value=0)
+        amt = col2.number_input(f"{product} Amount", min_value=0.0, value=0.0)
+        fuel_data[product] = {"volume": vol, "amount": amt}
+    fuel_form.form_submit_button("Apply Fuel")
 
-fuel_total_volume = sum(row["volume"] for row in fuel_data.values())
-fuel_total_amount = sum(row["amount"] for row in fuel_data.values())
 
 # NEW SECTION: Manual MOP Entry
 st.markdown("---")
-st.subheader("💳 Method of Payment (MOP) Entry")
-st.write("Enter the Credit, Debit, and Mobile payment amounts. Cash will be calculated automatically after deducting Pay Out.")
+mop_form = st.form("mop_form", border=False)
+mop_form.subheader("💳 Method of Payment (MOP) Entry")
+mop_form.write("Enter the Credit, Debit, and Mobile payment amounts. Cash will be calculated automatically after deducting Pay Out.")
 
-mop_col1, mop_col2, mop_col3 = st.columns(3)
+mop_col1, mop_col2, mop_col3 = mop_form.columns(3)
 
 with mop_col1:
     manual_credit = st.number_input(
@@ -238,134 +391,85 @@ with mop_col3:
         help="Enter the total mobile payment sales amount"
     )
 
+mop_form.form_submit_button("Apply MOP")
+
 # Calculate total manual entries
 manual_total = manual_credit + manual_debit + manual_mobile
 
 # NEW SECTION: Ending Inventory of Fuel
 st.markdown("---")
-st.subheader("Ending Inventory of Fuel")
-st.write("Enter the ending inventory values for the accountant's report:")
-
-inv1, inv2, inv3 = st.columns(3)
-with inv1:
-    inventory_regular = st.number_input(
-        "Regular Inventory", 
-        min_value=0, 
-        value=0, 
-        step=1,
-        key="regular_inventory",
-        help="Enter the regular fuel inventory amount"
-    )
-with inv2:
-    inventory_super = st.number_input(
-        "Super Inventory", 
-        min_value=0, 
-        value=0, 
-        step=1,
-        key="super_inventory",
-        help="Enter the super fuel inventory amount"
-    )
-with inv3:
-    inventory_diesel = st.number_input(
-        "Diesel Inventory", 
-        min_value=0, 
-        value=0, 
-        step=1,
-        key="diesel_inventory",
-        help="Enter the diesel fuel inventory amount"
-    )
-
-excluded_keywords = ["FUEL", "FUEL DEPOSIT", "MANUAL FUEL"]
-cig_keyword = "CIGARETTES"
-ecig_keyword = "E-CIGARETTE"
+if ledger_inputs is not None and tank_files:
+    st.subheader("Ending Inventory of Fuel")
+    st.write("Last tank readings on or before the close period date:")
+    inventory_regular = ledger_inputs.inventory_regular
+    inventory_super = ledger_inputs.inventory_super
+    inventory_diesel = ledger_inputs.inventory_diesel
+    inv1, inv2, inv3 = st.columns(3)
+    inv1.metric("Regular Inventory", f"{inventory_regular:,}")
+    inv2.metric("Super Inventory", f"{inventory_super:,}")
+    inv3.metric("Diesel Inventory", f"{inventory_diesel:,}")
+else:
+    inventory_form = st.form("inventory_form", border=False)
+    inventory_form.subheader("Ending Inventory of Fuel")
+    inventory_form.write("Enter the ending inventory values for the accountant's report:")
+
+    inv1, inv2, inv3 = inventory_form.columns(3)
+    with inv1:
+        inventory_regular = st.number_input(
+            "Regular Inventory", 
+            min_value=0, 
+            value=0, 
+            step=1,
+            key="regular_inventory",
+            help="Enter the regular fuel inventory amount"
+        )
+    with inv2:
+        inventory_super = st.number_input(
+            "Super Inventory", 
+            min_value=0, 
+            value=0, 
+            step=1,
+            key="super_inventory",
+            help="Enter the super fuel inventory amount"
+        )
+    with inv3:
+        inventory_diesel = st.number_input(
+            "Diesel Inventory", 
+            min_value=0, 
+            value=0, 
+            step=1,
+            key="diesel_inventory",
+            help="Enter the diesel fuel inventory amount"
+        )
+    inventory_form.form_submit_button("Apply Inventory")
+
+inputs = ReportInputs(
+    store_name=store_name,
+    open_period_date=open_period_date,
+    close_period_date=close_period_date,
+    fuel_data=fuel_data,
+    cig_items=cig_items, cig_gross=cig_gross,
+    ecig_items=ecig_items, ecig_gross=ecig_gross,
+    desired_merch_sale=desired_merch_sale,
+    manual_credit=manual_credit, manual_debit=manual_debit, manual_mobile=manual_mobile,
+    inventory_regular=inventory_regular, inventory_super=inventory_super, inventory_diesel=inventory_diesel,
+    seed=report_seed,
+)
 
 # Process data if available (either default or uploaded)
 if df is not None:
-    cig_mask = df["Description"].str.upper().str.contains(cig_keyword, na=False)
-    ecig_mask = df["Description"].str.upper().str.contains(ecig_keyword, na=False)
-    fuel_mask = df["Description"].str.upper().apply(lambda x: any(k in x for k in excluded_keywords))
-    non_fuel_mask = ~fuel_mask
-
-    cig_only_mask = cig_mask & non_fuel_mask
-    ecig_only_mask = ecig_mask & non_fuel_mask
-    scalable_mask = ~fuel_mask & ~cig_mask & ~ecig_mask
-
-    df.loc[cig_only_mask, "Cust#"] = cig_cust
-    df.loc[cig_only_mask, "Items"] = cig_items
-    df.loc[cig_only_mask, "Gross"] = cig_gross
-
-    df.loc[ecig_only_mask, "Cust#"] = ecig_cust
-    df.loc[ecig_only_mask, "Items"] = ecig_items
-    df.loc[ecig_only_mask, "Gross"] = ecig_gross
-
-    df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
-    cig_ecig_net_sales = df.loc[cig_only_mask | ecig_only_mask, "Net Sales"].sum()
-    original_net_sales_scalable = df.loc[scalable_mask, "Net Sales"].copy()
-
-    if desired_merch_sale > 0:
-        target_net_sales_scalable = desired_merch_sale - cig_ecig_net_sales
-        original_net_sum = original_net_sales_scalable.sum()
-        if original_net_sum > 0 and target_net_sales_scalable > 0:
-            scale_factor = target_net_sales_scalable / original_net_sum
-            df.loc[scalable_mask, "Gross"] = (
-                (df.loc[scalable_mask, "Gross"] - df.loc[scalable_mask, "Refunds"] - df.loc[scalable_mask, "Discounts"])
-                * scale_factor
-                + df.loc[scalable_mask, "Refunds"]
-                + df.loc[scalable_mask, "Discounts"]
-            ).round(2)
-
-    # Remaining pipeline logic continues here (manual fuel rows, random cust/items, PDF rendering, etc.)
-    manual_fuel_mask = df["Description"].str.upper().str.contains("MANUAL FUEL DE", na=False)
-    df.loc[manual_fuel_mask, "Gross"] = fuel_total_amount
-    df.loc[manual_fuel_mask, "Net Sales"] = fuel_total_amount
-    df.loc[manual_fuel_mask, "Refunds"] = 0
-    df.loc[manual_fuel_mask, "Discounts"] = 0
-
-    df["Net Sales"] = df["Gross"] - df["Refunds"] - df["Discounts"]
-    merch_mask = ~fuel_mask
-    total_merch_gross = df.loc[merch_mask, "Gross"].sum()
-    df["% of Sales"] = 0.0
-    df.loc[merch_mask, "% of Sales"] = round((df.loc[merch_mask, "Gross"] / total_merch_gross) * 100, 2)
-
-    df.loc[scalable_mask, "Cust#"] += np.random.randint(11, 31, size=scalable_mask.sum())
-    df.loc[scalable_mask, "Items"] += np.random.randint(11, 31, size=scalable_mask.sum())
-
-    total_merch_sale = df.loc[merch_mask, "Net Sales"].sum()
-    multiplier = tax_multiplier_by_station.get(store_name, 1.08265)  # fallback multiplier
-    tax_rate = round((multiplier - 1) * 100, 3)  # Convert multiplier to percent rate
-    sales_tax = round(total_merch_sale * (tax_rate / 100), 2)
-
-    tot_taxes = sales_tax
-    incl_taxes = round(total_merch_sale + sales_tax, 2)
-
-    summary_row = pd.DataFrame({
-        "Dept#": [""],
-        "Description": ["Total Merch Sale"],
-        "Cust#": [""],
-        "Items": [""],
-        "% of Sales": [""],
-        "Gross": [""],
-        "Refunds": [""],
-        "Discounts": [""],
-        "Net Sales": [round(total_merch_sale, 2)]
-    })
-
-    df_final = pd.concat([df, summary_row], ignore_index=True)
-    st.dataframe(df_final)
-
-    # Calculate total MOP sales
-    total_mop_sales = total_merch_sale + fuel_total_amount + tot_taxes
-
-    # Generate Pay Out value (reduced range from 3000-9000)
-    pay_out = round(random.uniform(3000, 9000), 2)
-
-    # NEW: Calculate Cash after deducting Pay Out
-    manual_mop_values = {
-        "credit": manual_credit,
-        "debit": manual_debit,
-        "mobile": manual_mobile,
-        "cash": max(0, total_mop_sales - manual_total - pay_out)  # Subtract pay_out from available cash
-    }
+    set_report_inputs(pipeline, inputs, df, source_key)
+    report = pipeline.get("report")
+    st.dataframe(dollars_frame(report.df_final), hide_index=True)
+    st.dataframe(
+        pd.DataFrame([(description, net / 100) for description, net in report.summary_rows], columns=["Description", "Net Sales"]),
+        hide_index=True
+    )
+
+    # The report keeps money in cents; the page shows dollars
+    total_mop_sales = report.total_mop_sales / 100
+    pay_out = report.pay_out / 100
+    manual_mop_values = {method: cents / 100 for method, cents in report.manual_mop_values.items()}
 
     # Show MOP calculations
     st.markdown("---")
@@ -415,7 +519,7 @@ if df is not None:
             'Note': ['Manual Entry', 'Manual Entry', 'Manual Entry', 
                     'Auto-calculated', 'Deducted from Cash', 'Fuel + Merch Sales']
         })
-        st.dataframe(mop_breakdown, use_container_width=True)
+        st.dataframe(mop_breakdown, width="stretch")
         
         # Show verification
         st.write("**Verification:**")
@@ -427,217 +531,114 @@ if df is not None:
         else:
             st.error(f"❌ Difference: ${abs(verification_total - total_mop_sales):,.2f}")
 
-    # MAIN REPORT FUNCTION (Updated to use pay_out parameter)
-    def build_main_report(manual_mop_vals, total_mop_sales_val, df_final_param, merch_mask_param, total_merch_sale_param, sales_tax_param, tot_taxes_param, incl_taxes_param, total_merch_gross_param, total_discounts_param, total_refunds_param, total_percent_param, pay_out_val):
-        
-        env = Environment(loader=FileSystemLoader("."))
-        report_template = env.get_template("realistic_report_template.html")
-
-        # Generate other Payment Out values (keep existing logic for other items)
-        safe_drops = round(random.uniform(30000, 49000), 2)
-        total_payment_out = round(pay_out_val + safe_drops, 2)  # Use the passed pay_out_val
-
-        # Generate random MOP Cancel/Refund values
-        mop_cancel_refund = round(random.uniform(89, 199), 2)
-        other_refund = round(random.uniform(12, 99), 2)
-        total_to_account_for = round(mop_cancel_refund + other_refund, 2)
-        
-        credit_percentage = random.uniform(0.2, 0.8)
-        credit_card_based = round(total_to_account_for * credit_percentage, 2)
-        cash_based = round(total_to_account_for - credit_card_based, 2)
-
-        # Generate random values for Memo Items
-        def safe_sum_numeric(series):
-            try:
-                numeric_series = pd.to_numeric(series, errors='coerce')
-                return int(numeric_series.sum()) if not numeric_series.isna().all() else 0
-            except:
-                return 0
-
-        memo_data = {
-            "items_count": safe_sum_numeric(df_final_param.loc[df_final_param['Description'].str.upper().str.contains('ITEM', na=False), 'Items']) if 'Items' in df_final_param.columns else 0,
-            "customer_count": safe_sum_numeric(df_final_param.loc[df_final_param['Description'].str.upper().str.contains('CUST', na=False), 'Cust#']) if 'Cust#' in df_final_param.columns else 0,
-            "total_items": safe_sum_numeric(df_final_param['Items']) if 'Items' in df_final_param.columns else 0,
-            "total_customers": safe_sum_numeric(df_final_param['Cust#']) if 'Cust#' in df_final_param.columns else 0,
-            "void_lines_count": np.random.randint(50, 251),
-            "void_lines_amount": round(np.random.uniform(2000, 5000), 2),
-            "void_tickets_count": np.random.randint(15, 96),
-            "void_tickets_amount": round(np.random.uniform(500, 2000), 2),
-            "positive_count": np.random.randint(10, 61),
-            "positive_amount": round(np.random.uniform(300, 900), 2),
-            "negative_count": np.random.randint(10, 61),
-            "negative_amount": round(np.random.uniform(300, 900), 2),
-            "suspended_count": np.random.randint(3, 100),
-            "suspended_amount": round(np.random.uniform(119, 799), 2),
-            "suspend_void_count": np.random.randint(1, 30),
-            "suspend_void_amount": round(np.random.uniform(11, 199), 2)
-        }
-
-        def generate_random_time():
-            hour = random.randint(22, 23)
-            if hour == 22:
-                minute = random.randint(1, 59)
-            else:
-                minute = random.randint(0, 49)
-            return f"{hour:02d}:{minute:02d}"
-        
-        open_time = generate_random_time()
-        close_time = generate_random_time()
-
-        table_html = ""
-        for _, row in df_final_param.iterrows():
-            table_html += f"""
-            <tr class="dept-table">
-                <td>{row['Dept#'] if pd.notna(row['Dept#']) else ''}</td>
-                <td>{row['Description']}</td>
-                <td class="right">{int(row['Cust#']) if pd.notna(row['Cust#']) and str(row['Cust#']).isdigit() else ''}</td>
-                <td class="right">{int(row['Items']) if pd.notna(row['Items']) and str(row['Items']).isdigit() else ''}</td>
-                <td class="right">{row['% of Sales'] if pd.notna(row['% of Sales']) else ''}</td>
-                <td class="right">{row['Gross'] if pd.notna(row['Gross']) else ''}</td>
-                <td class="right">{row['Refunds'] if pd.notna(row['Refunds']) else ''}</td>
-                <td class="right">{row['Discounts'] if pd.notna(row['Discounts']) else ''}</td>
-                <td class="right">{row['Net Sales'] if pd.notna(row['Net Sales']) else ''}</td>
-            </tr>
-            """
-
-        context = {
-            "store_number": store_name,
-            "store_id": store_id,
-            "period": f"{open_period_date.strftime('%Y-%m-%d')} {open_time}",
-            "close_period": f"{close_period_date.strftime('%Y-%m-%d')} {close_time}",
-            "table_rows": table_html,
-            "total_gross": f"{total_merch_gross_param:,.2f}",
-            "total_net_sales": f"{total_merch_sale_param:,.2f}",
-            "total_discounts": f"{total_discounts_param:,.2f}",
-            "total_refunds": f"{total_refunds_param:,.2f}",
-            "total_percent": f"{total_percent_param:.2f}",
-            "fuel_data": fuel_data,
-            "fuel_total_volume": fuel_total_volume,
-            "fuel_total_amount": fuel_total_amount,
-            "total_mop_sales": f"{total_mop_sales_val:,.2f}",
-            "fuel_sales": f"{fuel_total_amount:,.2f}",
-            "merch_sales": f"{total_merch_sale_param:,.2f}",
-            "sales_taxes": f"{sales_tax_param:,.2f}",
-            "tot_taxes": f"{tot_taxes_param:,.2f}",
-            "incl_taxes": f"{incl_taxes_param:,.2f}",
-            "pay_out": f"{pay_out_val:,.2f}",  # Use the passed value
-            "safe_drops": f"{safe_drops:,.2f}",
-            "total_payment_out": f"{total_payment_out:,.2f}",
-            "mop_cancel_refund": f"{mop_cancel_refund:.2f}",
-            "other_refund": f"{other_refund:.2f}",
-            "total_to_account_for": f"{total_to_account_for:.2f}",
-            "credit_card_based": f"{credit_card_based:.2f}",
-            "cash_based": f"{cash_based:.2f}",
-            "mop_credit": f"{manual_mop_vals['credit']:,.2f}",
-            "mop_debit": f"{manual_mop_vals['debit']:,.2f}",
-            "mop_mobile": f"{manual_mop_vals['mobile']:,.2f}",
-            "mop_cash": f"{manual_mop_vals['cash']:,.2f}",
-            **memo_data
-        }
-
-        with open("rendered_main_report.html", "w", encoding="utf-8") as f:
-            f.write(report_template.render(context))
-
-        output_path = f"Main_{store_name.replace(' ', '_').replace('-', '_')}_{open_period_date.strftime('%Y_%m_%d')}.pdf"
-        pdfkit.from_file("rendered_main_report.html", output_path, options=pdf_options, configuration=config)
-        return output_path
-
-    # ACCOUNTANT REPORT FUNCTION (New accountant report) - UPDATED VERSION
-    def build_accountant_report():
-        env = Environment(loader=FileSystemLoader("."))
-        accountant_template = env.get_template("Accountant_report.html")
-
-        # Calculate other sales (excluding cigarettes and e-cigarettes)
-        other_sales = total_merch_sale - cig_gross - ecig_gross
-
-        context = {
-            "period_month": f"{open_period_date.strftime('%B %Y')}",
-            "station_name": store_name,
-            "station_id": store_id,
-            "station_full_name": f"{store_name}, {store_id}",
-            "report_period": f"{open_period_date.strftime('%Y-%m-%d')} to {close_period_date.strftime('%Y-%m-%d')}",
-            
-            # Fuel data
-            "fuel_regular_gal": fuel_data["REG"]["volume"],
-            "fuel_regular_amount": f"{fuel_data['REG']['amount']:,.2f}",
-            "fuel_plus_gal": fuel_data["PLUS"]["volume"],
-            "fuel_plus_amount": f"{fuel_data['PLUS']['amount']:,.2f}",
-            "fuel_super_gal": fuel_data["SUPER"]["volume"],
-            "fuel_super_amount": f"{fuel_data['SUPER']['amount']:,.2f}",
-            "fuel_diesel_gal": fuel_data["DIESEL"]["volume"],
-            "fuel_diesel_amount": f"{fuel_data['DIESEL']['amount']:,.2f}",
-            
-            # Store sales data
-            "cig_packets": cig_items,
-            "cig_sales": f"{cig_gross:,.2f}",
-            "ecig_sales": f"{ecig_gross:,.2f}",
-            "other_sales": f"{other_sales:,.2f}",
-            "total_store_sales": f"{total_merch_sale:,.2f}",
-            
-            # Summary data
-            "total_fuel_sales": f"{fuel_total_amount:,.2f}",
-            "total_merch_sales": f"{total_merch_sale:,.2f}",
-            "total_gallons": fuel_total_volume,
-            
-            # NEW: Ending inventory data with manual inputs and close date
-            "inventory_date": close_period_date.strftime('%m/%d/%Y'),
-            "inventory_regular": f"{inventory_regular:,}",
-            "inventory_super": f"{inventory_super:,}",
-            "inventory_diesel": f"{inventory_diesel:,}"
-        }
-
-        with open("rendered_accountant_report.html", "w", encoding="utf-8") as f:
-            f.write(accountant_template.render(context))
-
-        output_path = f"Accountant_{store_name.replace(' ', '_').replace('-', '_')}_{open_period_date.strftime('%Y_%m_%d')}.pdf"
-        pdfkit.from_file("rendered_accountant_report.html", output_path, options=pdf_options, configuration=config)
-        return output_path
-
     # UPDATED BUTTONS SECTION - FIXED VERSION
+    # Buttons submit background jobs; the panels below them poll for progress
+    # and offer the download, so reruns neither block on nor restart a render.
     st.markdown("---")
     st.subheader("📄 Generate Reports")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("📊 Generate Main Report", use_container_width=True):
-            # Calculate the CORRECT totals - FIXED TO EXCLUDE FUEL
-            # Create a new merch_mask for df_final (which includes the summary row)
-            df_final_fuel_mask = df_final["Description"].str.upper().apply(lambda x: any(k in str(x) for k in excluded_keywords) if pd.notna(x) else False)
-            df_final_merch_mask = ~df_final_fuel_mask
-            
-            # Filter out the summary row and empty descriptions for clean calculations
-            clean_mask = df_final_merch_mask & df_final["Description"].notna() & (df_final["Description"] != "Total Merch Sale")
-            
-            total_gross_merch_only = pd.to_numeric(df_final.loc[clean_mask, 'Gross'], errors='coerce').sum()
-            total_net_sales_merch_only = pd.to_numeric(df_final.loc[clean_mask, 'Net Sales'], errors='coerce').sum()
-            total_discounts_merch_only = pd.to_numeric(df_final.loc[clean_mask, 'Discounts'], errors='coerce').sum()
-            total_refunds_merch_only = pd.to_numeric(df_final.loc[clean_mask, 'Refunds'], errors='coerce').sum()
-            
-            path = build_main_report(
-                manual_mop_values, 
-                total_mop_sales, 
-                df_final, 
-                merch_mask, 
-                total_merch_sale,  # This is already merchandise only
-                sales_tax, 
-                tot_taxes, 
-                incl_taxes, 
-                total_gross_merch_only,  # NOW CONSISTENT - merchandise only
-                total_discounts_merch_only,  # merchandise only
-                total_refunds_merch_only,  # merchandise only
-                0,
-                pay_out  # Pass the pay_out value
+        if st.button("📊 Generate Main Report", width="stretch"):
+            get_job_runner().submit_once(
+                report_jobs, "main", ("main", source_key, repr(inputs)), "Main Report",
+                report_pdf_job, report_data_filename(report, "main"), REPORTS["main"][0],
+                pipeline.get("main_context"), get_pdf_backend(), get_pdf_cache()
             )
-            st.success("✅ Main Report created successfully!")
-            with open(path, "rb") as f:
-                download_filename = f"Main_{store_name.replace(' ', '_').replace('-', '_')}_{open_period_date.strftime('%Y_%m_%d')}.pdf"
-                st.download_button("⬇️ Download Main Report", f, file_name=download_filename, mime="application/pdf")
+        show_job_panel("main")
 
     with col2:
-        if st.button("📋 Generate Accountant's Report", use_container_width=True):
-            path = build_accountant_report()
-            st.success("✅ Accountant's Report created successfully!")
-            with open(path, "rb") as f:
-                download_filename = f"Accountant_{store_name.replace(' ', '_').replace('-', '_')}_{open_period_date.strftime('%Y_%m_%d')}.pdf"
-                st.download_button("⬇️ Download Accountant's Report", f, file_name=download_filename, mime="application/pdf")
\ No newline at end of file
+        if st.button("📋 Generate Accountant's Report", width="stretch"):
+            get_job_runner().submit_once(
+                report_jobs, "accountant", ("accountant", source_key, repr(inputs)), "Accountant's Report",
+                report_pdf_job, report_data_filename(report, "accountant"), REPORTS["accountant"][0],
+                pipeline.get("accountant_context"), get_pdf_backend(), get_pdf_cache()
+            )
+        show_job_panel("accountant")
+
+    if st.button("📈 Add to Sales Summary", help="Adds this report's figures to the cross-store summary, replacing an earlier report of the same store and opening date"):
+        sales_cube = get_sales_cube()
+        sales_cube.add_report(report)
+        sales_cube.save()
+        st.success(f"✅ Added {store_name}, {open_period_date} to the sales summary")
+
+    cache_stats = get_pdf_cache().stats()
+    st.caption(
+        f"PDF cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['entries']} PDFs ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)"
+    )
+
+    # ===== DATE RANGE MODE =====
+    with st.expander("📅 Date Range Reports"):
+        st.write("Generate one report per day, week or month between the opening and close period dates. "
+                 "The amounts entered above are treated as totals for the whole period and split across the windows by number of days.")
+        range_col1, range_col2, range_col3 = st.columns(3)
+        frequency = range_col1.selectbox("Split into", FREQUENCIES, format_func=str.capitalize, key="range_frequency")
+        bundle = range_col2.radio("Output", BUNDLES, format_func={"zip": "ZIP of PDFs", "pdf": "One merged PDF"}.get, key="range_bundle")
+        range_kinds = range_col3.multiselect("Reports", REPORT_KINDS, default=list(REPORT_KINDS), format_func=str.capitalize, key="range_kinds")
+
+        if close_period_date < open_period_date:
+            st.error("❌ Close Period Date is before the Opening Period Date")
+        else:
+            window_count = len(period_windows(open_period_date, close_period_date, frequency))
+            if st.button(f"🗂️ Generate {window_count * len(range_kinds)} Reports", disabled=not range_kinds, width="stretch"):
+                get_job_runner().submit_once(
+                    report_jobs, "range", ("range", source_key, repr(inputs), frequency, bundle, tuple(range_kinds)),
+                    f"{window_count} {frequency} windows",
+                    period_reports_job, inputs, frequency, get_pdf_backend(), range_kinds, bundle, df
+                )
+            show_job_panel("range")
+
+    # ===== ALL STATIONS MODE =====
+    with st.expander("🏢 All Stations Accountant's Report"):
+        st.write("Upload a store inputs file (the batch_reports.py format, one row per store) to put every station "
+                 "on a single accountant's report. All rows use the department data selected above.")
+        stations_file = st.file_uploader("Store Inputs CSV", type=["csv"], key="stations_file")
+        if stations_file:
+            try:
+                station_inputs = [row_inputs(row) for row in read_store_inputs(io.BytesIO(stations_file.getvalue()))]
+            except StoreInputsError as exc:
+                st.error(f"❌ {stations_file.name}{f', row {exc.row}' if exc.row else ''}: {exc.message}")
+            else:
+                if st.button(f"🏢 Generate Accountant's Report for {len(station_inputs)} Stations", disabled=not station_inputs, width="stretch"):
+                    get_job_runner().submit_once(
+                        report_jobs, "stations", ("stations", source_key, repr(station_inputs)),
+                        "All Stations Accountant's Report",
+                        consolidated_accountant_job, station_inputs, get_pdf_backend(), get_pdf_cache(), df
+                    )
+                show_job_panel("stations")
+
+    if st.session_state.get("show_metrics"):
+        st.sidebar.caption(f"Stages recomputed this run: {', '.join(pipeline.last_recomputed) or 'none'}")
+
+# ===== SALES SUMMARY =====
+with st.expander("📈 Sales Summary (all stations)"):
+    sales_cube = get_sales_cube()
+    cube_stats = sales_cube.stats()
+    if not cube_stats["reports"]:
+        st.info("No reports in the summary yet. Use \"Add to Sales Summary\" above or batch_reports.py --cube.")
+    else:
+        st.caption(f"{cube_stats['reports']} reports from {cube_stats['stores']} stations, "
+                   f"{cube_stats['first_date']} to {cube_stats['last_date']}")
+        sum_col1, sum_col2, sum_col3, sum_col4 = st.columns(4)
+        summary_table = sum_col1.radio("Figures", ["departments", "totals"], format_func={"departments": "Departments", "totals": "Fuel / Tax / MOP"}.get, key="summary_table")
+        summary_grain = sum_col2.selectbox("Per", GRAINS, index=GRAINS.index("month"), format_func=str.capitalize, key="summary_grain")
+        summary_level = sum_col3.selectbox("By", LEVELS, format_func={"store": "Station", "group": "Tax jurisdiction", "all": "All stations"}.get, key="summary_level")
+        merch_only = sum_col4.checkbox("Merch only", value=True, key="summary_merch_only", disabled=summary_table != "departments")
+        summary_range = st.date_input("Periods starting", value=(cube_stats["first_date"], cube_stats["last_date"]), key="summary_range")
+        # A range being picked has only its start date until the end is chosen
+        summary_start = summary_range[0] if summary_range else None
+        summary_end = summary_range[1] if len(summary_range) > 1 else None
+
+        query_started = time.perf_counter()
+        with instrumentation.span("cube_query"):
+            summary = sales_cube.query(summary_table, summary_grain, summary_level, summary_start, summary_end, merch_only=merch_only)
+        query_ms = (time.perf_counter() - query_started) * 1000
+        # The cube keeps cents; fuel volume is the only non-money measure
+        for column in summary.columns:
+            if column in ("Gross", "Refunds", "Discounts", "Net Sales") or (summary_table == "totals" and column not in ("period", "location_id", "group", "fuel_total_volume")):
+                summary[column] = summary[column] / 100
+        summary["period"] = summary["period"].dt.date
+        st.dataframe(summary, hide_index=True, width="stretch")
+        st.caption(f"{len(summary)} rows in {query_ms:.1f} ms")
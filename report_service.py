@@ -0,0 +1,359 @@
+"""Local HTTP service that returns the main or accountant's report PDF for JSON inputs.
+
+    python report_service.py --port 8765 --workers 4 --queue 16
+
+    POST /reports/main          JSON inputs -> application/pdf
+    POST /reports/accountant    JSON inputs -> application/pdf
+    GET  /health                pool size, requests in flight, totals (JSON)
+    GET  /metrics               pipeline stage metrics (Prometheus text format)
+
+The JSON body holds the ReportInputs fields (dates as YYYY-MM-DD, fuel_data as
+{"REG": {"volume": ..., "amount": ...}, ...}); store_id may be given instead
+of store_name. Missing numeric fields default to 0 and a missing seed draws a
+fresh one. "departments": "saved" uses the store's saved department data for
+the opening date (see department_store) instead of the default data.
+
+Every connection gets a handler thread and HTTP/1.1 keep-alive; the pipeline
+and PDF render of each request run on a pool of --workers threads. At most
+--queue requests wait for a free worker, and further requests are answered at
+once with 503 and Retry-After instead of piling up. Errors come back as JSON
+{"error": ...} with 400 (bad inputs: negative or non-finite numbers, a period
+that closes before it opens, ...), 404, 413, 503 or 504 (--timeout hit).
+The response carries X-Report-Store and X-Report-Seed, and echoes X-Request-Id,
+so a client can check that it got the report it asked for.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import fields
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import report_engine as engine
+import instrumentation
+from department_store import open_store
+from pdf_backends import BACKENDS, PooledPdfBackend, create_backend, resolve_backend_name
+from pdf_cache import create_cache
+from store_registry import get_registry
+
+logger = logging.getLogger("sh_reports.service")
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE = 16
+DEFAULT_REQUEST_TIMEOUT = 120
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_SECONDS = 30
+RETRY_AFTER_SECONDS = 1
+
+INPUT_FIELDS = {item.name: item.type for item in fields(engine.ReportInputs)}
+REQUEST_FIELDS = {*INPUT_FIELDS, "store_id", "departments"}
+DEPARTMENT_SOURCES = ("default", "saved")
+
+
+class BadRequest(ValueError):
+    """Inputs the service cannot build a report from (answered with 400)"""
+
+
+class ServiceBusy(RuntimeError):
+    """Every worker is busy and the wait queue is full (answered with 503)"""
+
+
+def _number(name, value, kind):
+    """Finite, non-negative int or float of a JSON number (every numeric input is a count, amount or seed)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise BadRequest(f"{name} must be a number")
+    if not math.isfinite(value):
+        raise BadRequest(f"{name} must be a finite number")
+    if value < 0:
+        raise BadRequest(f"{name} must not be negative")
+    if kind is int:
+        if value != int(value):
+            raise BadRequest(f"{name} must be a whole number")
+        return int(value)
+    return float(value)
+
+
+def _fuel_data(value):
+    if not isinstance(value, dict):
+        raise BadRequest("fuel_data must be an object keyed by product")
+    unknown = sorted(set(value) - set(engine.fuel_products))
+    if unknown:
+        raise BadRequest(f"Unknown fuel product(s): {', '.join(unknown)}")
+    fuel_data = engine.empty_fuel_data()
+    for product, row in value.items():
+        if not isinstance(row, dict):
+            raise BadRequest(f"fuel_data.{product} must be an object with volume and amount")
+        fuel_data[product] = {
+            "volume": _number(f"fuel_data.{product}.volume", row.get("volume", 0), int),
+            "amount": _number(f"fuel_data.{product}.amount", row.get("amount", 0), float),
+        }
+    return fuel_data
+
+
+def request_inputs(payload):
+    """(ReportInputs, department source) of a decoded JSON request body"""
+    if not isinstance(payload, dict):
+        raise BadRequest("Request body must be a JSON object")
+    unknown = sorted(set(payload) - REQUEST_FIELDS)
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}")
+
+    store_key = payload.get("store_name") or payload.get("store_id")
+    if not store_key:
+        raise BadRequest("store_name or store_id is required")
+    store = get_registry().find(store_key)
+    if store is None:
+        raise BadRequest(f"Unknown store {store_key!r}")
+
+    values = {"store_name": store.name}
+    for name, kind in INPUT_FIELDS.items():
+        if name == "store_name" or name not in payload or payload[name] is None:
+            continue
+        value = payload[name]
+        if kind is date:
+            try:
+                values[name] = date.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise BadRequest(f"{name} must be a date (YYYY-MM-DD)") from None
+        elif name == "fuel_data":
+            values[name] = _fuel_data(value)
+        else:
+            values[name] = _number(name, value, kind)
+    for name in ("open_period_date", "close_period_date"):
+        if name not in values:
+            raise BadRequest(f"{name} is required")
+    if values["close_period_date"] < values["open_period_date"]:
+        raise BadRequest("close_period_date is before open_period_date")
+
+    source = payload.get("departments", "default")
+    if source not in DEPARTMENT_SOURCES:
+        raise BadRequest(f"departments must be one of {', '.join(DEPARTMENT_SOURCES)}")
+    return engine.ReportInputs(**values), source
+
+
+class ReportService:
+    """Bounded pool that computes and renders reports for the HTTP handlers"""
+
+    def __init__(self, backend, workers, queue_size=DEFAULT_QUEUE, cache=None, request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.backend = backend
+        self.cache = cache
+        self.workers = workers
+        self.queue_size = queue_size
+        self.request_timeout = request_timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-service")
+        # One slot per running or waiting request; no free slot means 503
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counts = {"ok": 0, "rejected": 0, "failed": 0}
+        self._default_departments = engine.get_default_department_data()
+        self._saved_departments = {}  # (store_id, period, version) -> frame
+
+    def departments(self, inputs, source):
+        if source == "default":
+            return self._default_departments
+        store = open_store()
+        store_id = get_registry().store_id(inputs.store_name)
+        period = store.period_for(store_id, inputs.open_period_date)
+        if period is None:
+            raise BadRequest(f"No department data saved for store {store_id} on or before {inputs.open_period_date}")
+        key = (store_id, period, store.version(store_id, period))
+        frame = self._saved_departments.get(key)
+        if frame is None:
+            frame = self._saved_departments[key] = store.load(store_id, period)
+        return frame
+
+    def _render(self, inputs, source, kind):
+        data = engine.compute_report(inputs, self.departments(inputs, source))
+        pdf_bytes = engine.render_report_pdf(data, kind, self.backend, self.cache)
+        return data, pdf_bytes
+
+    def render(self, inputs, source, kind):
+        """(ReportData, PDF bytes), computed on the pool; ServiceBusy when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counts["rejected"] += 1
+            raise ServiceBusy("All report workers are busy, try again shortly")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._pool.submit(self._render, inputs, source, kind)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            result = future.result(timeout=self.request_timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+        except BadRequest:
+            raise
+        except Exception:
+            with self._lock:
+                self._counts["failed"] += 1
+            raise
+        with self._lock:
+            self._counts["ok"] += 1
+        return result
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def status(self):
+        with self._lock:
+            return {
+                "status": "ok",
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                **self._counts,
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.backend.close()
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive unless the client asks to close
+    timeout = KEEP_ALIVE_SECONDS    # idle keep-alive connections give their thread back
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        request_id = self.headers.get("X-Request-Id")
+        if request_id:
+            self.send_header("X-Request-Id", request_id)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=()):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _read_body(self):
+        """Request body; BadRequest for an invalid Content-Length, OverflowError when it is over MAX_BODY_BYTES
+
+        The connection is closed on either error, since the end of the body is unknown.
+        """
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise BadRequest(f"Invalid Content-Length: {self.headers.get('Content-Length')!r}")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise OverflowError(f"Request body is larger than {MAX_BODY_BYTES} bytes")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.status())
+        elif self.path == "/metrics":
+            self._send(200, instrumentation.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"No such path: {self.path}"})
+
+    def do_POST(self):
+        kind = self.path.removeprefix("/reports/")
+        if not self.path.startswith("/reports/") or kind not in engine.REPORTS:
+            try:
+                self._read_body()
+            except (BadRequest, OverflowError):
+                pass  # the connection is closed after the 404
+            self._send_json(404, {"error": f"No such report: {self.path}"})
+            return
+        started = time.perf_counter()
+        try:
+            body = self._read_body()
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise BadRequest("Request body is not valid JSON") from None
+            inputs, source = request_inputs(payload)
+            data, pdf_bytes = self.service.render(inputs, source, kind)
+        except OverflowError as exc:
+            self._send_json(413, {"error": str(exc)})
+        except BadRequest as exc:
+            self._send_json(400, {"error": str(exc)})
+        except ServiceBusy as exc:
+            self._send_json(503, {"error": str(exc)}, [("Retry-After", str(RETRY_AFTER_SECONDS))])
+        except FutureTimeout:
+            self._send_json(504, {"error": f"Report not ready within {self.service.request_timeout}s"})
+        except Exception as exc:
+            logger.exception("Report request failed")
+            self._send_json(500, {"error": str(exc)})
+        else:
+            self._send(200, pdf_bytes, "application/pdf", [
+                ("Content-Disposition", f'attachment; filename="{engine.report_data_filename(data, kind)}"'),
+                ("X-Report-Store", data.store_id),
+                ("X-Report-Seed", str(data.seed)),
+                ("X-Report-Seconds", f"{time.perf_counter() - started:.3f}"),
+            ])
+
+
+class ReportHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen() backlog for connections not yet accepted
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, ReportRequestHandler)
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, workers=None, queue_size=DEFAULT_QUEUE, backend_name=None, cache=False, request_timeout=DEFAULT_REQUEST_TIMEOUT):
+    """ReportHTTPServer with its own backend and pool; call serve_forever(), then server.service.close()"""
+    workers = workers or os.cpu_count() or 1
+    backend_name = resolve_backend_name(backend_name)
+    backend_options = {"max_workers": workers} if backend_name == PooledPdfBackend.name else {}
+    service = ReportService(create_backend(backend_name, **backend_options), workers, queue_size, create_cache() if cache else None, request_timeout)
+    return ReportHTTPServer((host, port), service)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve report PDFs over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="concurrent report renders (default: number of CPUs)")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE, help="requests allowed to wait for a worker before 503s")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None, help="PDF backend (default: $SH_REPORTS_PDF_BACKEND or pool)")
+    parser.add_argument("--cache", action="store_true", help="reuse rendered PDFs from the PDF cache")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT, help="seconds a request may take before 504")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    server = make_server(args.host, args.port, args.workers, args.queue, args.backend, args.cache, args.timeout)
+    host, port = server.server_address[:2]
+    logger.info("Serving reports on http://%s:%s (%d workers, queue %d)", host, port, server.service.workers, server.service.queue_size)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
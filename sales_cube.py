@@ -0,0 +1,313 @@
+"""Store x date x department sales cube with precomputed rollups.
+
+Every computed report adds its department rows (keyed by location ID, date and
+Dept#) and its fuel / tax / MOP totals (keyed by location ID and date) to the
+cube. The date of a report is its opening period date. Rollups of both tables
+are kept for every grain (day, week starting Monday, month) at every level
+(single store, station group, all stations). A station group is the store's
+tax jurisdiction at the time the report was added. Department rollups are
+also keyed by whether the fact row is merch, taken from the row's own Category
+(each store classifies its own department names). query() only slices a
+rollup, so cross-store questions such as "merch net sales by department across
+all stations last quarter" come back without recomputing any report.
+
+Adding reports updates the rollups incrementally. The new rows are queued as
+deltas, along with negative deltas for any report they replace (same location
+ID and date). The next query of a rollup rolls up only the queued rows and adds
+them to it, so adding a report costs the same however large the cube is.
+Deltas are dropped once every rollup of their table has folded them in; when
+more than MAX_PENDING are queued (some rollups are never queried), every
+rollup of the table is brought up to date, so the queue stays bounded.
+Money is integer cents, as in ReportData.
+
+    cube = SalesCube.load()                  # data/cube, or $SH_REPORTS_SALES_CUBE
+    cube.add_reports([data, ...]); cube.save()
+    cube.query("departments", grain="month", level="all", start=date(2025, 1, 1), end=date(2025, 3, 31), merch_only=True)
+
+    python sales_cube.py summary --grain month --level group
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+import report_engine as engine
+from instrumentation import span
+from store_registry import get_registry
+
+DEFAULT_CUBE_DIR = os.path.join(engine.TEMPLATE_DIR, "data", "cube")
+
+DEPARTMENT_MEASURES = ["Cust#", "Items", "Gross", "Refunds", "Discounts", "Net Sales"]
+TOTAL_MEASURES = [
+    "total_merch_sale", "sales_tax", "incl_taxes", "fuel_total_volume", "fuel_total_amount",
+    "total_mop_sales", "pay_out", "credit", "debit", "mobile", "cash",
+]
+MEASURES = {"departments": DEPARTMENT_MEASURES, "totals": TOTAL_MEASURES}
+GRAINS = ("day", "week", "month")
+LEVELS = ("store", "group", "all")
+LEVEL_KEYS = {"store": ["location_id"], "group": ["group"], "all": []}
+FACT_KEYS = ["location_id", "date"]
+MAX_PENDING = 256  # queued deltas per table before every rollup is brought up to date
+
+
+def _empty_facts(table):
+    columns = {"location_id": pd.Series(dtype=str), "date": pd.Series(dtype="datetime64[ns]"), "group": pd.Series(dtype=str)}
+    if table == "departments":
+        columns.update({"Dept#": pd.Series(dtype="int64"), "Description": pd.Series(dtype=str), "Category": pd.Series(dtype=str)})
+    columns.update({measure: pd.Series(dtype="int64") for measure in MEASURES[table]})
+    return pd.DataFrame(columns)
+
+
+def period_start(dates, grain):
+    """Start of the day / week (Monday) / month containing each date"""
+    dates = pd.DatetimeIndex(dates)
+    if grain == "day":
+        return dates.normalize()
+    if grain == "week":
+        return dates.normalize() - pd.to_timedelta(dates.weekday, unit="D")
+    if grain == "month":
+        return dates.to_period("M").to_timestamp()
+    raise ValueError(f"Unknown grain '{grain}', expected one of {', '.join(GRAINS)}")
+
+
+def report_facts(data):
+    """(department rows, totals row) of one ReportData as cube fact frames"""
+    store = get_registry().get(data.inputs.store_name)
+    day = pd.Timestamp(data.inputs.open_period_date).as_unit("ns")
+    group = store.jurisdiction
+
+    departments = data.df_final.loc[data.df_final["Description"].notna(), ["Dept#", "Description", "Category", *DEPARTMENT_MEASURES]].copy()
+    departments["Description"] = departments["Description"].astype(str)
+    departments["Category"] = departments["Category"].astype(str)
+    for measure in DEPARTMENT_MEASURES:
+        departments[measure] = departments[measure].fillna(0).astype("int64")
+    departments.insert(0, "location_id", store.location_id)
+    departments.insert(1, "date", day)
+    departments.insert(2, "group", group)
+
+    totals = pd.DataFrame([{
+        "location_id": store.location_id,
+        "date": day,
+        "group": group,
+        "total_merch_sale": data.total_merch_sale,
+        "sales_tax": data.sales_tax,
+        "incl_taxes": data.incl_taxes,
+        "fuel_total_volume": round(data.fuel_total_volume),
+        "fuel_total_amount": engine.to_cents(data.fuel_total_amount),
+        "total_mop_sales": data.total_mop_sales,
+        "pay_out": data.pay_out,
+        **{method: data.manual_mop_values[method] for method in ("credit", "debit", "mobile", "cash")},
+    }])
+    return departments.reset_index(drop=True), totals
+
+
+class SalesCube:
+    """Department and totals facts plus their rollups by grain and level"""
+
+    def __init__(self, departments=None, totals=None, directory=None):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._reports = {}  # (location_id, date) -> (department rows, totals row)
+        self._pending = {table: [] for table in MEASURES}  # (fact rows, +1 / -1) not yet in every rollup
+        self._rollups = {}  # (table, grain, level) -> [rollup frame, number of pending deltas folded in]
+        self._departments = pd.DataFrame(columns=["Description"])  # Dept# -> latest description
+        departments = _empty_facts("departments") if departments is None else departments
+        totals = _empty_facts("totals") if totals is None else totals
+        # Parquet round trips dates as ms; keep ns like freshly computed facts
+        departments = departments.astype({"date": "datetime64[ns]"})
+        totals = totals.astype({"date": "datetime64[ns]"})
+        with span("cube_build"):
+            rows_by_report = dict(iter(departments.groupby(FACT_KEYS, sort=False))) if len(departments) else {}
+            for key, total in totals.groupby(FACT_KEYS, sort=False):
+                self._reports[key] = (rows_by_report.get(key, departments.iloc[:0]), total)
+            for table, facts in (("departments", departments), ("totals", totals)):
+                for grain in GRAINS:
+                    for level in LEVELS:
+                        self._rollups[(table, grain, level)] = [self._rollup(facts, table, grain, level), 0]
+            self._update_department_names(departments)
+
+    @classmethod
+    def load(cls, directory=None):
+        """Cube saved in directory (default $SH_REPORTS_SALES_CUBE or data/cube); empty if nothing is saved"""
+        directory = directory or os.environ.get("SH_REPORTS_SALES_CUBE", DEFAULT_CUBE_DIR)
+        frames = {}
+        for table in MEASURES:
+            path = os.path.join(directory, f"{table}.parquet")
+            frames[table] = pd.read_parquet(path) if os.path.exists(path) else None
+        return cls(frames["departments"], frames["totals"], directory)
+
+    def facts(self, table):
+        """All fact rows of one table ("departments" or "totals")"""
+        with self._lock:
+            parts = [report[0 if table == "departments" else 1] for report in self._reports.values()]
+        return pd.concat(parts, ignore_index=True) if parts else _empty_facts(table)
+
+    def save(self, directory=None):
+        """Write the fact tables (rollups are rebuilt on load); each file is replaced atomically"""
+        directory = directory or self.directory or os.environ.get("SH_REPORTS_SALES_CUBE", DEFAULT_CUBE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        for table in MEASURES:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+            os.close(fd)
+            self.facts(table).to_parquet(tmp_path, index=False, compression="zstd")
+            os.replace(tmp_path, os.path.join(directory, f"{table}.parquet"))
+        self.directory = directory
+        return directory
+
+    @staticmethod
+    def _rollup(facts, table, grain, level, sign=None):
+        """Measures summed by (period, level key..., merch, Dept#), plus the internal _rows count"""
+        keys = [pd.Series(period_start(facts["date"], grain), index=facts.index, name="period")]
+        keys += [facts[column] for column in LEVEL_KEYS[level]]
+        if table == "departments":
+            keys.append(pd.Series(facts["Category"].isin(engine.MERCH_CATEGORIES), index=facts.index, name="merch"))
+            keys.append(facts["Dept#"])
+        values = facts[MEASURES[table]].assign(_rows=1)
+        if sign is not None:
+            values = values.mul(sign, axis=0)
+        return values.groupby(keys).sum().astype("int64")
+
+    def _update_department_names(self, departments):
+        if len(departments):
+            latest = departments.drop_duplicates("Dept#", keep="last").set_index("Dept#")[["Description"]]
+            self._departments = latest.combine_first(self._departments) if len(self._departments) else latest
+
+    def _current(self, table, grain, level):
+        """Rollup with every pending delta folded in (only the requested one is brought up to date)"""
+        entry = self._rollups[(table, grain, level)]
+        pending = self._pending[table][entry[1]:]
+        if pending:
+            facts = pd.concat([rows for rows, _ in pending], ignore_index=True)
+            signs = np.concatenate([np.full(len(rows), sign, dtype="int64") for rows, sign in pending])
+            delta = self._rollup(facts, table, grain, level, signs)
+            updated = entry[0].add(delta, fill_value=0).astype("int64")
+            # Keys whose rows were all replaced away
+            entry[0] = updated.loc[updated["_rows"] != 0]
+            entry[1] += len(pending)
+            self._trim(table)
+        return entry[0]
+
+    def _trim(self, table):
+        """Drop the queued deltas that every rollup of the table has folded in"""
+        entries = [entry for key, entry in self._rollups.items() if key[0] == table]
+        folded = min(entry[1] for entry in entries)
+        if folded:
+            del self._pending[table][:folded]
+            for entry in entries:
+                entry[1] -= folded
+
+    def add_reports(self, reports):
+        """Add computed ReportData; a report replaces any earlier one of the same store and date"""
+        return self.add_facts([report_facts(data) for data in reports])
+
+    def add_facts(self, reports):
+        """Add (department rows, totals row) pairs from report_facts(), e.g. computed in another process"""
+        added = 0
+        with self._lock, span("cube_add", reports=len(reports)):
+            for departments, totals in reports:
+                key = (totals.at[0, "location_id"], totals.at[0, "date"])
+                previous = self._reports.get(key)
+                if previous is not None:
+                    self._pending["departments"].append((previous[0], -1))
+                    self._pending["totals"].append((previous[1], -1))
+                self._reports[key] = (departments, totals)
+                self._pending["departments"].append((departments, 1))
+                self._pending["totals"].append((totals, 1))
+                self._update_department_names(departments)
+                added += 1
+            for table, pending in self._pending.items():
+                if len(pending) > MAX_PENDING:
+                    for grain in GRAINS:
+                        for level in LEVELS:
+                            self._current(table, grain, level)
+        return added
+
+    def add_report(self, data):
+        return self.add_reports([data])
+
+    def query(self, table="departments", grain="month", level="all", start=None, end=None, location_ids=None, groups=None, depts=None, merch_only=False, measures=None):
+        """Slice of a precomputed rollup as a flat frame
+
+        start / end bound the period start dates (inclusive). location_ids
+        only applies at the store level and groups at the group level.
+        merch_only keeps the merch departments (not fuel) of the departments table.
+        """
+        if table not in MEASURES:
+            raise ValueError(f"Unknown table '{table}', expected one of {', '.join(MEASURES)}")
+        if level not in LEVELS:
+            raise ValueError(f"Unknown level '{level}', expected one of {', '.join(LEVELS)}")
+        if grain not in GRAINS:
+            raise ValueError(f"Unknown grain '{grain}', expected one of {', '.join(GRAINS)}")
+        with self._lock:
+            frame = self._current(table, grain, level)
+            names = self._departments
+        index = frame.index
+        mask = np.ones(len(frame), dtype=bool)
+        periods = index.get_level_values("period")
+        if start is not None:
+            mask &= periods >= period_start([pd.Timestamp(start)], grain)[0]
+        if end is not None:
+            mask &= periods <= pd.Timestamp(end)
+        if location_ids is not None and level == "store":
+            mask &= index.get_level_values("location_id").isin([str(location_id) for location_id in location_ids])
+        if groups is not None and level == "group":
+            mask &= index.get_level_values("group").isin(list(groups))
+        if table == "departments":
+            dept_numbers = index.get_level_values("Dept#")
+            if depts is not None:
+                mask &= dept_numbers.isin(list(depts))
+            if merch_only:
+                mask &= index.get_level_values("merch")
+        result = frame.loc[mask, measures or MEASURES[table]]
+        if table == "departments":
+            # A Dept# can be merch at one store and not at another: sum over both
+            result = result.groupby(level=[name for name in index.names if name != "merch"]).sum()
+        result = result.reset_index()
+        if table == "departments":
+            result.insert(result.columns.get_loc("Dept#") + 1, "Description", result["Dept#"].map(names["Description"]))
+        return result
+
+    def stats(self):
+        with self._lock:
+            keys = list(self._reports)
+            department_rows = sum(len(report[0]) for report in self._reports.values())
+        dates = [day for _, day in keys]
+        return {
+            "reports": len(keys),
+            "stores": len({location_id for location_id, _ in keys}),
+            "first_date": min(dates).date() if dates else None,
+            "last_date": max(dates).date() if dates else None,
+            "department_rows": department_rows,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the saved sales cube")
+    parser.add_argument("--cube", default=None, help="cube directory (default: $SH_REPORTS_SALES_CUBE or data/cube)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary_parser = commands.add_parser("summary", help="print one rollup")
+    summary_parser.add_argument("--table", choices=sorted(MEASURES), default="departments")
+    summary_parser.add_argument("--grain", choices=GRAINS, default="month")
+    summary_parser.add_argument("--level", choices=LEVELS, default="all")
+    summary_parser.add_argument("--start", default=None, help="first period (YYYY-MM-DD)")
+    summary_parser.add_argument("--end", default=None, help="last period (YYYY-MM-DD)")
+    summary_parser.add_argument("--merch-only", action="store_true")
+    commands.add_parser("stats", help="print what the cube holds")
+    args = parser.parse_args(argv)
+
+    cube = SalesCube.load(args.cube)
+    if args.command == "stats":
+        for name, value in cube.stats().items():
+            print(f"{name}: {value}")
+    else:
+        result = cube.query(args.table, args.grain, args.level, args.start, args.end, merch_only=args.merch_only)
+        print(result.to_string(index=False) if len(result) else "No data")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Store registry: locations and tax jurisdictions loaded from data files.
+
+    data/stores.csv             location_id, name, jurisdiction
+    data/tax_jurisdictions.csv  jurisdiction, description, multiplier
+
+Stores are indexed by location ID and by name. Name lookups ignore case and
+repeated whitespace, so "Gulf - 501 Nyack" finds "Gulf  - 501 Nyack".
+search() does prefix matching on the name, on the part of the name after the
+brand ("501 Nyack") and on the location ID, which is what the store picker uses.
+Every store must name a jurisdiction in the tax table. A store or jurisdiction
+that is missing is an error, never a default rate.
+
+get_registry() loads both files once per process and loads them again when
+either file's modification time or size changes. SH_REPORTS_STORES and
+SH_REPORTS_TAX_JURISDICTIONS override the file paths.
+
+    python store_registry.py search "gulf - 1"
+    python store_registry.py check
+"""
+import argparse
+import bisect
+import csv
+import os
+import sys
+import threading
+from collections import namedtuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_STORES_FILE = os.path.join(DATA_DIR, "stores.csv")
+DEFAULT_JURISDICTIONS_FILE = os.path.join(DATA_DIR, "tax_jurisdictions.csv")
+BRAND_SEPARATOR = " - "
+
+Store = namedtuple("Store", ["location_id", "name", "jurisdiction"])
+Jurisdiction = namedtuple("Jurisdiction", ["jurisdiction", "description", "multiplier"])
+
+
+def normalize_name(name):
+    """Lookup key of a store name: case and whitespace runs do not matter"""
+    return " ".join(str(name).split()).casefold()
+
+
+def _read_rows(path, required):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in required if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path}: missing required columns: {', '.join(missing)}")
+        return [row for row in reader if any((value or "").strip() for value in row.values())]
+
+
+class StoreRegistry:
+    """Stores and tax jurisdictions with lookups by location ID, name and prefix"""
+
+    def __init__(self, stores, jurisdictions):
+        self.jurisdictions = {item.jurisdiction: item for item in jurisdictions}
+        self.stores = tuple(stores)
+        self._by_id = {}
+        self._by_name = {}
+        for store in self.stores:
+            if store.location_id in self._by_id:
+                raise ValueError(f"Duplicate location ID {store.location_id}")
+            key = normalize_name(store.name)
+            if key in self._by_name:
+                raise ValueError(f"Duplicate store name {store.name!r}")
+            if store.jurisdiction not in self.jurisdictions:
+                raise ValueError(f"Store {store.name!r} has unknown tax jurisdiction {store.jurisdiction!r}")
+            self._by_id[store.location_id] = store
+            self._by_name[key] = store
+        self.names = tuple(store.name for store in self.stores)
+
+        # Sorted (search key, position) pairs: name, name after the brand and location ID
+        index = []
+        for position, store in enumerate(self.stores):
+            key = normalize_name(store.name)
+            index.append((key, position))
+            if BRAND_SEPARATOR in key:
+                index.append((key.split(BRAND_SEPARATOR, 1)[1], position))
+            index.append((store.location_id, position))
+        index.sort()
+        self._search_keys = [key for key, _ in index]
+        self._search_positions = [position for _, position in index]
+
+    @classmethod
+    def from_files(cls, stores_path=DEFAULT_STORES_FILE, jurisdictions_path=DEFAULT_JURISDICTIONS_FILE):
+        jurisdictions = [
+            Jurisdiction(row["jurisdiction"].strip(), (row.get("description") or "").strip(), float(row["multiplier"]))
+            for row in _read_rows(jurisdictions_path, ["jurisdiction", "multiplier"])
+        ]
+        stores = [
+            Store(row["location_id"].strip(), row["name"], row["jurisdiction"].strip())
+            for row in _read_rows(stores_path, ["location_id", "name", "jurisdiction"])
+        ]
+        return cls(stores, jurisdictions)
+
+    def __len__(self):
+        return len(self.stores)
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def find(self, key):
+        """Store with this location ID or name, or None"""
+        key = str(key)
+        return self._by_id.get(key.strip()) or self._by_name.get(normalize_name(key))
+
+    def get(self, key):
+        """Store with this location ID or name; KeyError if there is none"""
+        store = self.find(key)
+        if store is None:
+            raise KeyError(f"Unknown store {key!r}")
+        return store
+
+    def store_id(self, key):
+        return self.get(key).location_id
+
+    def tax_multiplier(self, key):
+        """Sales tax multiplier (e.g. 1.08875) of the store's jurisdiction"""
+        return self.jurisdictions[self.get(key).jurisdiction].multiplier
+
+    def search(self, prefix, limit=None):
+        """Stores whose name, name after the brand or location ID starts with prefix, in file order"""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return list(self.stores[:limit] if limit else self.stores)
+        start = bisect.bisect_left(self._search_keys, prefix)
+        positions = set()
+        for offset in range(start, len(self._search_keys)):
+            if not self._search_keys[offset].startswith(prefix):
+                break
+            positions.add(self._search_positions[offset])
+        matches = [self.stores[position] for position in sorted(positions)]
+        return matches[:limit] if limit else matches
+
+
+_lock = threading.Lock()
+_loaded = {}  # (stores path, jurisdictions path) -> (file signatures, registry)
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_registry(stores_path=None, jurisdictions_path=None):
+    """Registry of the data files, loaded again only when either file changed since the last call"""
+    stores_path = stores_path or os.environ.get("SH_REPORTS_STORES", DEFAULT_STORES_FILE)
+    jurisdictions_path = jurisdictions_path or os.environ.get("SH_REPORTS_TAX_JURISDICTIONS", DEFAULT_JURISDICTIONS_FILE)
+    key = (stores_path, jurisdictions_path)
+    signature = (_signature(stores_path), _signature(jurisdictions_path))
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with _lock:
+        cached = _loaded.get(key)
+        if cached is None or cached[0] != signature:
+            cached = _loaded[key] = (signature, StoreRegistry.from_files(stores_path, jurisdictions_path))
+        return cached[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up stores in the registry")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search_parser = commands.add_parser("search", help="stores whose name or location ID starts with a prefix")
+    search_parser.add_argument("prefix")
+    commands.add_parser("check", help="load the data files and report problems")
+    args = parser.parse_args(argv)
+
+    try:
+        registry = get_registry()
+    except (OSError, ValueError) as exc:
+        print(f"❌ {exc}", file=sys.stderr)
+        return 1
+    if args.command == "check":
+        print(f"✅ {len(registry)} stores, {len(registry.jurisdictions)} tax jurisdictions")
+        return 0
+    for store in registry.search(args.prefix):
+        jurisdiction = registry.jurisdictions[store.jurisdiction]
+        print(f"{store.location_id}  {store.name}  ({jurisdiction.description or jurisdiction.jurisdiction}, {jurisdiction.multiplier})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
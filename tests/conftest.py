@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report_engine as engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def departments():
+    return engine.get_default_department_data()
@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+from batch_reports import StoreInputsError, read_store_inputs
+
+
+def inputs_file(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_read_store_inputs_uses_registry_spelling():
+    rows = read_store_inputs(inputs_file("store_name,open_period_date,close_period_date,cig_items,seed\nshell  - syed empires,2025-01-01,2025-01-31,12,7\n"))
+    assert [(row["store_name"], row["cig_items"], row["seed"]) for row in rows] == [("Shell - Syed Empires", 12, 7)]
+
+
+@pytest.mark.parametrize("text,row,message", [
+    ("", None, "No columns to parse"),
+    ("name,cig_items\nx,1\n", None, "missing required column 'store_name'"),
+    ("store_name\nShell - Syed Empires\nNo Such Store\n", 2, "unknown store 'No Such Store'"),
+    ("store_name,cig_items\nShell - Syed Empires,lots\n", 1, "lots"),
+    ("store_name,open_period_date\nShell - Syed Empires,2025-13-45\n", 1, "2025-13-45"),
+])
+def test_read_store_inputs_errors_say_which_row_and_what(text, row, message):
+    with pytest.raises(StoreInputsError) as raised:
+        read_store_inputs(inputs_file(text))
+    assert raised.value.row == row
+    assert message in raised.value.message
@@ -0,0 +1,83 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fuel_ledger import FILL_COLUMNS, FuelLedger
+
+STORES = ["807606", "807619", "801422"]
+TANK_GRADES = {1: "REG", 2: "REG", 3: "SUPER", 4: "DIESEL"}
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    """Pump and tank export files with rows in random time order, so readings of a day span chunks"""
+    directory = tmp_path_factory.mktemp("exports")
+    rng = np.random.default_rng(0)
+    rows = 3000
+    pumps = pd.DataFrame({
+        "store_id": rng.choice(STORES, rows),
+        "timestamp": (pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 40 * 86400, rows), unit="s")).strftime("%Y-%m-%dT%H:%M:%S"),
+        "pump": rng.integers(1, 9, rows),
+        "grade": rng.choice(["Regular", "PLUS", "premium", "Diesel", "87"], rows),
+        "volume": rng.uniform(1, 40, rows).round(3),
+        "amount": rng.uniform(5, 150, rows).round(2),
+    })
+    tank = rng.integers(1, 5, rows)
+    tanks = pd.DataFrame({
+        "store_id": rng.choice(STORES, rows),
+        "timestamp": (pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 40 * 86400, rows), unit="s")).strftime("%Y-%m-%d %H:%M:%S"),
+        "tank": tank,
+        "grade": [TANK_GRADES[number] for number in tank],
+        "volume": rng.uniform(100, 9000, rows).round(1),
+    })
+    pumps.iloc[:1500].to_csv(directory / "pumps_1.csv", index=False)
+    pumps.iloc[1500:].to_csv(directory / "pumps_2.csv", index=False)
+    tanks.to_csv(directory / "tanks.csv", index=False)
+    return [directory / "pumps_1.csv", directory / "pumps_2.csv"], [directory / "tanks.csv"], pumps, tanks
+
+
+def fill(ledger, start, end):
+    return ledger.fill_frame(STORES + ["999999"], [start] * 4, [end] * 4)
+
+
+@pytest.mark.parametrize("chunksize", [97, 1000])
+def test_ledger_is_the_same_whatever_the_chunksize(exports, chunksize):
+    pump_files, tank_files, _, _ = exports
+    whole = FuelLedger.from_exports(pump_files, tank_files, chunksize=10**6)
+    chunked = FuelLedger.from_exports(pump_files, tank_files, chunksize=chunksize)
+    for start, end in [(date(2025, 1, 1), date(2025, 1, 31)), (date(2025, 1, 10), date(2025, 1, 10))]:
+        pd.testing.assert_frame_equal(fill(chunked, start, end), fill(whole, start, end))
+
+
+def test_ledger_matches_a_direct_computation(exports):
+    pump_files, tank_files, pumps, tanks = exports
+    ledger = FuelLedger.from_exports(pump_files, tank_files, chunksize=250)
+    start, end = date(2025, 1, 5), date(2025, 1, 20)
+    filled = fill(ledger, start, end).set_index(pd.Index(STORES + ["999999"]))
+
+    day = pd.to_datetime(pumps["timestamp"]).dt.normalize()
+    in_period = pumps.loc[(day >= pd.Timestamp(start)) & (day <= pd.Timestamp(end))]
+    regular = in_period.loc[in_period["grade"].isin(["Regular", "87"])]
+    expected_volume = regular.groupby("store_id")["volume"].sum().round().astype("int64")
+    expected_amount = (regular["amount"] * 100).round().astype("int64").groupby(regular["store_id"]).sum() / 100
+    for store_id in STORES:
+        assert filled.at[store_id, "reg_volume"] == expected_volume[store_id]
+        assert filled.at[store_id, "reg_amount"] == pytest.approx(expected_amount[store_id], abs=1e-9)
+
+    readings = tanks.assign(timestamp=pd.to_datetime(tanks["timestamp"]))
+    readings = readings.loc[readings["timestamp"].dt.normalize() <= pd.Timestamp(end)]
+    last = readings.sort_values("timestamp", kind="stable").drop_duplicates(["store_id", "tank"], keep="last")
+    expected_regular = last.loc[last["grade"] == "REG"].groupby("store_id")["volume"].sum().round().astype("int64")
+    for store_id in STORES:
+        assert filled.at[store_id, "inventory_regular"] == expected_regular[store_id]
+
+    assert (filled.loc["999999", FILL_COLUMNS] == 0).all()
+
+
+def test_unknown_grade_is_an_error(tmp_path):
+    path = tmp_path / "pumps.csv"
+    pd.DataFrame({"store_id": ["807606"], "timestamp": ["2025-01-01T10:00:00"], "grade": ["KEROSENE"], "volume": [1.0], "amount": [2.0]}).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="KEROSENE"):
+        FuelLedger.from_exports([path])
@@ -0,0 +1,76 @@
+import io
+from html.parser import HTMLParser
+
+import pypdf
+import pytest
+
+import native_pdf
+import report_engine as engine
+from benchmarks.synthetic import make_inputs
+from pdf_backends import pdf_options
+from store_registry import get_registry
+
+
+class TextCells(HTMLParser):
+    """Visible text runs of an HTML document, whitespace collapsed"""
+
+    HIDDEN = ("style", "script", "title")
+
+    def __init__(self):
+        super().__init__()
+        self.cells = []
+        self._hidden = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._hidden += tag in self.HIDDEN
+
+    def handle_endtag(self, tag):
+        self._hidden -= tag in self.HIDDEN
+
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        if text and not self._hidden:
+            self.cells.append(text)
+
+
+def html_cells(template_name, context):
+    parser = TextCells()
+    parser.feed(engine.render_template(template_name, context))
+    return parser.cells
+
+
+def pdf_text(pdf_bytes):
+    return " ".join(" ".join(page.extract_text().split()) for page in pypdf.PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+def missing_in_order(cells, text):
+    """Cells that are not found in text after the previous cell"""
+    missing, position = [], 0
+    for cell in cells:
+        found = text.find(cell, position)
+        if found < 0:
+            missing.append(cell)
+        else:
+            position = found + len(cell)
+    return missing
+
+
+@pytest.mark.parametrize("template_name", sorted(native_pdf.LAYOUTS))
+@pytest.mark.parametrize("store_index,seed", [(0, 0), (4, 7), (-1, 42)])
+def test_native_layout_has_every_html_cell_in_order(departments, template_name, store_index, seed):
+    data = engine.compute_report(make_inputs(get_registry().names[store_index], seed), departments)
+    kind = next(kind for kind, (name, _, _) in engine.REPORTS.items() if name == template_name)
+    _, context = engine.report_context(data, kind)
+
+    cells = html_cells(template_name, context)
+    assert len(cells) > 100
+    assert missing_in_order(cells, pdf_text(native_pdf.render_context(template_name, context, pdf_options))) == []
+
+
+def test_parity_check_catches_a_changed_figure(departments):
+    data = engine.compute_report(make_inputs(), departments)
+    template_name, context = engine.report_context(data, "main")
+    cells = html_cells(template_name, context)
+    changed = dict(context, store_id="Another Store")
+    assert "Another Store" not in cells
+    assert missing_in_order(cells, pdf_text(native_pdf.render_context(template_name, changed, pdf_options)))
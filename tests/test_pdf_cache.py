@@ -0,0 +1,121 @@
+import os
+
+from pdf_cache import PdfCache, context_key
+
+
+def pdf(size, fill=b"x"):
+    return fill * size
+
+
+def disk_bytes(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, files in os.walk(directory)
+        for filename in files
+        if filename.endswith(".pdf")
+    )
+
+
+def test_eviction_keeps_the_cache_within_max_bytes(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=350)
+    for number in range(10):
+        cache.put(f"{number:02d}key", pdf(100))
+        assert cache.stats()["bytes"] <= 350
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["evictions"] == 7
+    assert disk_bytes(tmp_path) == cache.stats()["bytes"] == 300
+    assert [cache.get(f"{number:02d}key") is not None for number in range(10)] == [False] * 7 + [True] * 3
+
+
+def test_get_refreshes_recency(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=300)
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put(key, pdf(100))
+    assert cache.get("aa1") == pdf(100)
+    cache.put("dd4", pdf(100))
+    assert cache.get("bb2") is None
+    assert cache.get("aa1") is not None and cache.get("cc3") is not None
+
+
+def test_replacing_an_entry_does_not_count_it_twice(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=250)
+    cache.put("aa1", pdf(100))
+    cache.put("bb2", pdf(100))
+    cache.put("aa1", pdf(120, b"y"))
+    assert cache.stats()["bytes"] == 220
+    assert cache.stats()["evictions"] == 0
+    assert cache.get("aa1") == pdf(120, b"y")
+
+
+def test_entry_larger_than_max_bytes_is_kept_alone(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=100)
+    cache.put("aa1", pdf(50))
+    cache.put("bb2", pdf(500))
+    assert cache.get("aa1") is None
+    assert cache.get("bb2") == pdf(500)
+    assert cache.stats()["entries"] == 1
+
+
+def test_new_cache_loads_entries_in_least_recently_used_order(tmp_path):
+    first = PdfCache(str(tmp_path), max_bytes=1000)
+    for key in ("aa1", "bb2", "cc3"):
+        first.put(key, pdf(100))
+    for age, key in enumerate(("bb2", "cc3", "aa1")):
+        os.utime(first._path(key), ns=(1_000_000_000 * (age + 1),) * 2)
+
+    second = PdfCache(str(tmp_path), max_bytes=300)
+    assert second.stats()["bytes"] == 300
+    second.put("dd4", pdf(100))
+    assert second.get("bb2") is None
+    assert all(second.get(key) is not None for key in ("cc3", "aa1", "dd4"))
+
+
+def test_get_or_render_renders_once(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=1000)
+    calls = []
+
+    def render():
+        calls.append(1)
+        return pdf(10)
+
+    assert cache.get_or_render("aa1", render) == cache.get_or_render("aa1", render) == pdf(10)
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_context_key_changes_with_context_template_and_options(tmp_path):
+    template = tmp_path / "template.html"
+    template.write_text("<p>{{ total }}</p>")
+    key = context_key(str(template), {"total": "1.00", "rows": [1, 2]})
+    assert key == context_key(str(template), {"rows": [1, 2], "total": "1.00"})
+    assert key != context_key(str(template), {"total": "1.01", "rows": [1, 2]})
+    assert key != context_key(str(template), {"total": "1.00", "rows": [1, 2]}, {"page-size": "Letter"})
+
+    template.write_text("<p>Total: {{ total }}</p>")
+    assert key != context_key(str(template), {"total": "1.00", "rows": [1, 2]})
+
+
+def test_loading_an_index_over_a_lowered_limit_evicts(tmp_path):
+    first = PdfCache(str(tmp_path), max_bytes=1000)
+    for age, key in enumerate(("aa1", "bb2", "cc3", "dd4")):
+        first.put(key, pdf(100))
+        os.utime(first._path(key), ns=(1_000_000_000 * (age + 1),) * 2)
+
+    second = PdfCache(str(tmp_path), max_bytes=250)
+    assert second.stats()["bytes"] == disk_bytes(tmp_path) == 200
+    assert second.stats()["evictions"] == 2
+    assert second.get("aa1") is None and second.get("bb2") is None
+    assert second.get("dd4") is not None
+
+
+def test_native_cache_key_follows_the_layout_code(monkeypatch):
+    import native_pdf
+    from pdf_backends import NativePdfBackend
+
+    backend = NativePdfBackend()
+    template_name = next(iter(native_pdf.LAYOUTS))
+    options = backend.cache_options(template_name)
+    assert options["layout_version"] == native_pdf.LAYOUT_VERSION
+    monkeypatch.setattr(native_pdf, "LAYOUT_VERSION", "changed")
+    assert backend.cache_options(template_name) != options
+    assert "layout_version" not in backend.cache_options("Accountant_report.html")
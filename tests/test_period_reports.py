@@ -0,0 +1,84 @@
+import random
+from dataclasses import replace
+from datetime import date, timedelta
+
+import pytest
+
+from benchmarks.synthetic import make_inputs
+from period_reports import APPORTIONED_COUNT_FIELDS, APPORTIONED_FIELDS, period_windows, split_total, window_inputs
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_split_total_adds_back_up_to_the_cent(seed):
+    rng = random.Random(seed)
+    total = round(rng.uniform(-5000, 250000), 2)
+    weights = [rng.randint(1, 31) for _ in range(rng.randint(1, 40))]
+    parts = split_total(total, weights)
+    assert len(parts) == len(weights)
+    assert all(round(part, 2) == part for part in parts)
+    assert sum(round(part * 100) for part in parts) == round(total * 100)
+
+
+def test_split_total_integer_parts():
+    parts = split_total(1001, [31, 28, 31], integer=True)
+    assert all(isinstance(part, int) for part in parts)
+    assert sum(parts) == 1001
+
+
+def test_split_total_gives_leftover_to_largest_remainders():
+    assert split_total(1, [1, 1, 1], integer=True) == [1, 0, 0]
+    assert split_total(0.10, [2, 1]) == [0.07, 0.03]
+    assert split_total(10, [1, 2, 7], integer=True) == [1, 2, 7]
+
+
+@pytest.mark.parametrize("frequency", ["daily", "weekly", "monthly"])
+def test_period_windows_cover_the_period_without_gaps(frequency):
+    start, end = date(2025, 1, 15), date(2025, 4, 9)
+    windows = period_windows(start, end, frequency)
+    assert windows[0][0] == start and windows[-1][1] == end
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        assert next_start == previous_end + timedelta(days=1)
+    assert all(window_start <= window_end for window_start, window_end in windows)
+
+
+def test_period_windows_weekly_and_monthly_boundaries():
+    weekly = period_windows(date(2025, 1, 1), date(2025, 1, 20), "weekly")
+    assert weekly == [
+        (date(2025, 1, 1), date(2025, 1, 5)),
+        (date(2025, 1, 6), date(2025, 1, 12)),
+        (date(2025, 1, 13), date(2025, 1, 19)),
+        (date(2025, 1, 20), date(2025, 1, 20)),
+    ]
+    monthly = period_windows(date(2025, 1, 31), date(2025, 3, 1), "monthly")
+    assert monthly == [
+        (date(2025, 1, 31), date(2025, 1, 31)),
+        (date(2025, 2, 1), date(2025, 2, 28)),
+        (date(2025, 3, 1), date(2025, 3, 1)),
+    ]
+    assert period_windows(date(2025, 1, 1), date(2025, 1, 1), "daily") == [(date(2025, 1, 1), date(2025, 1, 1))]
+
+
+def test_period_windows_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        period_windows(date(2025, 1, 2), date(2025, 1, 1), "daily")
+    with pytest.raises(ValueError):
+        period_windows(date(2025, 1, 1), date(2025, 1, 2), "hourly")
+
+
+def test_window_inputs_apportion_totals_and_seed_each_window():
+    inputs = replace(make_inputs(seed=3), manual_credit=90000.01)
+    windows = period_windows(inputs.open_period_date, inputs.close_period_date, "weekly")
+    parts = window_inputs(inputs, windows)
+
+    for name in APPORTIONED_FIELDS:
+        assert round(sum(getattr(part, name) for part in parts) * 100) == round(getattr(inputs, name) * 100)
+    for name in APPORTIONED_COUNT_FIELDS:
+        assert sum(getattr(part, name) for part in parts) == getattr(inputs, name)
+    for product, values in inputs.fuel_data.items():
+        assert sum(part.fuel_data[product]["volume"] for part in parts) == values["volume"]
+        assert round(sum(part.fuel_data[product]["amount"] for part in parts) * 100) == round(values["amount"] * 100)
+    assert all(part.inventory_regular == inputs.inventory_regular for part in parts)
+
+    seeds = [part.seed for part in parts]
+    assert len(set(seeds)) == len(seeds)
+    assert seeds == [part.seed for part in window_inputs(inputs, windows)]
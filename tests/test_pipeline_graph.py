@@ -0,0 +1,91 @@
+from dataclasses import replace
+
+import pytest
+
+import report_engine as engine
+from benchmarks.synthetic import make_inputs
+from pipeline_graph import PipelineGraph, Stage, report_graph, set_report_inputs
+
+
+def toy_graph(calls):
+    def stage(name, func):
+        def run(*values):
+            calls.append(name)
+            return func(*values)
+        return run
+
+    return PipelineGraph([
+        Stage("double", stage("double", lambda x: x * 2), ["x"]),
+        Stage("total", stage("total", lambda double, y: double + y), ["double", "y"]),
+        Stage("label", stage("label", lambda z: f"z={z}"), ["z"]),
+    ])
+
+
+def test_changed_input_only_recomputes_its_downstream_stages():
+    calls = []
+    graph = toy_graph(calls)
+    graph.update(x=1, y=10, z="a")
+    assert (graph.get("total"), graph.get("label")) == (12, "z=a")
+    assert sorted(calls) == ["double", "label", "total"]
+
+    calls.clear()
+    graph.update(y=20)
+    assert (graph.get("total"), graph.get("label")) == (22, "z=a")
+    assert calls == ["total"]
+
+    calls.clear()
+    graph.update(z="b")
+    assert (graph.get("total"), graph.get("label")) == (22, "z=b")
+    assert calls == ["label"]
+
+
+def test_setting_an_equal_value_recomputes_nothing():
+    calls = []
+    graph = toy_graph(calls)
+    graph.update(x=1, y=10, z={"k": 1})
+    graph.get("total"), graph.get("label")
+    calls.clear()
+    assert graph.update(x=1, y=10, z={"k": 1}) == []
+    graph.get("total"), graph.get("label")
+    assert calls == []
+
+
+def test_missing_input_raises_key_error():
+    graph = toy_graph([])
+    graph.update(x=1)
+    with pytest.raises(KeyError):
+        graph.get("total")
+
+
+def test_report_graph_matches_compute_report(departments):
+    inputs = make_inputs(seed=5)
+    graph = report_graph()
+    set_report_inputs(graph, inputs, departments, "default")
+
+    expected = engine.compute_report(inputs, departments)
+    assert graph.get("main_context") == engine.main_context(expected)
+    assert graph.get("accountant_context") == engine.accountant_context(expected)
+    assert graph.get("report").df_final.equals(expected.df_final)
+
+
+@pytest.mark.parametrize("change,expected", [
+    ({"inventory_regular": 1234}, {"report", "accountant_context"}),
+    ({"manual_credit": 12345.0}, {"mop", "report", "main_context"}),
+    ({"cig_items": 321}, {"cig_cust", "processed", "df_final", "merch_totals", "mop", "report", "main_context", "accountant_context"}),
+])
+def test_report_graph_edits_only_recompute_affected_stages(departments, change, expected):
+    graph = report_graph()
+    set_report_inputs(graph, make_inputs(seed=5), departments, "default")
+    for stage in ("report", "main_context", "accountant_context"):
+        graph.get(stage)
+
+    graph.reset_recomputed()
+    set_report_inputs(graph, replace(make_inputs(seed=5), **change), departments, "default")
+    for stage in ("report", "main_context", "accountant_context"):
+        graph.get(stage)
+    assert set(graph.last_recomputed) == expected
+
+
+def test_report_graph_needs_a_seed(departments):
+    with pytest.raises(ValueError):
+        set_report_inputs(report_graph(), replace(make_inputs(), seed=None), departments, "default")
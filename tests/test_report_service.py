@@ -0,0 +1,34 @@
+import json
+from datetime import date
+
+import pytest
+
+from report_service import BadRequest, request_inputs
+
+BASE = {"store_name": "Shell - Syed Empires", "open_period_date": "2025-01-01", "close_period_date": "2025-01-31"}
+
+
+def test_request_inputs_builds_report_inputs():
+    inputs, source = request_inputs({**BASE, "store_name": None, "store_id": "807606", "cig_items": 10, "seed": 3, "fuel_data": {"REG": {"volume": 5, "amount": 12.5}}})
+    assert (inputs.store_name, inputs.cig_items, inputs.seed, source) == ("Shell - Syed Empires", 10, 3, "default")
+    assert inputs.open_period_date == date(2025, 1, 1)
+    assert inputs.fuel_data["REG"] == {"volume": 5, "amount": 12.5}
+
+
+@pytest.mark.parametrize("change", [
+    {"cig_items": json.loads("1e400")},
+    {"manual_credit": float("nan")},
+    {"fuel_data": {"REG": {"volume": 1, "amount": json.loads("-1e400")}}},
+    {"seed": -1},
+    {"manual_debit": -0.01},
+    {"fuel_data": {"DIESEL": {"volume": -3, "amount": 1.0}}},
+    {"cig_items": 1.5},
+    {"cig_items": True},
+    {"close_period_date": "2024-12-31"},
+    {"open_period_date": "01/01/2025"},
+    {"store_name": "No Such Store"},
+    {"colour": "red"},
+])
+def test_request_inputs_rejects_bad_input(change):
+    with pytest.raises(BadRequest):
+        request_inputs({**BASE, **change})
@@ -0,0 +1,132 @@
+from dataclasses import replace
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import report_engine as engine
+from benchmarks.synthetic import make_inputs
+from sales_cube import GRAINS, LEVELS, MEASURES, SalesCube, report_facts
+from store_registry import get_registry
+
+
+@pytest.fixture(scope="module")
+def reports(departments):
+    """Six weeks of reports of four stores, spanning a month boundary"""
+    result = []
+    for week in range(6):
+        day = date(2025, 1, 27) + timedelta(days=7 * week)
+        for position, store_name in enumerate(get_registry().names[:4]):
+            inputs = replace(make_inputs(store_name, seed=week * 10 + position), open_period_date=day, close_period_date=day + timedelta(days=6))
+            result.append(engine.compute_report(inputs, departments))
+    return result
+
+
+def every_query(cube):
+    """Every table / grain / level rollup as a sorted frame"""
+    result = {}
+    for table in MEASURES:
+        for grain in GRAINS:
+            for level in LEVELS:
+                frame = cube.query(table, grain, level)
+                keys = [column for column in frame.columns if column not in MEASURES[table] and column != "Description"]
+                result[(table, grain, level)] = frame.sort_values(keys).reset_index(drop=True)
+    return result
+
+
+def assert_same_rollups(cube, other):
+    expected = every_query(other)
+    for key, frame in every_query(cube).items():
+        pd.testing.assert_frame_equal(frame, expected[key], obj=str(key))
+
+
+def test_incremental_adds_match_a_cube_built_from_the_facts(reports):
+    cube = SalesCube()
+    cube.add_reports(reports[:5])
+    cube.query("departments", "month", "all")  # fold some deltas into one rollup only
+    for data in reports[5:]:
+        cube.add_report(data)
+    assert_same_rollups(cube, SalesCube(cube.facts("departments"), cube.facts("totals")))
+
+
+def test_replaced_reports_match_a_recompute_from_facts(reports, departments):
+    cube = SalesCube()
+    cube.add_reports(reports)
+    every_query(cube)
+    replacements = [
+        engine.compute_report(replace(data.inputs, seed=999, desired_merch_sale=1234.0, cig_items=0), departments)
+        for data in reports[3:9]
+    ]
+    cube.add_reports(replacements)
+
+    final = {(data.store_id, data.inputs.open_period_date): data for data in reports + replacements}
+    fresh = SalesCube()
+    fresh.add_reports(list(final.values()))
+    assert cube.stats()["reports"] == len(final)
+    assert_same_rollups(cube, fresh)
+    assert_same_rollups(cube, SalesCube(cube.facts("departments"), cube.facts("totals")))
+
+
+def test_merch_query_matches_a_brute_force_sum(reports):
+    cube = SalesCube()
+    cube.add_reports(reports)
+    result = cube.query("departments", "month", "all", start=date(2025, 2, 1), end=date(2025, 2, 28), merch_only=True)
+    expected = 0
+    for data in reports:
+        if date(2025, 2, 1) <= data.inputs.open_period_date <= date(2025, 2, 28):
+            merch = data.df_final["Category"].isin(engine.MERCH_CATEGORIES)
+            expected += data.df_final.loc[merch, "Net Sales"].sum()
+    assert result["Net Sales"].sum() == expected
+    assert result["Dept#"].is_unique
+
+
+def test_merch_is_taken_from_each_stores_own_category(reports):
+    first, second = (report_facts(data) for data in reports[:2])
+    merch_category = sorted(engine.MERCH_CATEGORIES)[0]
+    dept = first[0]["Dept#"].iloc[0]
+    first[0]["Category"] = first[0]["Category"].where(first[0]["Dept#"] != dept, merch_category)
+    second[0]["Category"] = second[0]["Category"].where(second[0]["Dept#"] != dept, "Fuel")
+
+    cube = SalesCube()
+    cube.add_facts([first, second])
+    merch = cube.query("departments", "day", "all", merch_only=True).set_index("Dept#")
+    every = cube.query("departments", "day", "all").set_index("Dept#")
+    first_sales = first[0].loc[first[0]["Dept#"] == dept, "Net Sales"].sum()
+    second_sales = second[0].loc[second[0]["Dept#"] == dept, "Net Sales"].sum()
+    assert merch.at[dept, "Net Sales"] == first_sales
+    assert every.at[dept, "Net Sales"] == first_sales + second_sales
+
+
+def test_totals_query_and_save_load_round_trip(reports, tmp_path):
+    cube = SalesCube()
+    cube.add_reports(reports)
+    totals = cube.query("totals", "week", "group")
+    assert totals["total_merch_sale"].sum() == sum(data.total_merch_sale for data in reports)
+
+    store_id = reports[0].store_id
+    by_store = cube.query("totals", "day", "store", location_ids=[store_id])
+    assert set(by_store["location_id"]) == {store_id}
+    assert len(by_store) == 6
+
+    cube.save(str(tmp_path))
+    assert_same_rollups(SalesCube.load(str(tmp_path)), cube)
+
+
+def test_pending_deltas_are_dropped_once_folded(reports):
+    cube = SalesCube()
+    cube.add_reports(reports[:6])
+    assert len(cube._pending["totals"]) == 6
+    cube.query("totals", "month", "all")
+    assert len(cube._pending["totals"]) == 6  # other rollups still need them
+    every_query(cube)
+    assert cube._pending == {"departments": [], "totals": []}
+
+
+def test_pending_deltas_stay_bounded_when_rollups_are_never_queried(reports, monkeypatch):
+    monkeypatch.setattr("sales_cube.MAX_PENDING", 4)
+    cube = SalesCube()
+    for data in reports + reports[:10]:  # the last ten replace earlier reports
+        cube.add_report(data)
+        cube.query("departments", "month", "all")
+        assert all(len(pending) <= 4 for pending in cube._pending.values())
+    assert_same_rollups(cube, SalesCube(cube.facts("departments"), cube.facts("totals")))